@@ -9,7 +9,7 @@ from .models import (
     Parameter, RoundParameterValue, ExperimentParameterValue, ExperimentConfiguration, RoundConfiguration,
     Experimenter, Participant, Group, Experiment, ExperimentMetadata, Address, ParticipantExperimentRelationship,
     ParticipantGroupRelationship, GroupRoundDataValue, ParticipantRoundDataValue, GroupActivityLog, ChatMessage,
-    Comment, Like, OstromlabFaqEntry, ParticipantSignup, Invitation, ExperimentSession
+    Comment, Like, OstromlabFaqEntry, ParticipantSignup, Invitation, ExperimentSession, OutboundEmail
 )
 
 
@@ -17,7 +17,7 @@ models = (
     Parameter, RoundParameterValue, ExperimentParameterValue, ExperimentConfiguration, RoundConfiguration,
     Experimenter, Participant, Group, Experiment, ExperimentMetadata, Address, ParticipantExperimentRelationship,
     ParticipantGroupRelationship, GroupRoundDataValue, ParticipantRoundDataValue, GroupActivityLog, ChatMessage,
-    Comment, Like, OstromlabFaqEntry, ParticipantSignup, Invitation, ExperimentSession
+    Comment, Like, OstromlabFaqEntry, ParticipantSignup, Invitation, ExperimentSession, OutboundEmail
 )
 for model in models:
     admin.site.register(model)
@@ -28,7 +28,7 @@ def clone_experiment(request):
     cloned_experiment = experiment.clone(experimenter=experimenter)
     return JsonResponse({
         'success': True,
-        'experiment': cloned_experiment.to_dict(attrs=('monitor_url', 'status_line', 'controller_url'))
+        'experiment': cloned_experiment.to_summary_dict(attrs=('monitor_url', 'status_line', 'controller_url'))
     })
 
 
@@ -46,7 +46,7 @@ def create_experiment(request):
                                   experiment_configuration=experiment_configuration, status=Experiment.Status.INACTIVE)
     return JsonResponse({
         'success': True,
-        'experiment': e.to_dict(attrs=('monitor_url', 'status_line', 'controller_url'))
+        'experiment': e.to_summary_dict(attrs=('monitor_url', 'status_line', 'controller_url'))
     })
 
 
@@ -85,8 +85,20 @@ def save_experimenter_notes(request):
 
 
 @group_required(PermissionGroup.experimenter)
-def get_experiment_model(request, pk):
-    return _get_experiment(request, pk).to_json()
+@require_GET
+def get_monitor_updates(request):
+    """
+    Returns the experiment status and any chat messages, activity log messages and round data newer than the
+    chat_cursor, log_cursor and round_data_cursor pks last seen by the experimenter monitor, along with the groups and
+    participants if they may have changed since state_version.
+    """
+    cursors = {}
+    for cursor in ('chat_cursor', 'log_cursor', 'round_data_cursor'):
+        value = request.GET.get(cursor, '')
+        cursors[cursor] = int(value) if value.isdigit() else 0
+    cursors['state_version'] = request.GET.get('state_version')
+    experiment = _get_experiment(request, request.GET.get('pk'))
+    return JsonResponse(experiment.to_monitor_updates_dict(**cursors))
 
 
 @group_required(PermissionGroup.experimenter)
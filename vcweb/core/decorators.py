@@ -1,13 +1,20 @@
 from functools import wraps
+import hashlib
 import time
 import logging
+import uuid
 
+from django.contrib.auth.views import redirect_to_login
+from django.core.cache import cache
 from django.shortcuts import redirect
-from django.contrib.auth.decorators import user_passes_test
 from django.core.exceptions import PermissionDenied
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
 
 logger = logging.getLogger(__name__)
 
+GROUP_NAMES_SESSION_KEY = 'vcweb.group_names'
+
 
 def log_signal_errors(signal_sender):
     @wraps(signal_sender)
@@ -45,13 +52,124 @@ def is_participant(user):
     return hasattr(user, 'participant') and user.is_active
 
 
+def _group_names_version_key(user_pk):
+    return 'vcweb.group_names_version.%s' % user_pk
+
+
+def get_group_names_version(user_pk):
+    version = cache.get(_group_names_version_key(user_pk))
+    if version is None:
+        version = uuid.uuid4().hex
+        # another process may have set a version concurrently, cache.add keeps the first one
+        cache.add(_group_names_version_key(user_pk), version, None)
+        version = cache.get(_group_names_version_key(user_pk), version)
+    return version
+
+
+def invalidate_group_names(*user_pks):
+    """
+    Invalidates the group names cached in the sessions of the given users, e.g., after their group memberships change.
+    """
+    cache.set_many(dict((_group_names_version_key(user_pk), uuid.uuid4().hex) for user_pk in user_pks), None)
+
+
+def get_group_names(request):
+    """
+    Returns a frozenset of the group names the request user belongs to, memoized on the request and cached in the
+    session until invalidate_group_names is called for the user.
+    """
+    group_names = getattr(request, '_group_names', None)
+    if group_names is None:
+        user = request.user
+        version = get_group_names_version(user.pk)
+        session = getattr(request, 'session', None)
+        cached = session.get(GROUP_NAMES_SESSION_KEY) if session is not None else None
+        if cached and cached.get('user') == user.pk and cached.get('version') == version:
+            group_names = frozenset(cached['names'])
+        else:
+            group_names = frozenset(user.groups.values_list('name', flat=True))
+            if session is not None:
+                session[GROUP_NAMES_SESSION_KEY] = {'user': user.pk, 'version': version,
+                                                    'names': sorted(group_names)}
+        request._group_names = group_names
+    return group_names
+
+
 def group_required(*permission_groups):
     """Requires user membership in at least one of the groups passed in."""
-    def in_groups(u):
+    required_group_names = frozenset(pgroup.value for pgroup in permission_groups)
+
+    def in_groups(request):
+        u = request.user
         if u.is_authenticated() and (is_experimenter(u) or is_participant(u)):
-            group_names = [pgroup.value for pgroup in permission_groups]
-            return u.groups.filter(name__in=group_names).exists()
-    return user_passes_test(in_groups)
+            return not required_group_names.isdisjoint(get_group_names(request))
+        return False
+
+    def decorator(view_function):
+        def wrap(request, *args, **kwargs):
+            if in_groups(request):
+                return view_function(request, *args, **kwargs)
+            return redirect_to_login(request.get_full_path())
+        return wraps(view_function)(wrap)
+    return decorator
+
+
+def get_view_model_etag(request, experiment_id=None, participant_group_id=None, scope='group', period=None):
+    """
+    Returns an ETag for the request participant's view model in the given experiment (or participant group
+    relationship), or None if it can't be determined. The ETag is derived from the experiment state version and the
+    participant's group state version, or the state versions of every group in the experiment if scope is
+    'experiment', for view models that show other groups' data. If period is given the ETag also changes every period
+    seconds, for view models with time dependent data.
+    """
+    from .models import Group, ParticipantGroupRelationship, get_state_versions
+    user = request.user
+    if not is_participant(user):
+        return None
+    pgrs = ParticipantGroupRelationship.objects.filter(participant=user.participant)
+    participant_group_id = participant_group_id or request.GET.get('participant_group_id')
+    try:
+        if participant_group_id:
+            pgrs = pgrs.filter(pk=int(participant_group_id))
+        if experiment_id:
+            pgrs = pgrs.filter(group__experiment=int(experiment_id))
+    except ValueError:
+        return None
+    pgr_values = pgrs.values_list('pk', 'group_id', 'group__experiment_id').first()
+    if pgr_values is None:
+        return None
+    pgr_pk, group_pk, experiment_pk = pgr_values
+    if scope == 'experiment':
+        group_pks = Group.objects.filter(experiment=experiment_pk).order_by('pk').values_list('pk', flat=True)
+    else:
+        group_pks = [group_pk]
+    etag = ':'.join([str(experiment_pk), str(pgr_pk)] + get_state_versions(experiment_pk, group_pks))
+    if period:
+        etag += ':%d' % (time.time() // period)
+    return hashlib.md5(etag).hexdigest()
+
+
+def view_model_condition(view_function=None, scope='group', period=None):
+    """
+    Conditional GET support for participant view model polling endpoints: responds with 304 Not Modified without
+    building the view model when the client's ETag matches the current state versions, see get_view_model_etag.
+    """
+    def decorator(fn):
+        def get_etag(request, *args, **kwargs):
+            return get_view_model_etag(request, kwargs.get('experiment_id'), kwargs.get('participant_group_id'),
+                                       scope=scope, period=period)
+        conditional_view = condition(etag_func=get_etag)(fn)
+
+        def wrap(request, *args, **kwargs):
+            # the ETag is computed by condition() before the view model is built and must not be recomputed
+            # afterwards: concurrent writes while building the view model would otherwise tag stale content with a
+            # newer version and subsequent polls would keep getting 304s
+            response = conditional_view(request, *args, **kwargs)
+            # browsers must revalidate polled view models instead of reusing them heuristically
+            patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return wraps(fn)(wrap)
+    return decorator if view_function is None else decorator(view_function)
 
 
 def create_user_decorator(view_function, is_valid_user, redirect_to='core:dashboard'):
@@ -114,11 +232,13 @@ def retry(exceptiontocheck, tries=4, delay=3, backoff=2, logger=None):
     return deco_retry
 
 
-def ownership_required(model_class, attr_name='pk'):
-    """ Decorator to verify the ownership permission on the Object of provided model_class and pk
+def ownership_required(model_class, attr_name='pk', select_related=()):
+    """ Decorator to verify the ownership permission on the Object of provided model_class and pk. The fetched object
+    is attached to the request as request.owned_object so the view doesn't need to load it again.
 
     :param model_class: Model class whose instance with pk we want to check object ownership permissions
     :param attr_name: The name of the pk attribute bound incoming from a url pattern match
+    :param select_related: related fields to select along with the object for use by the view
     """
     def decorator(view_function):
         def wrap(request, *args, **kwargs):
@@ -132,8 +252,9 @@ def ownership_required(model_class, attr_name='pk'):
                 raise RuntimeError('model class {} must define an is_owner instance method)'.format(model_class))
 
             try:
-                obj = model_class.objects.get(pk=pk)  # raises ObjectDoesNotExist
+                obj = model_class.objects.select_related(*select_related).get(pk=pk)  # raises ObjectDoesNotExist
                 if obj.is_owner(request.user):
+                    request.owned_object = obj
                     return view_function(request, *args, **kwargs)
             except model_class.DoesNotExist:
                 logger.error("No instance of %s found with pk %s", model_class, pk)
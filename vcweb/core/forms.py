@@ -496,6 +496,11 @@ class UpdateExperimentForm(forms.Form):
     # FIXME: turn action into a Choices field
     action = forms.CharField(max_length=64)
     experiment_id = forms.IntegerField(widget=forms.HiddenInput)
+    # experimenter monitor cursors, see Experiment.to_monitor_updates_dict
+    chat_cursor = forms.IntegerField(required=False, min_value=0)
+    log_cursor = forms.IntegerField(required=False, min_value=0)
+    round_data_cursor = forms.IntegerField(required=False, min_value=0)
+    state_version = forms.CharField(required=False, max_length=32)
 
 
 class LikeForm(forms.Form):
@@ -1,30 +1,151 @@
-from django.core.serializers import serialize
+from datetime import date, datetime, time
+from decimal import Decimal
+
+from django.conf import settings
 from django.core.serializers.json import DjangoJSONEncoder
 from django.db.models import Model
 from django.db.models.query import QuerySet
-from django.http import JsonResponse as DjangoJsonResponse
-from django.utils.functional import curry
+from django.http import HttpResponse, JsonResponse as DjangoJsonResponse, StreamingHttpResponse
+from django.utils.encoding import force_text
+from django.utils.functional import Promise
 
 import json
+import mimetypes
+import unicodecsv
+
+try:
+    # C accelerated encoder with default hook support, used when available
+    import simplejson as fastjson
+    FASTJSON_OPTIONS = {'use_decimal': False}
+except ImportError:
+    fastjson = json
+    FASTJSON_OPTIONS = {}
+
+
+def encode_datetime(obj):
+    value = obj.isoformat()
+    if obj.microsecond:
+        # ECMA-262 date time strings only support millisecond precision
+        value = value[:23] + value[26:]
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+
+def encode_time(obj):
+    if obj.utcoffset() is not None:
+        raise ValueError("JSON can't represent timezone-aware times.")
+    value = obj.isoformat()
+    if obj.microsecond:
+        value = value[:12]
+    return value
+
+
+# encoders for the non-JSON types emitted by view models, ordered from most to least specific for the isinstance
+# fallback (datetime is a date subclass). Output matches DjangoJSONEncoder.
+JSON_ENCODERS = (
+    (datetime, encode_datetime),
+    (date, date.isoformat),
+    (time, encode_time),
+    (Decimal, str),
+    (Promise, force_text),
+)
+_JSON_ENCODERS_BY_TYPE = dict(JSON_ENCODERS)
+
+
+def encode_json_default(obj, strict=False):
+    """
+    default hook for json.dumps. Model instances are encoded as references by pk and QuerySets as lists of pks; in
+    strict mode they raise a TypeError instead so that accidentally embedded models are caught early.
+    """
+    encoder = _JSON_ENCODERS_BY_TYPE.get(type(obj))
+    if encoder is not None:
+        return encoder(obj)
+    if isinstance(obj, (Model, QuerySet)):
+        if strict:
+            raise TypeError("%r embedded in JSON view model, convert it to a dict or pk first" % obj)
+        if isinstance(obj, Model):
+            return obj.pk
+        return list(obj.values_list('pk', flat=True))
+    for json_type, encoder in JSON_ENCODERS:
+        if isinstance(obj, json_type):
+            return encoder(obj)
+    raise TypeError("%r is not JSON serializable" % obj)
+
+
+def encode_json_strict(obj):
+    return encode_json_default(obj, strict=True)
+
+
+def is_strict_json_encoding():
+    return getattr(settings, 'STRICT_JSON_ENCODING', False)
+
+
+def dumps(obj, strict=None, **kwargs):
+    """
+    Fast JSON encoding for view models, using simplejson's C accelerated encoder when it is installed. strict defaults
+    to settings.STRICT_JSON_ENCODING.
+    """
+    if strict is None:
+        strict = is_strict_json_encoding()
+    options = dict(FASTJSON_OPTIONS, **kwargs)
+    return fastjson.dumps(obj, default=encode_json_strict if strict else encode_json_default, **options)
 
 
 class VcwebJSONEncoder(DjangoJSONEncoder):
 
-    def default(self, obj):
-        if isinstance(obj, QuerySet):
-            return json.loads(serialize('json', obj))
-        elif isinstance(obj, Model):
-            return json.loads(serialize('json', [obj]))[0]
-        else:
-            return DjangoJSONEncoder.default(self, obj)
+    """ json.JSONEncoder that uses the same encoders as dumps for code that requires an encoder class """
+
+    strict = False
 
-dumps = curry(json.dumps, cls=VcwebJSONEncoder)
+    def default(self, obj):
+        return encode_json_default(obj, strict=self.strict or is_strict_json_encoding())
 
 
 class JsonResponse(DjangoJsonResponse):
 
-    """ Proxies django's JsonResponse with VcwebJSONEncoder and safe=False defaults """
+    """ Proxies django's JsonResponse with fast dumps encoding and safe=False defaults """
+
+    def __init__(self, data, encoder=VcwebJSONEncoder, safe=False, **kwargs):
+        if encoder is not VcwebJSONEncoder:
+            super(JsonResponse, self).__init__(data, encoder=encoder, safe=safe, **kwargs)
+            return
+        if safe and not isinstance(data, dict):
+            raise TypeError('In order to allow non-dict objects to be serialized set the safe parameter to False')
+        kwargs.setdefault('content_type', 'application/json')
+        HttpResponse.__init__(self, content=dumps(data), **kwargs)
+
+
+class CsvRowBuffer(object):
+
+    """ File-like object that holds the last CSV row written to it until it is popped """
+
+    def __init__(self):
+        self.rows = []
+
+    def write(self, value):
+        self.rows.append(value)
+
+    def pop(self):
+        value = ''.join(self.rows)
+        self.rows = []
+        return value
+
+
+def iter_csv(rows):
+    """ Lazily encodes each row of the given iterable as a UTF-8 CSV line """
+    buffer = CsvRowBuffer()
+    writer = unicodecsv.writer(buffer, encoding='utf-8')
+    for row in rows:
+        writer.writerow(row)
+        yield buffer.pop()
+
+
+class CsvResponse(StreamingHttpResponse):
+
+    """ Streams the given rows as a CSV file attachment so that memory use doesn't grow with the size of the output """
 
-    def __init__(self, dictionary, encoder=VcwebJSONEncoder, safe=False, **kwargs):
-        super(JsonResponse, self).__init__(
-            dictionary, encoder=encoder, safe=safe, **kwargs)
+    def __init__(self, rows, filename='data.csv', **kwargs):
+        kwargs.setdefault('content_type', mimetypes.types_map['.csv'])
+        super(CsvResponse, self).__init__(iter_csv(rows), **kwargs)
+        self['Content-Disposition'] = 'attachment; filename=%s' % filename
@@ -0,0 +1,95 @@
+"""
+Database backed outbound email queue. Set EMAIL_BACKEND to vcweb.core.mailqueue.QueuedEmailBackend so request handlers
+and signal handlers only enqueue messages, and run the sendqueuedemail management command to deliver them via
+MAIL_QUEUE_DELIVERY_BACKEND.
+"""
+from smtplib import SMTPException
+import logging
+import socket
+import time
+
+from django.conf import settings
+from django.core.mail import get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+
+from .decorators import retry
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DELIVERY_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+
+
+class QueuedEmailBackend(BaseEmailBackend):
+
+    """
+    Email backend that persists messages to the OutboundEmail queue instead of delivering them.
+    """
+
+    def send_messages(self, email_messages):
+        from .models import OutboundEmail
+        if not email_messages:
+            return 0
+        return OutboundEmail.objects.enqueue(email_messages)
+
+
+def get_queue_depth():
+    from .models import OutboundEmail
+    return OutboundEmail.objects.queue_depth()
+
+
+def get_delivery_connection(backend=None):
+    if backend is None:
+        backend = getattr(settings, 'MAIL_QUEUE_DELIVERY_BACKEND', DEFAULT_DELIVERY_BACKEND)
+    return get_connection(backend=backend, fail_silently=False)
+
+
+@retry((SMTPException, socket.error), tries=4, delay=3, backoff=2, logger=logger)
+def open_connection(connection):
+    connection.open()
+    return connection
+
+
+def send_queued_email(batch_size=100, rate_limit=None, max_attempts=5, delay=60, backoff=2, connection=None):
+    """
+    Delivers all due messages in the outbound queue in batches of batch_size, reusing a single delivery connection per
+    batch. rate_limit is the maximum number of messages to send per second. Failed messages are rescheduled with
+    exponential backoff (delay * backoff ** attempts seconds) until max_attempts. Returns a (sent, failed) tuple.
+    """
+    from .models import OutboundEmail
+    min_interval = 1.0 / rate_limit if rate_limit else 0
+    sent = failed = 0
+    while True:
+        batch = OutboundEmail.objects.claim(batch_size=batch_size)
+        if not batch:
+            break
+        batch_connection = connection or get_delivery_connection()
+        try:
+            open_connection(batch_connection)
+        except (SMTPException, socket.error) as e:
+            logger.exception("unable to open delivery connection, rescheduling %d messages", len(batch))
+            for outbound_email in batch:
+                outbound_email.mark_failed(e, max_attempts=max_attempts, delay=delay, backoff=backoff)
+            failed += len(batch)
+            break
+        try:
+            for outbound_email in batch:
+                last_sent = time.time()
+                try:
+                    batch_connection.send_messages([outbound_email.to_message(connection=batch_connection)])
+                    outbound_email.mark_sent()
+                    sent += 1
+                except Exception as e:
+                    logger.warning("unable to send %s: %s", outbound_email, e)
+                    outbound_email.mark_failed(e, max_attempts=max_attempts, delay=delay, backoff=backoff)
+                    failed += 1
+                    if isinstance(e, (SMTPException, socket.error)):
+                        # the server may have dropped the connection, reconnect before continuing the batch
+                        batch_connection.close()
+                        open_connection(batch_connection)
+                elapsed = time.time() - last_sent
+                if elapsed < min_interval:
+                    time.sleep(min_interval - elapsed)
+        finally:
+            batch_connection.close()
+    return sent, failed
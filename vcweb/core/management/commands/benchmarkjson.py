@@ -0,0 +1,56 @@
+from optparse import make_option
+import json
+import timeit
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+
+from vcweb.core.http import dumps, fastjson
+from vcweb.core.models import Experiment
+
+
+def get_view_model_builder(experiment):
+    """
+    Returns a function that builds the participant view model dict for the given bound or lighterprints experiment.
+    """
+    namespace = experiment.experiment_metadata.namespace
+    if namespace == 'bound':
+        from vcweb.experiment.bound.views import get_view_model_dict
+        return lambda pgr: get_view_model_dict(experiment, pgr)
+    elif namespace == 'lighterprints':
+        from vcweb.experiment.lighterprints.views import get_view_model_dict
+        return lambda pgr: get_view_model_dict(pgr, experiment=experiment)
+    raise CommandError("no view model benchmark for %s experiments" % namespace)
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks JSON encoding of the bound and lighterprints participant view models for an experiment'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--experiment', type='int', dest='experiment', help='pk of a bound or lighterprints experiment'),
+        make_option('--iterations', type='int', dest='iterations', default=1000,
+                    help='Number of times each view model is encoded'),
+    )
+
+    def handle(self, *args, **options):
+        try:
+            experiment = Experiment.objects.select_related('experiment_metadata').get(pk=options['experiment'])
+        except Experiment.DoesNotExist:
+            raise CommandError("no experiment with pk %s" % options['experiment'])
+        pgr = experiment.participant_group_relationships.first()
+        if pgr is None:
+            raise CommandError("%s has no participants" % experiment)
+        iterations = options['iterations']
+        build_view_model = get_view_model_builder(experiment)
+        view_model = build_view_model(pgr)
+        content = dumps(view_model, strict=True)
+        self.stdout.write("%s view model: %d bytes, encoding with %s" % (experiment.experiment_metadata.namespace,
+                                                                        len(content), fastjson.__name__))
+        benchmarks = (
+            ('build view model', lambda: build_view_model(pgr), max(1, iterations // 100)),
+            ('DjangoJSONEncoder', lambda: json.dumps(view_model, cls=DjangoJSONEncoder), iterations),
+            ('vcweb.core.http.dumps', lambda: dumps(view_model), iterations),
+        )
+        for label, function, number in benchmarks:
+            elapsed = timeit.timeit(function, number=number)
+            self.stdout.write("%s: %.1f usec per call (%d calls)" % (label, elapsed * 1000000 / number, number))
@@ -0,0 +1,16 @@
+import logging
+
+from django.core.management.base import BaseCommand
+
+from vcweb.core.models import SpoolParticipantStatistics
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the subject pool attendance statistics for all participants'
+
+    def handle(self, *args, **options):
+        number_of_participants = SpoolParticipantStatistics.objects.rebuild()
+        logger.info("rebuilt spool statistics for %d participants", number_of_participants)
+        self.stdout.write("rebuilt spool statistics for %d participants" % number_of_participants)
@@ -0,0 +1,46 @@
+from optparse import make_option
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+
+from vcweb.core.mailqueue import send_queued_email
+from vcweb.core.models import OutboundEmail
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Delivers messages in the outbound email queue'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--batch-size', type='int', dest='batch_size', default=100,
+                    help='Number of messages to send over a single connection'),
+        make_option('--rate-limit', type='float', dest='rate_limit', default=None,
+                    help='Maximum number of messages to send per second'),
+        make_option('--max-attempts', type='int', dest='max_attempts', default=5,
+                    help='Number of delivery attempts before a message is marked as failed'),
+        make_option('--retry-delay', type='int', dest='delay', default=60,
+                    help='Initial delay in seconds before retrying a failed message, doubled for each attempt'),
+        make_option('--loop', type='int', dest='loop', default=0,
+                    help='Keep polling the queue every LOOP seconds instead of exiting when it is empty'),
+        make_option('--depth', action='store_true', dest='depth', default=False,
+                    help='Print the current queue depth and exit'),
+    )
+
+    def handle(self, *args, **options):
+        if options['depth']:
+            status_counts = OutboundEmail.objects.status_counts()
+            self.stdout.write("queue depth: %d" % OutboundEmail.objects.queue_depth())
+            for status, label in OutboundEmail.STATUS:
+                self.stdout.write("%s: %d" % (label, status_counts.get(status, 0)))
+            return
+        while True:
+            sent, failed = send_queued_email(batch_size=options['batch_size'], rate_limit=options['rate_limit'],
+                                             max_attempts=options['max_attempts'], delay=options['delay'])
+            if sent or failed:
+                logger.info("sent %d queued messages, %d failed, queue depth %d", sent, failed,
+                            OutboundEmail.objects.queue_depth())
+            if not options['loop']:
+                break
+            time.sleep(options['loop'])
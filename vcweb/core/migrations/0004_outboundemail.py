@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+import datetime
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_auto_20140919_1512'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboundEmail',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('subject', models.TextField(blank=True)),
+                ('body', models.TextField(blank=True)),
+                ('html_body', models.TextField(blank=True)),
+                ('from_email', models.CharField(max_length=254)),
+                ('to', models.TextField(help_text='Newline separated recipient addresses', blank=True)),
+                ('cc', models.TextField(blank=True)),
+                ('bcc', models.TextField(blank=True)),
+                ('status', models.CharField(default=b'pending', max_length=16, db_index=True, choices=[(b'pending', 'pending'), (b'sending', 'sending'), (b'sent', 'sent'), (b'failed', 'failed')])),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+                ('claim_token', models.CharField(db_index=True, max_length=32, blank=True)),
+                ('date_created', models.DateTimeField(auto_now_add=True)),
+                ('next_attempt', models.DateTimeField(default=datetime.datetime.now, db_index=True)),
+                ('date_sent', models.DateTimeField(null=True, blank=True)),
+            ],
+            options={
+                'ordering': ['next_attempt'],
+            },
+            bases=(models.Model,),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from collections import defaultdict
+
+from django.db import models, migrations
+from django.db.models import Max
+
+
+def populate_summaries(apps, schema_editor):
+    Invitation = apps.get_model('core', 'Invitation')
+    ParticipantSignup = apps.get_model('core', 'ParticipantSignup')
+    ParticipantExperimentMetadataSummary = apps.get_model('core', 'ParticipantExperimentMetadataSummary')
+    summary_dict = defaultdict(dict)
+    for participant_pk, experiment_metadata_pk, last_invited in Invitation.objects.values_list(
+            'participant', 'experiment_session__experiment_metadata').annotate(
+            last_invited=Max('date_created')).order_by():
+        summary_dict[(participant_pk, experiment_metadata_pk)]['last_invited'] = last_invited
+    # registered (3) or participated (0) signups
+    for participant_pk, experiment_metadata_pk, last_participated in ParticipantSignup.objects.filter(
+            attendance__in=(0, 3)).values_list('invitation__participant',
+                                               'invitation__experiment_session__experiment_metadata').annotate(
+            last_participated=Max('invitation__experiment_session__scheduled_date')).order_by():
+        summary_dict[(participant_pk, experiment_metadata_pk)]['last_participated'] = last_participated
+    ParticipantExperimentMetadataSummary.objects.bulk_create([
+        ParticipantExperimentMetadataSummary(participant_id=participant_pk,
+                                             experiment_metadata_id=experiment_metadata_pk, **dates)
+        for (participant_pk, experiment_metadata_pk), dates in summary_dict.items()], batch_size=500)
+
+
+def clear_summaries(apps, schema_editor):
+    apps.get_model('core', 'ParticipantExperimentMetadataSummary').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_outboundemail'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ParticipantExperimentMetadataSummary',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('last_invited', models.DateTimeField(null=True, blank=True)),
+                ('last_participated', models.DateTimeField(help_text='Scheduled date of the latest registered or attended session', null=True, blank=True)),
+                ('experiment_metadata', models.ForeignKey(related_name=b'participant_summary_set', to='core.ExperimentMetadata')),
+                ('participant', models.ForeignKey(related_name=b'experiment_metadata_summary_set', to='core.Participant')),
+            ],
+            options={
+            },
+            bases=(models.Model,),
+        ),
+        migrations.AlterUniqueTogether(
+            name='participantexperimentmetadatasummary',
+            unique_together=set([('participant', 'experiment_metadata')]),
+        ),
+        migrations.RunPython(populate_summaries, clear_summaries),
+    ]
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+from django.conf import settings
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('core', '0005_participantexperimentmetadatasummary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvitationBatch',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('date_created', models.DateTimeField(auto_now_add=True)),
+                ('number_of_recipients', models.PositiveIntegerField(default=0)),
+                ('number_sent', models.PositiveIntegerField(default=0)),
+                ('number_failed', models.PositiveIntegerField(default=0)),
+                ('sender', models.ForeignKey(related_name=b'invitation_batch_set', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+            },
+            bases=(models.Model,),
+        ),
+        migrations.AddField(
+            model_name='invitation',
+            name='batch',
+            field=models.ForeignKey(related_name=b'invitation_set', blank=True, to='core.InvitationBatch', null=True),
+            preserve_default=True,
+        ),
+        migrations.AddField(
+            model_name='outboundemail',
+            name='invitation_batch',
+            field=models.ForeignKey(related_name=b'outbound_email_set', blank=True, to='core.InvitationBatch', null=True),
+            preserve_default=True,
+        ),
+    ]
@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_invitationbatch'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='experimentsession',
+            index_together=set([('scheduled_date', 'scheduled_end_date')]),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from collections import defaultdict
+
+from django.db import models, migrations
+
+
+def rebuild_statistics(apps, schema_editor):
+    Invitation = apps.get_model('core', 'Invitation')
+    ParticipantSignup = apps.get_model('core', 'ParticipantSignup')
+    SpoolParticipantStatistics = apps.get_model('core', 'SpoolParticipantStatistics')
+    # participated (0), discharged (1), absent (2) signups
+    attendance_fields = {0: 'participations', 1: 'discharges', 2: 'absences'}
+    statistics = defaultdict(dict)
+    for participant_pk, invitations in Invitation.objects.values_list('participant').annotate(
+            count=models.Count('pk')).order_by():
+        statistics[participant_pk]['invitations'] = invitations
+    for participant_pk, attendance, count in ParticipantSignup.objects.filter(
+            attendance__in=attendance_fields.keys()).values_list('invitation__participant', 'attendance').annotate(
+            count=models.Count('pk')).order_by():
+        statistics[participant_pk][attendance_fields[attendance]] = count
+    # also removes any duplicate statistics rows before the unique constraint is added
+    SpoolParticipantStatistics.objects.all().delete()
+    SpoolParticipantStatistics.objects.bulk_create([
+        SpoolParticipantStatistics(participant_id=participant_pk, **counts)
+        for participant_pk, counts in statistics.items()], batch_size=500)
+
+
+def noop(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_experimentsession_scheduled_date_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(rebuild_statistics, noop),
+        migrations.AlterField(
+            model_name='spoolparticipantstatistics',
+            name='participant',
+            field=models.ForeignKey(related_name='spool_statistics_set', to='core.Participant', unique=True),
+        ),
+    ]
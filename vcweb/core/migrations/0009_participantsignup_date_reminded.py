@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_spoolparticipantstatistics_unique_participant'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='participantsignup',
+            name='date_reminded',
+            field=models.DateTimeField(help_text='When the session reminder email was sent to this participant', null=True, blank=True),
+            preserve_default=True,
+        ),
+    ]
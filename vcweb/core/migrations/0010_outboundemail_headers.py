@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_participantsignup_date_reminded'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outboundemail',
+            name='headers',
+            field=models.TextField(help_text='JSON encoded extra message headers, e.g., Reply-To', blank=True),
+            preserve_default=True,
+        ),
+    ]
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_outboundemail_headers'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='spoolparticipantstatistics',
+            name='participant',
+            field=models.OneToOneField(related_name='spool_statistics', to='core.Participant'),
+        ),
+    ]
@@ -1,4 +1,4 @@
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 from datetime import datetime, timedelta, date, time
 from email.utils import parseaddr
 from string import Template
@@ -7,33 +7,37 @@ from enum import Enum
 import base64
 import hashlib
 import itertools
+import json
 import logging
 import random
 import string
+import uuid
 
 from django.conf import settings
 from django.contrib.auth.forms import PasswordResetForm
+from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import User
 from django.contrib.auth.models import Group as AuthGroup
 from django.core import mail, serializers
 from django.core.cache import cache
 from django.core.mail import EmailMultiAlternatives
 from django.core.validators import RegexValidator
-from django.db import models, transaction
+from django.db import connection, models, transaction
 from django.db.models.aggregates import Max
 from django.db.models.loading import get_model
+from django.db.models.signals import m2m_changed, post_delete, post_save
 from django.dispatch import receiver
 from django.template.defaultfilters import slugify
 from django.template import Context
-from django.template.loader import select_template, get_template
 from django.utils.translation import ugettext_lazy as _
 from model_utils import Choices
 from model_utils.managers import PassThroughManager
-import markdown
 
 from . import signals, simplecache
-from .decorators import log_signal_errors
+from .decorators import invalidate_group_names, log_signal_errors
 from .http import dumps
+from .mailqueue import QueuedEmailBackend
+from .rendering import get_cached_template, render_markdown, render_markdown_template
 
 from vcweb.redis_pubsub import RedisPubSub
 
@@ -526,7 +530,7 @@ class ExperimentConfiguration(models.Model, ParameterValueMixin):
         return ec
 
     def is_owner(self, user):
-        return self.creator == user.experimenter or user.is_superuser
+        return self.creator_id == user.experimenter.pk or user.is_superuser
 
     def to_dict(self, **kwargs):
         return {
@@ -536,7 +540,7 @@ class ExperimentConfiguration(models.Model, ParameterValueMixin):
             'name': self.name,
             'treatment_id': self.treatment_id,
             'date_created': self.date_created.strftime("%m-%d-%Y %H:%M"),
-            'creator': self.creator,
+            'creator': {'pk': self.creator_id},
             'max_group_size': self.max_group_size,
             'is_experimenter_driven': self.is_experimenter_driven,
             'number_of_rounds': self.final_sequence_number
@@ -583,6 +587,38 @@ class ExperimentQuerySet(models.query.QuerySet):
         return self.select_related('experimenter', 'experiment_metadata', 'experiment_configuration').filter(
             experimenter=experimenter, **kwargs)
 
+    def with_participant_count(self):
+        return self.annotate(participant_count=models.Count('participant_relationship_set'))
+
+
+def prefetch_current_rounds(experiments):
+    """
+    Caches the current RoundConfiguration of each of the given Experiments and the final sequence number of their
+    ExperimentConfigurations with one query each, so that status and sequence labels can be computed without hitting
+    the database per experiment.
+    """
+    if not experiments:
+        return experiments
+    configuration_pks = set(e.experiment_configuration_id for e in experiments)
+    round_configurations = dict(
+        ((rc.experiment_configuration_id, rc.sequence_number), rc)
+        for rc in RoundConfiguration.objects.select_related('experiment_configuration').filter(
+            experiment_configuration__in=configuration_pks,
+            sequence_number__in=set(e.current_round_sequence_number for e in experiments)))
+    final_sequence_numbers = dict(RoundConfiguration.objects.filter(
+        experiment_configuration__in=configuration_pks).values_list('experiment_configuration').annotate(
+        count=models.Count('pk')).order_by())
+    for e in experiments:
+        round_configuration = round_configurations.get((e.experiment_configuration_id,
+                                                        e.current_round_sequence_number))
+        if round_configuration is not None:
+            e.cached_round_sequence_number = e.current_round_sequence_number
+            e.cached_round = round_configuration
+        if not e.experiment_configuration.cached_final_sequence_number:
+            e.experiment_configuration.cached_final_sequence_number = final_sequence_numbers.get(
+                e.experiment_configuration_id, 0)
+    return experiments
+
 
 class Experiment(models.Model):
 
@@ -937,67 +973,152 @@ class Experiment(models.Model):
         RedisPubSub.get_redis_instance().publish(RedisPubSub.get_experimenter_channel(self.pk), message)
 
     @transaction.atomic
-    def register_participants(self, users=None, emails=None, institution=None, password=None, sender=None, from_email=None, should_send_email=True):
+    def register_participants(self, users=None, emails=None, institution=None, password=None, sender=None,
+                              from_email=None, should_send_email=True):
+        """
+        Registers the given users (or email address lines) as participants in this experiment and optionally sends
+        them registration emails. Returns a list of (user, password) tuples for the registered participants.
+
+        Registration is performed in bulk: existing users are resolved with a single email / username query and the
+        missing Users, participant permission group memberships, Participants, and
+        ParticipantExperimentRelationships are bulk created. Registration emails are rendered and sent afterwards as a
+        separate streamed step, see generate_registration_emails and send_registration_emails.
+        """
         number_of_participants = self.participant_set.count()
-        email_messages = []
-        registered_participants = []
         if number_of_participants > 0:
             logger.warning("This experiment %s already has %d participants - aborting", self,
                            number_of_participants)
             return
         if users is None:
-            users = []
             if emails is None:
                 logger.warning("No users or emails supplied, aborting.")
                 return
-            participants_group = PermissionGroup.participant.get_django_group()
-            for email_line in emails:
-                if not email_line:
-                    logger.debug(
-                        "invalid participant data: %s", email_line)
-                    continue
-                # FIXME: parsing logic was already performed once in
-                # EmailListField.clean, redundant
-                (full_name, email_address) = parseaddr(email_line)
-                # lowercase all usernames/email addresses internally and
-                # strip all whitespace
-                email_address = email_address.lower().strip()
-                full_name = full_name.strip()
-                try:
-                    u = User.objects.get(email=email_address)
-                except User.DoesNotExist:
-                    # FIXME: replace nested try/except with
-                    # Q(email=email_address) | Q(username=email_address)
-                    try:
-                        u = User.objects.get(username=email_address)
-                    except User.DoesNotExist:
-                        u = User.objects.create_user(
-                            username=email_address, email=email_address, password=password)
-                updated = set_full_name(u, full_name)
-                if updated:
-                    u.save()
-                u.groups.add(participants_group)
-                users.append(u)
-        for user in users:
-            # FIXME: unsafe for concurrent usage, but only one experimenter
-            # at a time should be invoking this
-            (p, created) = Participant.objects.get_or_create(user=user)
-            # FIXME: instead of asking for the email suffix, just append
-            # the institution URL to keep it simpler?
-            if institution and p.institution != institution:
-                p.institution = institution
-                p.save()
-            per = ParticipantExperimentRelationship.objects.create(participant=p, experiment=self,
-                                                                   created_by=self.experimenter.user)
-            registered_participants.append((user, password))
-            email_messages.append(self.create_registration_email(per, password=password, is_new_participant=created,
-                                                                 sender=sender, from_email=from_email))
-        if email_messages and should_send_email:
-            mail.get_connection().send_messages(email_messages)
-        return registered_participants
+            users, user_passwords = self.resolve_participant_users(emails, password=password)
+        else:
+            # remove duplicate users while preserving order
+            users = OrderedDict((user.pk, user) for user in users).values()
+            user_passwords = {}
+        if not users:
+            return []
+        # users created by resolve_participant_users already have their (hashed) password
+        user_passwords.update(set_user_passwords([user for user in users if user.pk not in user_passwords],
+                                                 password))
+        participants, created_participant_pks = Participant.objects.bulk_get_or_create(users, institution=institution)
+        created_by = self.experimenter.user
+        participant_experiment_relationships = []
+        for sequential_participant_identifier, user in enumerate(users, start=number_of_participants + 1):
+            # avoid the experiment keyword argument so __init__ doesn't generate an identifier with a count query
+            per = ParticipantExperimentRelationship(participant=participants[user.pk], experiment_id=self.pk,
+                                                    created_by=created_by)
+            per.experiment = self
+            per.generate_identifier(sequential_participant_identifier=sequential_participant_identifier)
+            participant_experiment_relationships.append(per)
+        ParticipantExperimentRelationship.objects.bulk_create(participant_experiment_relationships)
+        bump_state_version(experiment_pk=self.pk)
+        if should_send_email:
+            self.send_registration_emails(
+                self.generate_registration_emails(user_passwords, sender=sender, from_email=from_email,
+                                                  new_participant_pks=created_participant_pks))
+        return [(user, password) for user in users]
+
+    def resolve_participant_users(self, emails, password=None):
+        """
+        Resolves the given email address lines, e.g., "Allen T Lee <allen.t.lee@asu.edu>", to Users and returns a
+        (users, new_user_passwords) tuple. users is in order and without duplicates: existing users are matched by email
+        and then username with a single query, any missing users are bulk created, and all of them are added to the
+        participant permission group. new_user_passwords maps the pks of the created users to their plaintext password,
+        the given password (hashed once) or a random password for each user if none was given.
+        """
+        full_names = OrderedDict()
+        for email_line in emails:
+            if not email_line:
+                logger.debug("invalid participant data: %s", email_line)
+                continue
+            # FIXME: parsing logic was already performed once in EmailListField.clean, redundant
+            (full_name, email_address) = parseaddr(email_line)
+            # lowercase all usernames/email addresses internally and strip all whitespace
+            email_address = email_address.lower().strip()
+            full_names.setdefault(email_address, full_name.strip())
+        email_addresses = full_names.keys()
+        users_by_email = {}
+        users_by_username = {}
+        for user in User.objects.filter(models.Q(email__in=email_addresses) |
+                                        models.Q(username__in=email_addresses)).order_by('pk'):
+            users_by_email.setdefault(user.email, user)
+            users_by_username.setdefault(user.username, user)
+        new_users = []
+        new_user_passwords = {}
+        shared_password = password if password is not None and password.strip() else None
+        hashed_password = make_password(shared_password) if shared_password else None
+        for email_address, full_name in full_names.items():
+            u = users_by_email.get(email_address, users_by_username.get(email_address))
+            if u is None:
+                plaintext_password = shared_password or User.objects.make_random_password()
+                new_user_passwords[email_address] = plaintext_password
+                u = User(username=email_address, email=email_address,
+                         password=hashed_password or make_password(plaintext_password))
+                set_full_name(u, full_name)
+                new_users.append(u)
+            elif set_full_name(u, full_name):
+                u.save()
+        if new_users:
+            User.objects.bulk_create(new_users)
+            for user in User.objects.filter(username__in=[new_user.username for new_user in new_users]):
+                users_by_username[user.username] = user
+        users = [users_by_email.get(email_address, users_by_username.get(email_address))
+                 for email_address in email_addresses]
+        new_user_passwords = dict((users_by_username[username].pk, plaintext_password)
+                                  for username, plaintext_password in new_user_passwords.items())
+        participants_group = PermissionGroup.participant.get_django_group()
+        membership_model = User.groups.through
+        existing_member_pks = set(membership_model.objects.filter(group=participants_group,
+                                                                  user__in=users).values_list('user', flat=True))
+        new_member_pks = [user.pk for user in users if user.pk not in existing_member_pks]
+        membership_model.objects.bulk_create([membership_model(user_id=user_pk, group_id=participants_group.pk)
+                                              for user_pk in new_member_pks])
+        # bulk_create doesn't send m2m_changed, invalidate the group names cached in existing users' sessions
+        invalidate_group_names(*[user_pk for user_pk in new_member_pks if user_pk not in new_user_passwords])
+        return users, new_user_passwords
+
+    def generate_registration_emails(self, user_passwords=None, password=None, sender=None, from_email=None,
+                                     new_participant_pks=None):
+        """
+        Generator yielding a registration email for each registered participant in this experiment. Participants are
+        loaded with a single query and the registration template is selected once. user_passwords should map user pks
+        to the plaintext password to include in the email, otherwise the given password is reset and used for each
+        participant.
+        """
+        plaintext_template = get_cached_template('%s/email/experiment-registration.txt' % self.namespace,
+                                                 'email/experiment-registration.txt')
+        if new_participant_pks is None:
+            new_participant_pks = ()
+        for per in self.participant_relationship_set.select_related('participant__user'):
+            participant = per.participant
+            if user_passwords is None:
+                yield self.create_registration_email(per, password=password, sender=sender, from_email=from_email,
+                                                     plaintext_template=plaintext_template,
+                                                     is_new_participant=participant.pk in new_participant_pks)
+            else:
+                yield self.create_registration_email(per, password=user_passwords[participant.user_id], sender=sender,
+                                                     from_email=from_email, plaintext_template=plaintext_template,
+                                                     reset_password=False,
+                                                     is_new_participant=participant.pk in new_participant_pks)
+
+    def send_registration_emails(self, email_messages, batch_size=100):
+        """
+        Sends the given (possibly lazily generated) registration emails over a single mail connection in batches of
+        batch_size messages.
+        """
+        connection = mail.get_connection()
+        connection.open()
+        try:
+            for batch in batch_iterable(email_messages, batch_size):
+                connection.send_messages(batch)
+        finally:
+            connection.close()
 
     def create_registration_email(self, participant_experiment_relationship, password='', sender=None, from_email=None,
-                                  **kwargs):
+                                  plaintext_template=None, reset_password=True, **kwargs):
         """
         Creates a registration email, sets a password for the given participant, and sends it to the participant in
         plain text. Insecure at the expense of convenience, lowering barrier to participant registration.
@@ -1005,15 +1126,17 @@ class Experiment(models.Model):
         Override the email template by creating <experiment-namespace>/email/experiment-registration.txt templates
         """
         participant = participant_experiment_relationship.participant
-        plaintext_template = select_template(['%s/email/experiment-registration.txt' % self.namespace,
-                                              'email/experiment-registration.txt'])
+        if plaintext_template is None:
+            plaintext_template = get_cached_template('%s/email/experiment-registration.txt' % self.namespace,
+                                                     'email/experiment-registration.txt')
         user = participant.user
-        if password is None or not password.strip():
-            password = User.objects.make_random_password()
-        # FIXME: resets existing user passwords, which might not be a good
-        # thing
-        user.set_password(password)
-        user.save()
+        if reset_password:
+            if password is None or not password.strip():
+                password = User.objects.make_random_password()
+            # FIXME: resets existing user passwords, which might not be a good
+            # thing
+            user.set_password(password)
+            user.save()
         c = Context({
             'participant_experiment_relationship': participant_experiment_relationship,
             'participant': participant,
@@ -1023,7 +1146,7 @@ class Experiment(models.Model):
             'SITE_URL': settings.SITE_URL,
         })
         plaintext_content = plaintext_template.render(c)
-        html_content = markdown.markdown(plaintext_content)
+        html_content = render_markdown(plaintext_content)
         subject = self.get_registration_email_subject()
         experimenter_email = self.experimenter.email
         if from_email is None or not from_email.strip():
@@ -1152,8 +1275,14 @@ class Experiment(models.Model):
         return parameter_set.filter(scope=scope) if scope else parameter_set
 
     @transaction.atomic
-    def allocate_groups(self, randomize=True, preserve_existing_groups=False, session_id=u''):
-        # clear out all existing groups
+    def allocate_groups(self, randomize=True, preserve_existing_groups=False, session_id=u'',
+                        send_participant_added=False):
+        """
+        Allocates all participants in this experiment into groups of at most max_group_size. The group layout is
+        computed in memory and the Groups and ParticipantGroupRelationships are bulk inserted, firing a single
+        participants_added signal. Set send_participant_added to also fire the per-participant participant_added
+        signal for each new ParticipantGroupRelationship.
+        """
         max_group_size = self.experiment_configuration.max_group_size
         participants = list(self.participant_set.all())
         logger.debug("%s allocating groups for %s with session_id %s (randomize? %s)",
@@ -1179,48 +1308,111 @@ class Experiment(models.Model):
                             "Cannot allocate new groups and preserve existing groups without an appropriate session id set on this round configuration %s" % round_configuration)
             else:
                 logger.debug("deleting existing groups")
-                # FIXME: fairly expensive operation to log all group members
-                gqs = gs.all()
-                for g in gqs:
-                    self.log("reallocating/deleting group %s" %
-                             g.participant_group_relationship_set.all())
-                gqs.delete()
+                self.log_group_members("reallocating/deleting group")
+                gs.all().delete()
         # allocate participants to groups
-        current_group = self.group_set.create(
-            number=1, max_size=max_group_size, session_id=session_id)
-        for p in participants:
-            # FIXME: simplify logic where possible
-            # create a new group
-            pgr = current_group.add_participant(p)
-            current_group = pgr.group
+        group_layout = Experiment.compute_group_layout(participants, max_group_size)
+        existing_group_pks = list(gs.values_list('pk', flat=True))
+        Group.objects.bulk_create([
+            Group(number=number, max_size=max_group_size, experiment=self, session_id=session_id)
+            for number in xrange(1, len(group_layout) + 1)
+        ])
+        # bulk_create doesn't set pks, reload the new groups by number, excluding preserved groups that may share
+        # this session id
+        groups = dict((g.number, g) for g in self.group_set.filter(session_id=session_id).exclude(
+            pk__in=existing_group_pks))
+        round_joined = self.current_round
+        ParticipantGroupRelationship.objects.bulk_create([
+            ParticipantGroupRelationship(participant=participant, group=groups[number],
+                                         round_joined=round_joined, participant_number=participant_number)
+            for number, members in enumerate(group_layout, start=1)
+            for participant_number, participant in enumerate(members, start=1)
+        ])
+        # bulk_create doesn't send post_save, update the monitor roster and participant view models
+        bump_state_version(experiment_pk=self.pk)
+        participant_group_relationships = list(
+            ParticipantGroupRelationship.objects.select_related('group', 'participant').filter(
+                group__in=groups.values()))
+        now = datetime.now()
+        signals.participants_added.send_robust(self, experiment=self, time=now,
+                                               participant_group_relationships=participant_group_relationships)
+        if send_participant_added:
+            for pgr in participant_group_relationships:
+                signals.participant_added.send_robust(pgr.group, experiment=self, time=now,
+                                                      participant_group_relationship=pgr)
         self.create_group_clusters()
 
+    @staticmethod
+    def compute_group_layout(participants, max_group_size):
+        """
+        Returns a list of participant lists, one per group, filling each group up to max_group_size in the given
+        participant order. A max_group_size of 0 signifies an open experiment with a single unbounded group. Always
+        returns at least one (possibly empty) group.
+        """
+        if max_group_size <= 0 or not participants:
+            return [list(participants)]
+        return [participants[index:index + max_group_size] for index in xrange(0, len(participants), max_group_size)]
+
+    def log_group_members(self, log_message):
+        """
+        Logs the members of every group in this experiment as a single activity log entry, using a single query for
+        all group memberships instead of one per group.
+        """
+        members = defaultdict(list)
+        for pgr in ParticipantGroupRelationship.objects.select_related('participant__user', 'group').filter(
+                group__experiment=self):
+            members[pgr.group].append(pgr)
+        self.log("%s %s" % (log_message, '; '.join(["%s: %s" % (group, pgrs) for group, pgrs in
+                                                    sorted(members.items(), key=lambda item: item[0].number)])))
+
     def create_group_clusters(self):
+        """
+        Deletes and recreates this session's group clusters if the current round is configured to create them. Groups
+        are shuffled and assigned to clusters in memory, and the GroupClusters and GroupRelationships are bulk
+        inserted. Returns an OrderedDict mapping each new GroupCluster to its list of Groups (see
+        get_group_cluster_map), or None if no clusters were created.
+        """
         round_configuration = self.current_round
         session_id = round_configuration.session_id
-        if round_configuration.create_group_clusters:
-            logger.debug(
-                "creating new (and deleting existing) group clusters with session id %s", session_id)
-            self.group_cluster_set.filter(session_id=session_id).delete()
-            gs = self.group_set.filter(session_id=session_id)
-            group_cluster_size = round_configuration.group_cluster_size
-            groups = list(gs)
-            if len(groups) % group_cluster_size != 0:
-                logger.error("cannot create clusters with %s groups per cluster, we have %s groups which isn't evenly divisible.",
-                             group_cluster_size, len(groups))
-                return
-            random.shuffle(groups)
-            current_group_cluster = GroupCluster.objects.create(
-                session_id=session_id, experiment=self)
-            logger.debug("creating group clusters with %s groups per cluster", group_cluster_size)
-            for index, group in enumerate(groups):
-                if index >= group_cluster_size and (index % group_cluster_size == 0):
-                    # the current group cluster is full, create a new one
-                    current_group_cluster = GroupCluster.objects.create(
-                        session_id=session_id, experiment=self)
-                # add group to the cluster
-                GroupRelationship.objects.create(
-                    cluster=current_group_cluster, group=group)
+        if not round_configuration.create_group_clusters:
+            return None
+        logger.debug("creating new (and deleting existing) group clusters with session id %s", session_id)
+        self.group_cluster_set.filter(session_id=session_id).delete()
+        group_cluster_size = round_configuration.group_cluster_size
+        groups = list(self.group_set.filter(session_id=session_id))
+        if len(groups) % group_cluster_size != 0:
+            logger.error("cannot create clusters with %s groups per cluster, we have %s groups which isn't evenly divisible.",
+                         group_cluster_size, len(groups))
+            return None
+        random.shuffle(groups)
+        logger.debug("creating group clusters with %s groups per cluster", group_cluster_size)
+        cluster_layout = [groups[index:index + group_cluster_size]
+                          for index in xrange(0, len(groups), group_cluster_size)]
+        GroupCluster.objects.bulk_create([GroupCluster(session_id=session_id, experiment=self)
+                                          for _ in cluster_layout])
+        # bulk_create doesn't set pks but all existing clusters for this session id were just deleted, so every
+        # cluster with this session id is new.
+        group_clusters = list(self.group_cluster_set.filter(session_id=session_id).order_by('pk'))
+        GroupRelationship.objects.bulk_create([
+            GroupRelationship(cluster=group_cluster, group=group)
+            for group_cluster, cluster_groups in zip(group_clusters, cluster_layout)
+            for group in cluster_groups
+        ])
+        return OrderedDict(zip(group_clusters, cluster_layout))
+
+    def get_group_cluster_map(self, session_id=None):
+        """
+        Returns an OrderedDict mapping each GroupCluster with the given session id (defaults to the current round's
+        session id) to its list of Groups, loaded with a single query. Use this instead of querying
+        group_relationship_set on each GroupCluster.
+        """
+        if session_id is None:
+            session_id = self.current_session_id
+        group_cluster_map = OrderedDict()
+        for group_relationship in GroupRelationship.objects.select_related('cluster', 'group').filter(
+                cluster__experiment=self, cluster__session_id=session_id).order_by('cluster__pk', 'pk'):
+            group_cluster_map.setdefault(group_relationship.cluster, []).append(group_relationship.group)
+        return group_cluster_map
 
     def get_round_configuration(self, sequence_number):
         return RoundConfiguration.objects.select_related('experiment_configuration').get(
@@ -1399,56 +1591,179 @@ class Experiment(models.Model):
         if self.is_timed_round and self.is_time_expired:
             self.end_round()
 
+    @staticmethod
+    def _round_data_dict(round_data):
+        rc = round_data.round_configuration
+        return {
+            'pk': round_data.pk,
+            'roundDataId': "roundData_%s" % round_data.pk,
+            'experimenterNotes': round_data.experimenter_notes,
+            'roundType': rc.get_round_type_display(),
+            'roundNumber': round_data.round_number,
+            # empty stubs to be loaded dynamically
+            'groupDataValues': [],
+            'participantDataValues': []
+        }
+
     def all_round_data(self):
         # FIXME: figure out a better way to convert these to json that doesn't involve manual remapping of attribute
         # names or be consistent so that things on the client side are named
         # the same as the server side
-        all_round_data = []
-        for round_data in self.round_data_set.select_related('round_configuration').reverse():
-            rc = round_data.round_configuration
-            all_round_data.append({
-                'pk': round_data.pk,
-                'roundDataId': "roundData_%s" % round_data.pk,
-                'experimenterNotes': round_data.experimenter_notes,
-                'roundType': rc.get_round_type_display(),
-                'roundNumber': round_data.round_number,
-                # empty stubs to be loaded dynamically
-                'groupDataValues': [],
-                'participantDataValues': []
-            })
-        return all_round_data
+        return [Experiment._round_data_dict(round_data)
+                for round_data in self.round_data_set.select_related('round_configuration').reverse()]
+
+    def monitor_groups(self):
+        """ Returns serialized current groups and their members, fetched with a single query """
+        group_dict = OrderedDict()
+        for pgr in ParticipantGroupRelationship.objects.select_related('group', 'participant__user').filter(
+                group__experiment=self, group__session_id=self.current_session_id).order_by('group', 'participant_number'):
+            group = pgr.group
+            if group.pk not in group_dict:
+                group_dict[group.pk] = {'name': group.name, 'pk': group.pk, 'participant_group_relationships': []}
+            group_dict[group.pk]['participant_group_relationships'].append(
+                {'pk': pgr.pk, 'participant_number': pgr.participant_number, 'email': pgr.participant.email})
+        return group_dict.values()
+
+    def monitor_participants(self):
+        """ Returns the serialized participant roster, fetched with a single query """
+        return [{'full_name': u' '.join([first_name, last_name]).strip(), 'email': email}
+                for first_name, last_name, email in self.participant_set.values_list('user__first_name',
+                                                                                    'user__last_name', 'user__email')]
 
-    def to_dict(self, include_round_data=False, default_value_dict=None, attrs=None, *args, **kwargs):
+    @property
+    def state_version(self):
+        """
+        Opaque token that changes along with the experiment's state, including participants joining and group
+        membership changes, see get_state_versions.
+        """
+        return get_state_versions(self.pk)[0]
+
+    def to_monitor_updates_dict(self, chat_cursor=0, log_cursor=0, round_data_cursor=0, state_version=None,
+                                limit=100):
+        """
+        Incremental experimenter monitor serialization. The cursors are the latest chat message, activity log and round
+        data pks already seen by the client, only the next (oldest first) limit newer rows of each are returned, newest
+        first, along with the participant level experiment status and the new cursors. hasMore is set when rows remain
+        past the new cursors and the client should request more updates. Groups and the participant roster are only
+        included when new round data exists or the experiment's state version differs from the state_version last seen
+        by the client, e.g., after participants join or are moved to other groups. reset is set when the client's latest
+        round data no longer exists (the experiment was restarted or cleared) and the full monitor model must be
+        reloaded.
+        """
+        current_state_version = self.state_version
+        experiment_dict = self.to_participant_dict()
+        experiment_dict['experimenterNotes'] = self.current_round_data.experimenter_notes if self.is_round_in_progress else ''
+        experiment_dict['reset'] = bool(round_data_cursor) and not self.round_data_set.filter(
+            pk=round_data_cursor).exists()
+        has_more = []
+
+        def next_page(queryset, cursor, pk_field='pk'):
+            # page forward from the cursor so that no rows are skipped, fetching one extra row to detect more
+            rows = list(queryset.filter(pk__gt=cursor).order_by(pk_field)[:limit + 1])
+            has_more.append(len(rows) > limit)
+            rows = rows[:limit]
+            return rows[::-1], (rows[-1].pk if rows else cursor)
+
+        # ChatMessage's pk is its parent link, ordering by it would apply ParticipantRoundDataValue's default ordering
+        chat_messages, chat_cursor = next_page(ChatMessage.objects.for_experiment(self), chat_cursor,
+                                               pk_field='participantrounddatavalue_ptr_id')
+        activity_logs, log_cursor = next_page(self.activity_log_set.all(), log_cursor)
+        round_data, round_data_cursor = next_page(self.round_data_set.select_related('round_configuration'),
+                                                  round_data_cursor)
+        experiment_dict.update({
+            'chatMessages': [chat_message.to_dict() for chat_message in chat_messages],
+            'messages': map(str, activity_logs),
+            'allRoundData': [Experiment._round_data_dict(rd) for rd in round_data],
+            'chatCursor': chat_cursor,
+            'logCursor': log_cursor,
+            'roundDataCursor': round_data_cursor,
+            'hasMore': any(has_more),
+            'stateVersion': current_state_version,
+        })
+        if round_data or state_version != current_state_version:
+            experiment_dict['groups'] = self.monitor_groups()
+            experiment_dict['participants'] = self.monitor_participants()
+        return experiment_dict
+
+    @property
+    def summary_cache_key(self):
+        return 'experiment_summary:%s:%s' % (self.pk, self.last_modified.isoformat())
+
+    def _update_experiment_dict(self, experiment_dict, attrs=None):
+        # FIXME: intended to provide some way to include more experiment
+        # attributes at invocation time, may remove
+        if attrs:
+            experiment_dict.update([(attr, getattr(self, attr, None)) for attr in attrs])
+        return experiment_dict
+
+    def to_summary_dict(self, default_value_dict=None, attrs=None, **kwargs):
+        """
+        Status line level serialization for dashboards and experiment management responses. Queries the current
+        RoundConfiguration and the final sequence number (both skipped after prefetch_current_rounds()) and the
+        participant count (skipped after ExperimentQuerySet.with_participant_count()).
+        """
         experiment_dict = dict(default_value_dict or {}, **kwargs)
-        start_time = self.current_round_start_time.strftime(
-            '%c') if self.current_round_start_time else 'N/A'
+        # use participant counts annotated by ExperimentQuerySet.with_participant_count() when available
+        participant_count = getattr(self, 'participant_count', None)
+        if participant_count is None:
+            participant_count = self.participant_set.count()
         experiment_dict.update({
             'roundStatusLabel': self.status_label,
             'roundSequenceLabel': self.sequence_label,
-            'timeRemaining': self.time_remaining,
-            'currentRoundStartTime': start_time,
-            'participantCount': self.participant_set.count(),
+            'participantCount': participant_count,
             'isRoundInProgress': self.is_round_in_progress,
             'isActive': self.is_active,
             'isArchived': self.is_archived,
-            'exchangeRate': float(self.experiment_configuration.exchange_rate),
-            'participants': [{'full_name': p.full_name, 'email': p.email} for p in self.participant_set.all()],
-            'readyParticipants': self.number_of_ready_participants,
             'status': self.status,
             'pk': self.pk
         })
+        return self._update_experiment_dict(experiment_dict, attrs)
+
+    def to_participant_dict(self, default_value_dict=None, attrs=None, **kwargs):
+        """
+        Base serialization for participant view models. Adds round timing, the exchange rate and the number of ready
+        participants (one additional query while a round is in progress) to the summary but never the roster.
+        """
+        experiment_dict = self.to_summary_dict(default_value_dict=default_value_dict, **kwargs)
+        start_time = self.current_round_start_time.strftime(
+            '%c') if self.current_round_start_time else 'N/A'
+        experiment_dict.update({
+            'timeRemaining': self.time_remaining,
+            'currentRoundStartTime': start_time,
+            'exchangeRate': float(self.experiment_configuration.exchange_rate),
+            'readyParticipants': self.number_of_ready_participants,
+        })
+        return self._update_experiment_dict(experiment_dict, attrs)
+
+    def to_monitor_dict(self, include_round_data=False, default_value_dict=None, attrs=None, **kwargs):
+        """
+        Experimenter monitor serialization. Adds the participant roster (one query) to the participant level and, if
+        include_round_data is set, all round data, chat messages, activity log messages and groups.
+        """
+        experiment_dict = self.to_participant_dict(default_value_dict=default_value_dict, **kwargs)
+        experiment_dict['participants'] = self.monitor_participants()
         if include_round_data:
+            # read before the groups so that later roster changes are picked up by to_monitor_updates_dict()
+            experiment_dict['stateVersion'] = self.state_version
             # XXX: stubs for round data
-            experiment_dict['allRoundData'] = self.all_round_data()
-            experiment_dict['chatMessages'] = [chat_message.to_dict() for chat_message in self.all_chat_messages]
-            experiment_dict['messages'] = map(str, self.activity_log_set.order_by('-date_created')[:100])
+            all_round_data = self.all_round_data()
+            chat_messages = [chat_message.to_dict() for chat_message in self.all_chat_messages]
+            activity_logs = list(self.activity_log_set.order_by('-date_created')[:100])
+            experiment_dict['allRoundData'] = all_round_data
+            experiment_dict['chatMessages'] = chat_messages
+            experiment_dict['messages'] = map(str, activity_logs)
             experiment_dict['experimenterNotes'] = self.current_round_data.experimenter_notes if self.is_round_in_progress else ''
-            experiment_dict['groups'] = [group.to_dict() for group in self.groups]
-        # FIXME: intended to provide some way to include more experiment
-        # attributes at invocation time, may remove
-        if attrs:
-            experiment_dict.update([(attr, getattr(self, attr, None)) for attr in attrs])
-        return experiment_dict
+            experiment_dict['groups'] = self.monitor_groups()
+            # cursors for subsequent to_monitor_updates_dict() requests
+            experiment_dict['chatCursor'] = max([cm['pk'] for cm in chat_messages] or [0])
+            experiment_dict['logCursor'] = max([log.pk for log in activity_logs] or [0])
+            experiment_dict['roundDataCursor'] = max([rd['pk'] for rd in all_round_data] or [0])
+        return self._update_experiment_dict(experiment_dict, attrs)
+
+    def to_dict(self, include_round_data=False, default_value_dict=None, attrs=None, *args, **kwargs):
+        """ Equivalent to to_monitor_dict(), prefer the summary or participant levels when the roster isn't needed """
+        return self.to_monitor_dict(include_round_data=include_round_data, default_value_dict=default_value_dict,
+                                    attrs=attrs, **kwargs)
 
     def as_dict(self, *args, **kwargs):
         return self.to_dict(*args, **kwargs)
@@ -1468,7 +1783,7 @@ class Experiment(models.Model):
                                          status=Experiment.Status.INACTIVE)
 
     def is_owner(self, user):
-        return self.experimenter == user.experimenter or user.is_superuser
+        return self.experimenter_id == user.experimenter.pk or user.is_superuser
 
     def template_context(self, participant_group_relationship, **kwargs):
         return dict(
@@ -2101,6 +2416,7 @@ class Group(models.Model, DataValueMixin):
                  (amount, parameter))
         updated_rows = self.data_value_set.filter(round_data=self.current_round_data, parameter=parameter).update(
             **update_dict)
+        bump_state_version(group_pks=[self.pk])
         if updated_rows != 1:
             logger.error(
                 "Updated %s rows, should have been only one.", updated_rows)
@@ -2316,6 +2632,69 @@ class ParticipantQuerySet(models.query.QuerySet):
     def active(self, *args, **kwargs):
         return self.filter(user__is_active=True, *args, **kwargs).exclude(user__email__contains=('mailinator.com'))
 
+    def invitation_candidates(self, experiment_metadata_pk, days_threshold=7):
+        """
+        Returns active participants that have opted in to receive invitations and that have neither been invited to an
+        experiment session for the given experiment metadata in the last days_threshold days nor registered for or
+        participated in one. Eligibility is computed in a single query using a NOT EXISTS subquery against
+        ParticipantExperimentMetadataSummary.
+        """
+        qn = connection.ops.quote_name
+        summary_table = qn(ParticipantExperimentMetadataSummary._meta.db_table)
+        not_exists = """NOT EXISTS (SELECT 1 FROM {summary} WHERE {summary}.{participant_id} = {participant}.{pk}
+        AND {summary}.{experiment_metadata_id} = %s AND ({summary}.{last_invited} > %s
+        OR {summary}.{last_participated} IS NOT NULL))""".format(
+            summary=summary_table,
+            participant=qn(Participant._meta.db_table),
+            pk=qn(Participant._meta.pk.column),
+            participant_id=qn('participant_id'),
+            experiment_metadata_id=qn('experiment_metadata_id'),
+            last_invited=qn('last_invited'),
+            last_participated=qn('last_participated'))
+        last_invited_threshold = datetime.now() - timedelta(days=days_threshold)
+        return self.active(can_receive_invitations=True).extra(where=[not_exists],
+                                                               params=[experiment_metadata_pk, last_invited_threshold])
+
+    def reliable(self, max_absences=None, max_discharges=None):
+        """
+        Excludes participants with more than max_absences absences or max_discharges discharges according to their
+        precomputed SpoolParticipantStatistics. Participants without statistics have no attendance record and are kept.
+        """
+        qs = self
+        if max_absences is not None:
+            qs = qs.exclude(spool_statistics__absences__gt=max_absences)
+        if max_discharges is not None:
+            qs = qs.exclude(spool_statistics__discharges__gt=max_discharges)
+        return qs
+
+    def random_sample(self, size, seed=None):
+        """
+        Returns a uniform random sample of at most size Participants from this queryset. Reservoir sampling is performed
+        over a pk-ordered values_list iterator so only the selected Participants are loaded, and the sample is
+        reproducible when a seed is given.
+        """
+        pks = reservoir_sample(self.order_by('pk').values_list('pk', flat=True).iterator(), size,
+                               rng=random.Random(seed))
+        participants = []
+        for batch in batch_iterable(sorted(pks), 500):
+            participants.extend(Participant.objects.select_related('user').filter(pk__in=batch).order_by('pk'))
+        return participants
+
+    def bulk_get_or_create(self, users, institution=None):
+        """
+        Returns a tuple of (dict mapping user pks to their Participant, set of newly created Participant pks), bulk
+        creating any missing Participants. If an institution is given, all of the participants are assigned to it.
+        """
+        user_pks = [user.pk for user in users]
+        existing_user_pks = set(self.filter(user__in=user_pks).values_list('user', flat=True))
+        self.bulk_create([Participant(user_id=user_pk, institution=institution) for user_pk in user_pks
+                          if user_pk not in existing_user_pks])
+        if institution is not None:
+            self.filter(user__in=existing_user_pks).exclude(institution=institution).update(institution=institution)
+        participants = dict((p.user_id, p) for p in self.select_related('user').filter(user__in=user_pks))
+        created_pks = set(p.pk for p in participants.values() if p.user_id not in existing_user_pks)
+        return participants, created_pks
+
 
 class Participant(CommonsUser):
     GENDER_CHOICES = (('M', 'Male'), ('F', 'Female'),)
@@ -2441,10 +2820,11 @@ class ParticipantExperimentRelationship(models.Model):
         if 'experiment' in kwargs:
             self.generate_identifier()
 
-    def generate_identifier(self):
+    def generate_identifier(self, sequential_participant_identifier=None):
         """
         generates a unique identifier for the given participant and experiment stored in this relationship.
-        a no-op if participant_identifier is already set.
+        a no-op if participant_identifier is already set. Bulk callers can pass in a precomputed
+        sequential_participant_identifier to avoid counting the existing relationships in this experiment.
         """
         if not self.participant_identifier:
             sha1 = hashlib.sha1()
@@ -2452,8 +2832,10 @@ class ParticipantExperimentRelationship(models.Model):
                 "%s%i%s" % (self.participant.user.email, self.experiment.pk, self.date_created))
             self.participant_identifier = base64.urlsafe_b64encode(
                 sha1.digest())
-            self.sequential_participant_identifier = ParticipantExperimentRelationship.objects.filter(
-                experiment=self.experiment).count() + 1
+            if sequential_participant_identifier is None:
+                sequential_participant_identifier = ParticipantExperimentRelationship.objects.filter(
+                    experiment=self.experiment).count() + 1
+            self.sequential_participant_identifier = sequential_participant_identifier
         return self.participant_identifier
 
     def __unicode__(self):
@@ -2818,6 +3200,57 @@ class ExperimentActivityLog(ActivityLog):
     round_configuration = models.ForeignKey(RoundConfiguration)
 
 
+class ExperimentSessionQuerySet(models.query.QuerySet):
+
+    def overlapping(self, start=None, end=None):
+        """
+        Returns experiment sessions overlapping the given date range, sessions without a scheduled end date are treated
+        as ending at their scheduled date.
+        """
+        queryset = self
+        if end is not None:
+            queryset = queryset.filter(scheduled_date__lte=end)
+        if start is not None:
+            queryset = queryset.filter(models.Q(scheduled_end_date__gte=start) |
+                                       models.Q(scheduled_end_date__isnull=True, scheduled_date__gte=start))
+        return queryset
+
+    def allocate_seat(self, invitation_pk, participant=None, waitlist_size=None):
+        """
+        Atomically signs up the invited participant for the invitation's experiment session, registering them if the
+        session has open seats or adding them to its waitlist otherwise. The invitation and its experiment session rows
+        are locked for the duration of the allocation so concurrent signups cannot exceed the session capacity or the
+        waitlist size. Returns a (ParticipantSignup, created) tuple, (None, False) if both are full, and the existing
+        signup if the participant is already registered or waitlisted. Raises Invitation.DoesNotExist for invalid
+        invitations.
+        """
+        if waitlist_size is None:
+            waitlist_size = settings.SUBJECT_POOL_WAITLIST_SIZE
+        criteria = dict(pk=invitation_pk)
+        if participant is not None:
+            criteria.update(participant=participant)
+        with transaction.atomic():
+            # select_for_update locks the joined experiment session row as well
+            invitation = Invitation.objects.select_related('experiment_session').select_for_update().get(**criteria)
+            experiment_session = invitation.experiment_session
+            existing_signup = ParticipantSignup.objects.filter(
+                invitation=invitation, attendance__in=(ParticipantSignup.ATTENDANCE.registered,
+                                                       ParticipantSignup.ATTENDANCE.waitlist)).first()
+            if existing_signup is not None:
+                return existing_signup, False
+            signup_counts = dict(ParticipantSignup.objects.filter(
+                invitation__experiment_session=experiment_session,
+                attendance__in=(ParticipantSignup.ATTENDANCE.registered, ParticipantSignup.ATTENDANCE.waitlist)
+            ).values_list('attendance').annotate(count=models.Count('pk')).order_by())
+            if signup_counts.get(ParticipantSignup.ATTENDANCE.registered, 0) < experiment_session.capacity:
+                attendance = ParticipantSignup.ATTENDANCE.registered
+            elif signup_counts.get(ParticipantSignup.ATTENDANCE.waitlist, 0) < waitlist_size:
+                attendance = ParticipantSignup.ATTENDANCE.waitlist
+            else:
+                return None, False
+            return ParticipantSignup.objects.create(invitation=invitation, attendance=attendance), True
+
+
 class ExperimentSession(models.Model):
 
     """
@@ -2835,6 +3268,8 @@ class ExperimentSession(models.Model):
     # ExperimentConfiguration.invitation_text as a fallback
     invitation_text = models.TextField(blank=True)
 
+    objects = PassThroughManager.for_queryset_class(ExperimentSessionQuerySet)()
+
     @property
     def is_same_day(self):
         return self.scheduled_end_date and self.scheduled_date.date() == self.scheduled_end_date.date()
@@ -2844,7 +3279,7 @@ class ExperimentSession(models.Model):
         return self.location and self.location.lower() in ('online', 'internet', 'network', 'remote', 'virtual')
 
     def is_owner(self, user):
-        return self.creator == user or user.is_superuser
+        return self.creator_id == user.pk or user.is_superuser
 
     def to_dict(self, **kwargs):
         scheduled_date = self.scheduled_date
@@ -2869,6 +3304,93 @@ class ExperimentSession(models.Model):
 
     class Meta:
         ordering = ['scheduled_date']
+        index_together = [['scheduled_date', 'scheduled_end_date']]
+
+
+EXPERIMENT_SESSIONS_LAST_MODIFIED_KEY = 'experiment_sessions_last_modified'
+
+
+def get_experiment_sessions_last_modified():
+    """
+    Returns the time any ExperimentSession was last saved or deleted, used to version cached experiment session
+    calendar data. Conservatively assumes a modification now if the timestamp is no longer cached.
+    """
+    last_modified = cache.get(EXPERIMENT_SESSIONS_LAST_MODIFIED_KEY)
+    if last_modified is None:
+        last_modified = datetime.now()
+        if not cache.add(EXPERIMENT_SESSIONS_LAST_MODIFIED_KEY, last_modified, None):
+            last_modified = cache.get(EXPERIMENT_SESSIONS_LAST_MODIFIED_KEY, last_modified)
+    return last_modified
+
+
+@receiver(post_save, sender=ExperimentSession, dispatch_uid='experiment-session-saved')
+@receiver(post_delete, sender=ExperimentSession, dispatch_uid='experiment-session-deleted')
+def update_experiment_sessions_last_modified(sender, **kwargs):
+    cache.set(EXPERIMENT_SESSIONS_LAST_MODIFIED_KEY, datetime.now(), None)
+
+
+class InvitationBatch(models.Model):
+
+    """
+    A set of Invitations sent together by an experimenter. The invitation emails are dispatched in chunks by the
+    outbound email queue, which records delivery progress here.
+    """
+    sender = models.ForeignKey(User, related_name='invitation_batch_set')
+    date_created = models.DateTimeField(auto_now_add=True)
+    number_of_recipients = models.PositiveIntegerField(default=0)
+    number_sent = models.PositiveIntegerField(default=0)
+    number_failed = models.PositiveIntegerField(default=0)
+
+    @property
+    def is_complete(self):
+        return self.number_sent + self.number_failed >= self.number_of_recipients
+
+    def is_owner(self, user):
+        return self.sender_id == user.pk or user.is_superuser
+
+    def create_email_messages(self, recipients, subject=None, plaintext_content=None, html_content=None,
+                              from_email=None, batch_size=None):
+        """
+        Returns a list of invitation emails for this batch, each BCCed to at most batch_size recipients.
+        """
+        if batch_size is None:
+            batch_size = settings.SUBJECT_POOL_INVITATION_BATCH_SIZE
+        messages = []
+        for bcc in batch_iterable(recipients, batch_size):
+            msg = EmailMultiAlternatives(subject=subject, body=plaintext_content, from_email=from_email,
+                                         to=[settings.SERVER_EMAIL], bcc=bcc)
+            msg.attach_alternative(html_content, "text/html")
+            # lets the outbound email queue record delivery progress on this batch
+            msg.invitation_batch = self
+            messages.append(msg)
+        return messages
+
+    def send_email_messages(self, email_messages, connection=None):
+        """
+        Sends the given invitation emails through the configured EMAIL_BACKEND. The outbound email queue records
+        delivery progress as it delivers queued messages, for any other backend the BCCed recipients of the messages
+        sent are counted here.
+        """
+        if connection is None:
+            connection = mail.get_connection()
+        number_sent = connection.send_messages(email_messages) or 0
+        if not isinstance(connection, QueuedEmailBackend):
+            InvitationBatch.objects.filter(pk=self.pk).update(
+                number_sent=models.F('number_sent') + sum(len(msg.bcc) for msg in email_messages[:number_sent]))
+        return number_sent
+
+    def to_dict(self):
+        return {
+            'pk': self.pk,
+            'number_of_recipients': self.number_of_recipients,
+            'number_sent': self.number_sent,
+            'number_failed': self.number_failed,
+            'complete': self.is_complete,
+            'message': u"sent %s/%s" % (self.number_sent, self.number_of_recipients),
+        }
+
+    def __unicode__(self):
+        return u"%s %s (%s/%s sent)" % (self.sender, self.date_created, self.number_sent, self.number_of_recipients)
 
 
 class InvitationQuerySet(models.query.QuerySet):
@@ -2885,6 +3407,7 @@ class Invitation(models.Model):
     experiment_session = models.ForeignKey(ExperimentSession)
     date_created = models.DateTimeField(auto_now_add=True)
     sender = models.ForeignKey(User)
+    batch = models.ForeignKey(InvitationBatch, null=True, blank=True, related_name='invitation_set')
 
     objects = PassThroughManager.for_queryset_class(InvitationQuerySet)()
 
@@ -2943,6 +3466,54 @@ class ParticipantSignupQuerySet(models.query.QuerySet):
             **kwargs)
         return self.filter(**criteria)
 
+    def update_attendance(self, attendance_dict):
+        """
+        Sets the attendance of many signups in this queryset at once, given a dict mapping signup pks to attendance
+        values. Signups are validated and loaded with a single query and updated with one update() per distinct
+        attendance value. SpoolParticipantStatistics and ParticipantExperimentMetadataSummary are adjusted to match
+        since update() bypasses their signal handlers. Raises ParticipantSignup.DoesNotExist if any of the pks aren't
+        in this queryset, returns the number of signups whose attendance changed.
+        """
+        signups = list(self.filter(pk__in=attendance_dict.keys()).values_list(
+            'pk', 'attendance', 'invitation__participant', 'invitation__experiment_session__experiment_metadata'))
+        if len(signups) != len(attendance_dict):
+            raise ParticipantSignup.DoesNotExist("Invalid participant signups: %s" % sorted(
+                set(attendance_dict.keys()) - set(signup[0] for signup in signups)))
+        changed_signups = defaultdict(list)
+        statistics_adjustments = defaultdict(int)
+        summary_participants = defaultdict(set)
+        for pk, attendance, participant_pk, experiment_metadata_pk in signups:
+            new_attendance = attendance_dict[pk]
+            if new_attendance == attendance:
+                continue
+            changed_signups[new_attendance].append(pk)
+            summary_participants[experiment_metadata_pk].add(participant_pk)
+            for field, amount in ((SpoolParticipantStatistics.ATTENDANCE_FIELDS.get(attendance), -1),
+                                  (SpoolParticipantStatistics.ATTENDANCE_FIELDS.get(new_attendance), 1)):
+                if field is not None:
+                    statistics_adjustments[(field, participant_pk)] += amount
+        adjustment_groups = defaultdict(list)
+        for (field, participant_pk), amount in statistics_adjustments.items():
+            adjustment_groups[(field, amount)].append(participant_pk)
+        with transaction.atomic():
+            for attendance, pks in changed_signups.items():
+                ParticipantSignup.objects.filter(pk__in=pks).update(attendance=attendance)
+            for (field, amount), participant_pks in adjustment_groups.items():
+                SpoolParticipantStatistics.objects.adjust(participant_pks, field, amount)
+            for experiment_metadata_pk, participant_pks in summary_participants.items():
+                ParticipantExperimentMetadataSummary.objects.refresh(participant_pks=participant_pks,
+                                                                     experiment_metadata_pk=experiment_metadata_pk)
+        return sum(len(pks) for pks in changed_signups.values())
+
+    def needs_reminder(self, scheduled_date):
+        """
+        Returns signups for experiment sessions scheduled on the given date whose participants have not been sent a
+        reminder email yet.
+        """
+        scheduled_date_range = (datetime.combine(scheduled_date, time.min), datetime.combine(scheduled_date, time.max))
+        return self.filter(invitation__experiment_session__scheduled_date__range=scheduled_date_range,
+                           date_reminded__isnull=True)
+
     def registered(self, **kwargs):
         return self.with_attendance(ParticipantSignup.ATTENDANCE.registered, **kwargs)
 
@@ -2952,6 +3523,16 @@ class ParticipantSignupQuerySet(models.query.QuerySet):
     def waitlist(self, **kwargs):
         return self.with_attendance(ParticipantSignup.ATTENDANCE.waitlist, **kwargs)
 
+    def signup_counts(self, experiment_session_pks):
+        """
+        Returns a dict mapping each of the given experiment session pks to its number of signups, computed with a single
+        grouped query.
+        """
+        signup_counts = defaultdict(int)
+        signup_counts.update(self.filter(invitation__experiment_session__in=experiment_session_pks).values_list(
+            'invitation__experiment_session').annotate(count=models.Count('pk')).order_by())
+        return signup_counts
+
     def upcoming(self, participant=None, **kwargs):
         criteria = dict(attendance__in=[ParticipantSignup.ATTENDANCE.registered, ParticipantSignup.ATTENDANCE.waitlist],
                         invitation__experiment_session__scheduled_date__gt=datetime.now())
@@ -2972,9 +3553,16 @@ class ParticipantSignup(models.Model):
     invitation = models.ForeignKey(Invitation, related_name='signup_set')
     date_created = models.DateTimeField(auto_now_add=True)
     attendance = models.PositiveIntegerField(max_length=1, choices=ATTENDANCE, default=ATTENDANCE.registered)
+    date_reminded = models.DateTimeField(null=True, blank=True,
+                                         help_text=_('When the session reminder email was sent to this participant'))
 
     objects = PassThroughManager.for_queryset_class(ParticipantSignupQuerySet)()
 
+    def __init__(self, *args, **kwargs):
+        super(ParticipantSignup, self).__init__(*args, **kwargs)
+        # attendance as last loaded from or saved to the database, used to maintain SpoolParticipantStatistics
+        self._loaded_attendance = None if self.pk is None else self.attendance
+
     def to_dict(self, signup_count=0):
         experiment_session = self.invitation.experiment_session
         experiment_metadata = experiment_session.experiment_metadata
@@ -3016,13 +3604,336 @@ def compare_dates(date1, date2):
         return date2
 
 
+class SpoolParticipantStatisticsQuerySet(models.query.QuerySet):
+
+    def adjust(self, participant_pks, field, amount=1, batch_size=500):
+        """
+        Atomically adds amount (which may be negative) to the given counter of each participant's statistics, creating
+        missing statistics rows for positive adjustments. Counters are never decremented below zero.
+        """
+        if not amount:
+            return
+        for pks in batch_iterable(set(participant_pks), batch_size):
+            with transaction.atomic():
+                statistics = self.filter(participant__in=pks)
+                existing_pks = set(statistics.values_list('participant', flat=True))
+                if amount < 0:
+                    statistics = statistics.filter(**{field + '__gte': -amount})
+                statistics.update(**{field: models.F(field) + amount})
+                if amount > 0:
+                    self.bulk_create([SpoolParticipantStatistics(participant_id=pk, **{field: amount})
+                                      for pk in pks if pk not in existing_pks])
+
+    def rebuild(self, batch_size=500):
+        """
+        Recomputes statistics for all participants from scratch with one grouped aggregate query over Invitations and
+        one over ParticipantSignups.
+        """
+        statistics = defaultdict(dict)
+        for participant_pk, invitations in Invitation.objects.values_list('participant').annotate(
+                count=models.Count('pk')).order_by():
+            statistics[participant_pk]['invitations'] = invitations
+        for participant_pk, attendance, count in ParticipantSignup.objects.filter(
+                attendance__in=SpoolParticipantStatistics.ATTENDANCE_FIELDS.keys()).values_list(
+                'invitation__participant', 'attendance').annotate(count=models.Count('pk')).order_by():
+            statistics[participant_pk][SpoolParticipantStatistics.ATTENDANCE_FIELDS[attendance]] = count
+        with transaction.atomic():
+            self.all().delete()
+            self.bulk_create([SpoolParticipantStatistics(participant_id=participant_pk, **counts)
+                              for participant_pk, counts in statistics.items()], batch_size=batch_size)
+        return len(statistics)
+
+
 class SpoolParticipantStatistics(models.Model):
-    participant = models.ForeignKey(Participant, related_name='spool_statistics_set')
+
+    """
+    Denormalized subject pool attendance record for a participant, used to filter invitation candidates by reliability.
+    Kept up to date by Invitation and ParticipantSignup signal handlers, bulk operations that bypass signals should
+    adjust() the affected counters afterwards. The rebuildspoolstatistics management command recomputes all of them.
+    """
+    ATTENDANCE_FIELDS = {
+        ParticipantSignup.ATTENDANCE.participated: 'participations',
+        ParticipantSignup.ATTENDANCE.discharged: 'discharges',
+        ParticipantSignup.ATTENDANCE.absent: 'absences',
+    }
+
+    participant = models.OneToOneField(Participant, related_name='spool_statistics')
     absences = models.PositiveIntegerField(default=0)
     discharges = models.PositiveIntegerField(default=0)
     participations = models.PositiveIntegerField(default=0)
     invitations = models.PositiveIntegerField(default=0)
 
+    objects = PassThroughManager.for_queryset_class(SpoolParticipantStatisticsQuerySet)()
+
+    def __unicode__(self):
+        return u"%s invitations: %s participations: %s discharges: %s absences: %s" % (
+            self.participant, self.invitations, self.participations, self.discharges, self.absences)
+
+
+@receiver(post_save, sender=Invitation, dispatch_uid='invitation-statistics-saved')
+def increment_invitation_statistics(sender, instance=None, created=False, raw=False, **kwargs):
+    if created and not raw:
+        SpoolParticipantStatistics.objects.adjust([instance.participant_id], 'invitations')
+
+
+@receiver(post_delete, sender=Invitation, dispatch_uid='invitation-statistics-deleted')
+def decrement_invitation_statistics(sender, instance=None, **kwargs):
+    SpoolParticipantStatistics.objects.adjust([instance.participant_id], 'invitations', -1)
+
+
+@receiver(post_save, sender=ParticipantSignup, dispatch_uid='signup-statistics-saved')
+@receiver(post_delete, sender=ParticipantSignup, dispatch_uid='signup-statistics-deleted')
+def update_attendance_statistics(sender, instance=None, raw=False, **kwargs):
+    if raw:
+        return
+    previous_attendance = instance._loaded_attendance
+    current_attendance = None if kwargs['signal'] is post_delete else instance.attendance
+    instance._loaded_attendance = current_attendance
+    if previous_attendance == current_attendance:
+        return
+    previous_field = SpoolParticipantStatistics.ATTENDANCE_FIELDS.get(previous_attendance)
+    current_field = SpoolParticipantStatistics.ATTENDANCE_FIELDS.get(current_attendance)
+    if previous_field is None and current_field is None:
+        return
+    participant_pk = Invitation.objects.filter(pk=instance.invitation_id).values_list('participant', flat=True).first()
+    if participant_pk is None:
+        return
+    if previous_field is not None:
+        SpoolParticipantStatistics.objects.adjust([participant_pk], previous_field, -1)
+    if current_field is not None:
+        SpoolParticipantStatistics.objects.adjust([participant_pk], current_field)
+
+
+class ParticipantExperimentMetadataSummaryQuerySet(models.query.QuerySet):
+
+    def refresh(self, participant_pks=None, experiment_metadata_pk=None, batch_size=500):
+        """
+        Recomputes the last invited / last participated summaries for the given participants (or all participants if
+        participant_pks is None) and experiment metadata (or all experiment metadata) with grouped aggregate queries.
+        """
+        if participant_pks is None:
+            with transaction.atomic():
+                self._refresh(experiment_metadata_pk=experiment_metadata_pk)
+            return
+        for pks in batch_iterable(participant_pks, batch_size):
+            with transaction.atomic():
+                self._refresh(participant_pks=pks, experiment_metadata_pk=experiment_metadata_pk)
+
+    def _refresh(self, participant_pks=None, experiment_metadata_pk=None):
+        invitations = Invitation.objects.all()
+        signups = ParticipantSignup.objects.registered_or_participated()
+        summaries = self.all()
+        if participant_pks is not None:
+            invitations = invitations.filter(participant__in=participant_pks)
+            signups = signups.filter(invitation__participant__in=participant_pks)
+            summaries = summaries.filter(participant__in=participant_pks)
+        if experiment_metadata_pk is not None:
+            invitations = invitations.filter(experiment_session__experiment_metadata=experiment_metadata_pk)
+            signups = signups.filter(invitation__experiment_session__experiment_metadata=experiment_metadata_pk)
+            summaries = summaries.filter(experiment_metadata=experiment_metadata_pk)
+        summary_dict = defaultdict(dict)
+        for participant_pk, experiment_metadata_pk, last_invited in invitations.values_list(
+                'participant', 'experiment_session__experiment_metadata').annotate(
+                last_invited=Max('date_created')).order_by():
+            summary_dict[(participant_pk, experiment_metadata_pk)]['last_invited'] = last_invited
+        for participant_pk, experiment_metadata_pk, last_participated in signups.values_list(
+                'invitation__participant', 'invitation__experiment_session__experiment_metadata').annotate(
+                last_participated=Max('invitation__experiment_session__scheduled_date')).order_by():
+            summary_dict[(participant_pk, experiment_metadata_pk)]['last_participated'] = last_participated
+        summaries.delete()
+        self.bulk_create([ParticipantExperimentMetadataSummary(participant_id=participant_pk,
+                                                               experiment_metadata_id=experiment_metadata_pk, **dates)
+                          for (participant_pk, experiment_metadata_pk), dates in summary_dict.items()])
+
+
+class ParticipantExperimentMetadataSummary(models.Model):
+
+    """
+    Denormalized per participant, per experiment metadata subject pool history used to compute invitation
+    eligibility. Kept up to date by Invitation and ParticipantSignup signal handlers, bulk operations that bypass
+    signals should invoke ParticipantExperimentMetadataSummary.objects.refresh() afterwards.
+    """
+    participant = models.ForeignKey(Participant, related_name='experiment_metadata_summary_set')
+    experiment_metadata = models.ForeignKey(ExperimentMetadata, related_name='participant_summary_set')
+    last_invited = models.DateTimeField(null=True, blank=True)
+    last_participated = models.DateTimeField(null=True, blank=True,
+                                             help_text=_('Scheduled date of the latest registered or attended session'))
+
+    objects = PassThroughManager.for_queryset_class(ParticipantExperimentMetadataSummaryQuerySet)()
+
+    def __unicode__(self):
+        return u"%s %s invited: %s participated: %s" % (self.participant, self.experiment_metadata,
+                                                         self.last_invited, self.last_participated)
+
+    class Meta:
+        unique_together = (('participant', 'experiment_metadata'),)
+
+
+@receiver(post_save, sender=Invitation, dispatch_uid='invitation-summary-saved')
+@receiver(post_delete, sender=Invitation, dispatch_uid='invitation-summary-deleted')
+def refresh_invitation_summary(sender, instance=None, **kwargs):
+    experiment_metadata_pk = ExperimentSession.objects.filter(pk=instance.experiment_session_id).values_list(
+        'experiment_metadata', flat=True).first()
+    ParticipantExperimentMetadataSummary.objects.refresh(participant_pks=[instance.participant_id],
+                                                         experiment_metadata_pk=experiment_metadata_pk)
+
+
+@receiver(post_save, sender=ParticipantSignup, dispatch_uid='signup-summary-saved')
+@receiver(post_delete, sender=ParticipantSignup, dispatch_uid='signup-summary-deleted')
+def refresh_signup_summary(sender, instance=None, **kwargs):
+    invitation = Invitation.objects.filter(pk=instance.invitation_id).values_list(
+        'participant', 'experiment_session__experiment_metadata').first()
+    if invitation is not None:
+        participant_pk, experiment_metadata_pk = invitation
+        ParticipantExperimentMetadataSummary.objects.refresh(participant_pks=[participant_pk],
+                                                             experiment_metadata_pk=experiment_metadata_pk)
+
+
+class OutboundEmailQuerySet(models.query.QuerySet):
+
+    def pending(self):
+        return self.filter(status=OutboundEmail.STATUS.pending)
+
+    def failed(self):
+        return self.filter(status=OutboundEmail.STATUS.failed)
+
+    def due(self, now=None):
+        if now is None:
+            now = datetime.now()
+        return self.pending().filter(next_attempt__lte=now).order_by('next_attempt', 'pk')
+
+    def queue_depth(self):
+        return self.exclude(status=OutboundEmail.STATUS.sent).count()
+
+    def status_counts(self):
+        return dict(self.values_list('status').annotate(count=models.Count('pk')).order_by())
+
+    def enqueue(self, email_messages, **kwargs):
+        """
+        Persists the given django.core.mail.EmailMessages to the outbound queue with a single insert, returns the
+        number of messages queued. Any keyword arguments are set on each OutboundEmail, e.g., invitation_batch.
+        """
+        outbound_emails = [OutboundEmail.from_message(message, **kwargs) for message in email_messages
+                           if message.recipients()]
+        self.bulk_create(outbound_emails)
+        return len(outbound_emails)
+
+    def claim(self, batch_size=100, lease=600, now=None):
+        """
+        Atomically marks up to batch_size due messages as being sent by this worker and returns them. Claimed
+        messages whose lease expires (e.g., the worker crashed) become eligible for delivery again.
+        """
+        if now is None:
+            now = datetime.now()
+        # release expired leases held by workers that never finished their batch
+        self.filter(status=OutboundEmail.STATUS.sending,
+                    next_attempt__lte=now).update(status=OutboundEmail.STATUS.pending)
+        pks = list(self.due(now).values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return []
+        claim_token = OutboundEmail.generate_claim_token()
+        self.filter(pk__in=pks, status=OutboundEmail.STATUS.pending).update(
+            status=OutboundEmail.STATUS.sending, claim_token=claim_token,
+            next_attempt=now + timedelta(seconds=lease))
+        return list(self.filter(claim_token=claim_token, status=OutboundEmail.STATUS.sending).order_by('pk'))
+
+
+class OutboundEmail(models.Model):
+
+    """
+    Persistent outbound email queue, populated by vcweb.core.mailqueue.QueuedEmailBackend and delivered by the
+    sendqueuedemail management command.
+    """
+    STATUS = Choices(
+        ('pending', _('pending')),
+        ('sending', _('sending')),
+        ('sent', _('sent')),
+        ('failed', _('failed')),
+    )
+    subject = models.TextField(blank=True)
+    body = models.TextField(blank=True)
+    html_body = models.TextField(blank=True)
+    from_email = models.CharField(max_length=254)
+    to = models.TextField(blank=True, help_text=_('Newline separated recipient addresses'))
+    cc = models.TextField(blank=True)
+    bcc = models.TextField(blank=True)
+    headers = models.TextField(blank=True, help_text=_('JSON encoded extra message headers, e.g., Reply-To'))
+    status = models.CharField(max_length=16, choices=STATUS, default=STATUS.pending, db_index=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    claim_token = models.CharField(max_length=32, blank=True, db_index=True)
+    date_created = models.DateTimeField(auto_now_add=True)
+    next_attempt = models.DateTimeField(default=datetime.now, db_index=True)
+    date_sent = models.DateTimeField(null=True, blank=True)
+    invitation_batch = models.ForeignKey(InvitationBatch, null=True, blank=True, related_name='outbound_email_set')
+
+    objects = PassThroughManager.for_queryset_class(OutboundEmailQuerySet)()
+
+    @staticmethod
+    def generate_claim_token():
+        return base64.b16encode(hashlib.md5(u"%s%s" % (datetime.now(), random.random())).digest())
+
+    @staticmethod
+    def from_message(message, **kwargs):
+        html_body = u''
+        for content, mimetype in getattr(message, 'alternatives', []):
+            if mimetype == 'text/html':
+                html_body = content
+                break
+        return OutboundEmail(subject=message.subject, body=message.body, html_body=html_body,
+                             from_email=message.from_email or settings.DEFAULT_FROM_EMAIL,
+                             to=u'\n'.join(message.to), cc=u'\n'.join(message.cc), bcc=u'\n'.join(message.bcc),
+                             headers=json.dumps(message.extra_headers) if message.extra_headers else u'',
+                             invitation_batch=kwargs.pop('invitation_batch', getattr(message, 'invitation_batch', None)),
+                             **kwargs)
+
+    def to_message(self, connection=None):
+        # addresses are newline separated, they may contain spaces, e.g., "Jane Doe <jane@example.com>"
+        msg = EmailMultiAlternatives(subject=self.subject, body=self.body, from_email=self.from_email,
+                                     to=self.to.splitlines(), cc=self.cc.splitlines(), bcc=self.bcc.splitlines(),
+                                     headers=json.loads(self.headers) if self.headers else None,
+                                     connection=connection)
+        if self.html_body:
+            msg.attach_alternative(self.html_body, "text/html")
+        return msg
+
+    def mark_sent(self):
+        self.status = OutboundEmail.STATUS.sent
+        self.attempts += 1
+        self.date_sent = datetime.now()
+        self.last_error = u''
+        self.save()
+        self.update_invitation_batch('number_sent')
+
+    def update_invitation_batch(self, field):
+        """
+        Adds the BCCed invitation recipients of this message to the given InvitationBatch progress counter.
+        """
+        if self.invitation_batch_id is not None:
+            InvitationBatch.objects.filter(pk=self.invitation_batch_id).update(
+                **{field: models.F(field) + len(self.bcc.splitlines())})
+
+    def mark_failed(self, error, max_attempts=5, delay=60, backoff=2):
+        """
+        Records a delivery failure, rescheduling the message with exponential backoff until max_attempts is reached.
+        """
+        self.attempts += 1
+        self.last_error = unicode(error)
+        if self.attempts >= max_attempts:
+            self.status = OutboundEmail.STATUS.failed
+        else:
+            self.status = OutboundEmail.STATUS.pending
+            self.next_attempt = datetime.now() + timedelta(seconds=delay * (backoff ** (self.attempts - 1)))
+        self.save()
+        if self.status == OutboundEmail.STATUS.failed:
+            self.update_invitation_batch('number_failed')
+
+    def __unicode__(self):
+        return u"[%s] %s -> %s" % (self.status, self.subject, u', '.join(self.to.splitlines()))
+
+    class Meta:
+        ordering = ['next_attempt']
+
 
 @simplecache
 def get_chat_message_parameter():
@@ -3091,20 +4002,107 @@ def set_full_name(user, full_name):
     return updated
 
 
+def set_user_passwords(users, password=None):
+    """
+    Sets the password for all of the given users and returns a dict mapping user pks to their plaintext password.
+    A shared password is hashed once and applied with a single update, otherwise each user is assigned a random
+    password.
+    """
+    if password is not None and password.strip():
+        User.objects.filter(pk__in=[user.pk for user in users]).update(password=make_password(password))
+        return dict((user.pk, password) for user in users)
+    user_passwords = {}
+    for user in users:
+        random_password = User.objects.make_random_password()
+        User.objects.filter(pk=user.pk).update(password=make_password(random_password))
+        user_passwords[user.pk] = random_password
+    return user_passwords
+
+
+def batch_iterable(iterable, batch_size):
+    """
+    Generator yielding lists of at most batch_size items from the given (possibly lazy) iterable.
+    """
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def reservoir_sample(iterable, size, rng=None):
+    """
+    Returns a uniform random sample of at most size items from the given (possibly lazy) iterable in a single pass,
+    holding only the sample in memory.
+    """
+    if rng is None:
+        rng = random
+    reservoir = []
+    for index, item in enumerate(iterable):
+        if index < size:
+            reservoir.append(item)
+        else:
+            replacement_index = rng.randint(0, index)
+            if replacement_index < size:
+                reservoir[replacement_index] = item
+    return reservoir
+
+
 def send_email(template=None, context=None, subject=None, from_email=None, to_email=None, bcc=None):
     """
     Utility function to send emails. Expects a plaintext markdown template and converts it into an HTML message as well.
     """
-    plaintext_template = get_template(template)
-    c = Context(context)
-    plaintext_content = plaintext_template.render(c)
-    html_content = markdown.markdown(plaintext_content)
+    plaintext_content, html_content = render_markdown_template(template, context)
 
     msg = EmailMultiAlternatives(subject=subject, body=plaintext_content, from_email=from_email, to=to_email, bcc=bcc)
     msg.attach_alternative(html_content, "text/html")
     msg.send()
 
 
+def send_session_reminders(scheduled_date, subject="Reminder Email", from_email=None, batch_size=None,
+                           connection=None):
+    """
+    Sends an individually addressed reminder email to every participant signed up for an ExperimentSession scheduled on
+    the given date that hasn't been reminded yet. Signups are gathered with a single joined query, each session's
+    template is rendered once, and messages are sent in chunks of batch_size over a single connection. Each chunk is
+    sent and recorded in the same transaction so an interrupted run can be resumed without sending duplicates.
+    Returns the number of reminders sent.
+    """
+    if from_email is None:
+        from_email = settings.SERVER_EMAIL
+    if batch_size is None:
+        batch_size = settings.SUBJECT_POOL_REMINDER_BATCH_SIZE
+    signups = ParticipantSignup.objects.needs_reminder(scheduled_date).select_related(
+        'invitation__experiment_session', 'invitation__participant__user').order_by('invitation__experiment_session',
+                                                                                     'pk')
+    messages = []
+    for experiment_session, session_signups in itertools.groupby(signups.iterator(),
+                                                                 key=lambda signup: signup.invitation.experiment_session):
+        plaintext_content, html_content = render_markdown_template('email/reminder-email.txt',
+                                                                   {'session': experiment_session})
+        for signup in session_signups:
+            msg = EmailMultiAlternatives(subject=subject, body=plaintext_content, from_email=from_email,
+                                         to=[signup.invitation.participant.email])
+            msg.attach_alternative(html_content, "text/html")
+            messages.append((signup.pk, msg))
+    if not messages:
+        return 0
+    if connection is None:
+        connection = mail.get_connection()
+    number_sent = 0
+    connection.open()
+    try:
+        for batch in batch_iterable(messages, batch_size):
+            with transaction.atomic():
+                number_sent += connection.send_messages([email_message for signup_pk, email_message in batch]) or 0
+                ParticipantSignup.objects.filter(pk__in=[signup_pk for signup_pk, email_message in batch]).update(
+                    date_reminded=datetime.now())
+    finally:
+        connection.close()
+    return number_sent
+
+
 @receiver(signals.system_daily_tick, dispatch_uid='send-reminder-emails')
 def send_reminder_emails(sender, start=None, **kwargs):
     """
@@ -3114,16 +4112,100 @@ def send_reminder_emails(sender, start=None, **kwargs):
     if settings.DEBUG:
         logger.debug("not sending reminder emails in debug mode")
         return
-    tomorrow = date.today() + timedelta(days=1)
-    start_date_time = datetime.combine(tomorrow, time.min)
-    end_date_time = datetime.combine(tomorrow, time.max)
-    es_list = ExperimentSession.objects.filter(scheduled_date__range=(start_date_time, end_date_time))
-    for es in es_list:
-        participant_emails = ParticipantSignup.objects.filter(invitation__experiment_session=es).values_list(
-            'invitation__participant__email', flat=True)
-        logger.debug("subject pool sending reminder emails to %s", participant_emails)
-        send_email("email/reminder-email.txt", {"session": es}, "Reminder Email",
-                   settings.SERVER_EMAIL, participant_emails)
+    number_sent = send_session_reminders(date.today() + timedelta(days=1))
+    logger.debug("subject pool sent %d reminder emails", number_sent)
+
+
+def _state_version_key(model_name, pk):
+    return 'state_version:%s:%s' % (model_name, pk)
+
+
+def get_state_versions(experiment_pk, group_pks=()):
+    """
+    Returns a list of opaque version tokens for the given experiment followed by the given groups. Tokens change
+    whenever the state shown in participant view models for the experiment or group changes. Missing versions are
+    conservatively assumed to have just changed.
+    """
+    keys = [_state_version_key('experiment', experiment_pk)]
+    keys.extend(_state_version_key('group', group_pk) for group_pk in group_pks)
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            version = uuid.uuid4().hex
+            if not cache.add(key, version, None):
+                version = cache.get(key, version)
+            versions[key] = version
+    return [versions[key] for key in keys]
+
+
+def get_group_state_cache_key(prefix, experiment_pk, group_pk, round_data_pk):
+    """
+    Returns a cache key for group level view model data in the given round that changes along with the experiment and
+    group state versions.
+    """
+    experiment_version, group_version = get_state_versions(experiment_pk, [group_pk])
+    return '%s:%s:%s:%s:%s' % (prefix, group_pk, round_data_pk, experiment_version, group_version)
+
+
+def bump_state_version(experiment_pk=None, group_pks=()):
+    """
+    Invalidates the view model state versions for the given experiment and groups, for code that modifies data
+    values without saving model instances (e.g., QuerySet.update or bulk_create).
+    """
+    keys = [_state_version_key('group', group_pk) for group_pk in group_pks]
+    if experiment_pk is not None:
+        keys.append(_state_version_key('experiment', experiment_pk))
+    cache.set_many(dict((key, uuid.uuid4().hex) for key in keys), None)
+
+
+@receiver(post_save, sender=Experiment, dispatch_uid='experiment-state-version')
+@receiver(post_save, sender=RoundData, dispatch_uid='round-data-state-version')
+def bump_experiment_state_version(sender, instance=None, **kwargs):
+    bump_state_version(experiment_pk=instance.pk if sender is Experiment else instance.experiment_id)
+
+
+@receiver(post_save, sender=ParticipantExperimentRelationship, dispatch_uid='participant-joined-state-version')
+@receiver(post_delete, sender=ParticipantExperimentRelationship, dispatch_uid='participant-removed-state-version')
+def bump_roster_state_version(sender, instance=None, **kwargs):
+    bump_state_version(experiment_pk=instance.experiment_id)
+
+
+@receiver(post_save, sender=ParticipantGroupRelationship, dispatch_uid='group-membership-state-version')
+def bump_group_membership_state_version(sender, instance=None, **kwargs):
+    bump_state_version(experiment_pk=instance.group.experiment_id)
+
+
+@receiver(post_save, sender=GroupClusterDataValue, dispatch_uid='group-cluster-data-value-state-version')
+def bump_group_cluster_state_version(sender, instance=None, **kwargs):
+    bump_state_version(experiment_pk=instance.group_cluster.experiment_id)
+
+
+@receiver(post_save, sender=GroupRoundDataValue, dispatch_uid='group-data-value-state-version')
+@receiver(post_save, sender=ParticipantRoundDataValue, dispatch_uid='participant-data-value-state-version')
+@receiver(post_save, sender=ChatMessage, dispatch_uid='chat-message-state-version')
+@receiver(post_save, sender=Comment, dispatch_uid='comment-state-version')
+@receiver(post_save, sender=Like, dispatch_uid='like-state-version')
+def bump_group_state_version(sender, instance=None, **kwargs):
+    if sender is GroupRoundDataValue:
+        group_pk = instance.group_id
+    else:
+        group_pk = instance.participant_group_relationship.group_id
+    bump_state_version(group_pks=[group_pk])
+
+
+@receiver(m2m_changed, sender=User.groups.through, dispatch_uid='user-groups-changed')
+def invalidate_cached_group_names(sender, instance=None, action=None, reverse=False, pk_set=None, **kwargs):
+    """
+    Invalidates the session cached group names used by group_required when group memberships change.
+    """
+    if action == 'pre_clear' and reverse:
+        # clearing a group's user_set doesn't provide the affected users in post_clear
+        invalidate_group_names(*instance.user_set.values_list('pk', flat=True))
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        if not reverse:
+            invalidate_group_names(instance.pk)
+        elif pk_set:
+            invalidate_group_names(*pk_set)
 
 
 @receiver(signals.system_daily_tick, dispatch_uid='update-daily-experiments')
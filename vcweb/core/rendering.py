@@ -0,0 +1,89 @@
+"""
+Template and markdown rendering utilities for bulk email. Compiled templates are kept in a process-wide cache and
+markdown conversion reuses a single (per-thread) markdown.Markdown instance.
+"""
+import hashlib
+import logging
+import threading
+
+from django.conf import settings
+from django.template import Context
+from django.template.loader import select_template
+from django.utils.encoding import force_text
+from django.utils.html import conditional_escape
+import markdown
+
+
+logger = logging.getLogger(__name__)
+
+_template_cache = {}
+_local = threading.local()
+
+
+def get_cached_template(*template_names):
+    """
+    Returns the first compiled template found for the given template names, memoized for the lifetime of the process
+    (template changes are always picked up in DEBUG mode).
+    """
+    if settings.DEBUG:
+        return select_template(template_names)
+    template = _template_cache.get(template_names)
+    if template is None:
+        template = _template_cache[template_names] = select_template(template_names)
+    return template
+
+
+def clear_template_cache():
+    _template_cache.clear()
+
+
+def get_markdown():
+    md = getattr(_local, 'markdown', None)
+    if md is None:
+        md = _local.markdown = markdown.Markdown()
+    return md
+
+
+def render_markdown(text):
+    return get_markdown().reset().convert(text)
+
+
+def render_markdown_template(template_names, context):
+    """
+    Renders the given plaintext markdown template(s), returns a (plaintext_content, html_content) tuple.
+    """
+    if isinstance(template_names, basestring):
+        template_names = (template_names,)
+    if not isinstance(context, Context):
+        context = Context(context)
+    plaintext_content = get_cached_template(*template_names).render(context)
+    return plaintext_content, render_markdown(plaintext_content)
+
+
+class SplicedMarkdownTemplate(object):
+
+    """
+    Renders a plaintext markdown template and its HTML conversion once for a shared context, substituting opaque
+    placeholders for the given per-recipient fields. render() then splices recipient values into the pre-rendered
+    content. Spliced fields must only be output directly in the template, e.g., {{ individual_points }}, and never be
+    passed through filters or used in template tags.
+    """
+
+    def __init__(self, template_names, context, fields=()):
+        if not isinstance(context, Context):
+            context = Context(context)
+        self.placeholders = {}
+        for field in fields:
+            placeholder = 'VCWEBFIELD%s' % hashlib.md5(field).hexdigest()
+            self.placeholders[field] = placeholder
+            context[field] = placeholder
+        self.plaintext_content, self.html_content = render_markdown_template(template_names, context)
+
+    def render(self, **values):
+        plaintext_content = self.plaintext_content
+        html_content = self.html_content
+        for field, placeholder in self.placeholders.items():
+            value = force_text(conditional_escape(values.get(field, '')))
+            plaintext_content = plaintext_content.replace(placeholder, value)
+            html_content = html_content.replace(placeholder, value)
+        return plaintext_content, html_content
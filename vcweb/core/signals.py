@@ -5,6 +5,8 @@ experiment_started = Signal(
     providing_args=["experiment", "timestamp", "experimenter"])
 participant_added = Signal(
     providing_args=['experiment', 'timestamp', 'participant_group_relationship'])
+participants_added = Signal(
+    providing_args=['experiment', 'timestamp', 'participant_group_relationships'])
 round_started = Signal(
     providing_args=["experiment", 'timestamp', 'round_configuration'])
 round_ended = Signal(
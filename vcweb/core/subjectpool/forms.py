@@ -61,6 +61,9 @@ class SessionInviteForm(forms.Form):
         "Number of participants to invite to the selected experiment session(s)"), widget=NumberInput(attrs={'value': 0, 'class': 'input-mini'}))
     only_undergrad = forms.BooleanField(help_text=_(
         "Limit to self-reported undergraduate students"), widget=CheckboxInput(attrs={'checked': True}), required=False)
+    max_absences = forms.IntegerField(required=False, min_value=0, help_text=_(
+        "Exclude participants that have missed more than this many experiment sessions"),
+        widget=NumberInput(attrs={'class': 'input-mini'}))
     affiliated_institution = forms.CharField(required=False, widget=autocomplete_light.TextWidget(
         InstitutionAutocomplete, attrs={'value': 'Arizona State University'}))
     invitation_subject = forms.CharField(widget=widgets.TextInput())
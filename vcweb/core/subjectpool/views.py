@@ -1,39 +1,41 @@
 from datetime import datetime, time, timedelta
 from time import mktime
-import itertools
+import hashlib
+import json
 import logging
-import random
-import unicodecsv
-import markdown
 
+from django.core.cache import cache
+from django.core import mail
 from django.core.mail import EmailMultiAlternatives
+from django.core.urlresolvers import reverse
 from django.db import transaction
-
-from django.template import Context
-from django.template.loader import get_template
 from django.forms.models import modelformset_factory
 from django.conf import settings
 from django.contrib import messages
 from django.core.exceptions import PermissionDenied
-from django.http import HttpResponse
-from django.shortcuts import render, redirect, get_object_or_404
+from django.http import Http404
+from django.shortcuts import render, redirect
 from django.utils.translation import ugettext_lazy as _
-from django.views.decorators.http import require_GET, require_POST
+from django.views.decorators.http import require_GET, require_POST, condition
 
 from vcweb.core.subjectpool.forms import (
     SessionInviteForm, ExperimentSessionForm, ParticipantAttendanceForm, CancelSignupForm)
-from vcweb.core.views import mimetypes
 
 from vcweb.core.models import (
-    ExperimentSession, ExperimentMetadata, Invitation, send_email)
-from vcweb.core.http import JsonResponse, dumps
+    ExperimentSession, ExperimentMetadata, Invitation, InvitationBatch, send_email,
+    get_experiment_sessions_last_modified)
+from vcweb.core.http import CsvResponse, JsonResponse, dumps
 from vcweb.core.decorators import group_required, ownership_required
+from vcweb.core.rendering import render_markdown_template
 from vcweb.core.models import (
-    Participant, Institution, ParticipantSignup, PermissionGroup)
+    Participant, Institution, ParticipantSignup, PermissionGroup, ParticipantExperimentMetadataSummary,
+    SpoolParticipantStatistics)
 
 
 logger = logging.getLogger(__name__)
 
+SESSION_EVENTS_CACHE_TIMEOUT = 300
+
 
 @group_required(PermissionGroup.experimenter)
 @require_GET
@@ -65,40 +67,52 @@ def manage_experiment_session(request, pk):
     form = ExperimentSessionForm(request.POST or None, pk=pk, user=request.user)
     if form.is_valid():
         es = form.save()
-        return JsonResponse({ 'success': True, 'session': es })
+        return JsonResponse({'success': True, 'session': es.to_dict()})
     error_list = [e for e in form.errors]
     return JsonResponse({'success': False, 'errors': error_list })
 
 
+def get_session_events_range(request):
+    return timestamp_to_datetime(request.GET.get('from')), timestamp_to_datetime(request.GET.get('to'))
+
+
+def get_session_events_etag(request):
+    start, end = get_session_events_range(request)
+    return hashlib.md5(u"%s:%s:%s" % (get_experiment_sessions_last_modified().isoformat(), start, end)).hexdigest()
+
+
+def get_session_events_last_modified(request):
+    return get_experiment_sessions_last_modified()
+
+
 @group_required(PermissionGroup.experimenter)
 @require_GET
+@condition(etag_func=get_session_events_etag, last_modified_func=get_session_events_last_modified)
 def get_session_events(request):
     """
     Returns the list of Experiment sessions that fall within the given range,
-    Used by the subject pool calendar to display experiment sessions falling within the date range shown
+    Used by the subject pool calendar to display experiment sessions falling within the date range shown. Results are
+    cached per range until an experiment session is modified.
     """
-    from_date = request.GET.get('from', None)
-    to_date = request.GET.get('to', None)
-    queryset = ExperimentSession.objects.select_related(
-        'experiment_metadata').filter()
-    if to_date:
-        queryset = queryset.filter(
-            scheduled_end_date__gte=timestamp_to_datetime(from_date)
-        )
-
-    objects_body = []
-    for event in queryset:
-        index = event.pk % 20  # for color selection
-        field = {
-            "id": event.pk,
-            "title": event.experiment_metadata.title,
-            "url": "session/detail/event/" + str(event.pk),
-            "class": "event-color-" + str(index),
-            "start": datetime_to_timestamp(event.scheduled_date),
-            "end": datetime_to_timestamp(event.scheduled_end_date),
-            "capacity": event.capacity
-        }
-        objects_body.append(field)
+    start, end = get_session_events_range(request)
+    cache_key = 'session_events:%s' % get_session_events_etag(request)
+    objects_body = cache.get(cache_key)
+    if objects_body is None:
+        objects_body = []
+        queryset = ExperimentSession.objects.overlapping(start, end).values_list(
+            'pk', 'experiment_metadata__title', 'scheduled_date', 'scheduled_end_date', 'capacity')
+        for pk, title, scheduled_date, scheduled_end_date, capacity in queryset:
+            index = pk % 20  # for color selection
+            objects_body.append({
+                "id": pk,
+                "title": title,
+                "url": "session/detail/event/" + str(pk),
+                "class": "event-color-" + str(index),
+                "start": datetime_to_timestamp(scheduled_date),
+                "end": datetime_to_timestamp(scheduled_end_date),
+                "capacity": capacity
+            })
+        cache.set(cache_key, objects_body, SESSION_EVENTS_CACHE_TIMEOUT)
 
     objects_head = {"success": True, "result": objects_body}
 
@@ -107,16 +121,17 @@ def get_session_events(request):
 
 def timestamp_to_datetime(timestamp):
     """
-    Converts string timestamp to python datetime object with json fix
+    Converts a string unix timestamp in seconds or milliseconds (javascript) to a python datetime, returns None if the
+    timestamp is missing or invalid
     """
     if isinstance(timestamp, (str, unicode)):
-
-        if len(timestamp) == 13:
-            timestamp = int(timestamp) / 1000
-
-        return datetime.fromtimestamp(timestamp)
-    else:
-        return ""
+        digits = timestamp.strip().rstrip('/')
+        if digits.isdigit():
+            timestamp = int(digits)
+            if len(digits) == 13:
+                timestamp /= 1000
+            return datetime.fromtimestamp(timestamp)
+    return None
 
 
 def datetime_to_timestamp(date):
@@ -154,12 +169,14 @@ def get_invitations_count(request):
         experiment_metadata_pk = experiment_metadata_pk_list[0]
 
         only_undergrad = request.POST.get('only_undergrad')
+        max_absences = request.POST.get('max_absences', '')
+        max_absences = int(max_absences) if max_absences.isdigit() else None
 
         potential_participants = get_potential_participants(experiment_metadata_pk, affiliated_institution,
-                                                            only_undergrad=only_undergrad)
+                                                            only_undergrad=only_undergrad, max_absences=max_absences)
         return JsonResponse({
             'success': True,
-            'invitesCount': len(potential_participants)
+            'invitesCount': potential_participants.count()
         })
     else:
         return JsonResponse({
@@ -169,16 +186,11 @@ def get_invitations_count(request):
 
 
 def get_invitation_email_content(custom_invitation_text, experiment_session_ids):
-    plaintext_template = get_template('email/invitation-email.txt')
-    c = Context({
+    return render_markdown_template('email/invitation-email.txt', {
         'invitation_text': custom_invitation_text,
         'session_list': ExperimentSession.objects.filter(pk__in=experiment_session_ids),
         'SITE_URL': settings.SITE_URL,
     })
-    plaintext_content = plaintext_template.render(c)
-    html_content = markdown.markdown(plaintext_content)
-
-    return plaintext_content, html_content
 
 
 @group_required(PermissionGroup.experimenter)
@@ -215,43 +227,57 @@ def send_invitations(request):
             experiment_metadata_pk = experiment_metadata_pk_list[0]
 
             potential_participants = get_potential_participants(experiment_metadata_pk, affiliated_institution,
-                                                                only_undergrad=form.cleaned_data.get('only_undergrad'))
-            potential_participants_count = len(potential_participants)
-
-            final_participants = None
+                                                                only_undergrad=form.cleaned_data.get('only_undergrad'),
+                                                                max_absences=form.cleaned_data.get('max_absences'))
+            # uses all candidate participants if there are fewer than the number of requested participants
+            final_participants = potential_participants.random_sample(invitation_count)
+            invitation_batch_dict = None
 
-            if potential_participants_count == 0:
-                final_participants = []
+            if not final_participants:
                 message = "There are no more eligible participants that can be invited for this experiment."
             else:
-                if potential_participants_count < invitation_count:
-                    # less candidate participants than the number of requested
-                    # participants, use them all
-                    final_participants = potential_participants
-                else:
-                    final_participants = random.sample(potential_participants, invitation_count)
-                message = "Your invitations were sent to %s / %s participants." % (len(final_participants), invitation_count)
+                message = "Your invitations are being sent to %s / %s participants." % (len(final_participants), invitation_count)
 
                 today = datetime.now()
+                invitation_batch = InvitationBatch.objects.create(sender=user,
+                                                                  number_of_recipients=len(final_participants))
                 invitations = []
-                recipient_list = [settings.SERVER_EMAIL]
+                recipient_list = []
                 for participant in final_participants:
                     recipient_list.append(participant.email)
                     for es in experiment_sessions:
-                        invitations.append(Invitation(participant=participant, experiment_session=es, date_created=today, sender=user))
+                        invitations.append(Invitation(participant=participant, experiment_session=es, date_created=today,
+                                                      sender=user, batch=invitation_batch))
                 Invitation.objects.bulk_create(invitations)
+                participant_pks = [participant.pk for participant in final_participants]
+                ParticipantExperimentMetadataSummary.objects.refresh(participant_pks=participant_pks,
+                                                                     experiment_metadata_pk=experiment_metadata_pk)
+                SpoolParticipantStatistics.objects.adjust(participant_pks, 'invitations', len(experiment_sessions))
 
                 plaintext_content, html_content = get_invitation_email_content(invitation_text, session_pk_list)
 
+                # send a single copy to the experimenter, the invitations themselves are sent in BCC chunks through
+                # the configured EMAIL_BACKEND (queued and delivered by the sendqueuedemail worker in production)
+                connection = mail.get_connection()
                 msg = EmailMultiAlternatives(subject=invitation_subject, body=plaintext_content, from_email=from_email,
-                                             to=[from_email], bcc=recipient_list)
+                                             to=[from_email], bcc=[settings.SERVER_EMAIL], connection=connection)
                 msg.attach_alternative(html_content, "text/html")
                 msg.send()
+                invitation_batch.send_email_messages(
+                    invitation_batch.create_email_messages(recipient_list, subject=invitation_subject,
+                                                           plaintext_content=plaintext_content,
+                                                           html_content=html_content, from_email=from_email),
+                    connection=connection)
+                invitation_batch = InvitationBatch.objects.get(pk=invitation_batch.pk)
+                invitation_batch_dict = invitation_batch.to_dict()
+                invitation_batch_dict['status_url'] = reverse('subjectpool:invitation_batch_status',
+                                                              args=[invitation_batch.pk])
 
             return JsonResponse({
                 'success': True,
                 'message': message,
-                'invitesCount': len(final_participants)
+                'invitesCount': len(final_participants),
+                'invitationBatch': invitation_batch_dict,
             })
         else:
             message = "To Invite Participants Please Select Experiment Sessions of same Experiment"
@@ -267,6 +293,16 @@ def send_invitations(request):
         })
 
 
+@group_required(PermissionGroup.experimenter)
+@ownership_required(InvitationBatch)
+@require_GET
+def get_invitation_batch_status(request, pk=None):
+    """
+    Returns the delivery progress of the given InvitationBatch, e.g., sent 600/1200
+    """
+    return JsonResponse(dict(success=True, **request.owned_object.to_dict()))
+
+
 @group_required(PermissionGroup.experimenter)
 @require_POST
 def invite_email_preview(request):
@@ -293,50 +329,19 @@ def invite_email_preview(request):
 
 
 def get_potential_participants(experiment_metadata_pk, institution="Arizona State University", days_threshold=7,
-                               only_undergrad=True):
+                               only_undergrad=True, max_absences=None, max_discharges=None):
     """
-    Returns the pool of participants which match the required invitation criteria.
+    Returns the pool of participants which match the required invitation criteria, computed in a single query.
+    max_absences and max_discharges exclude unreliable participants using their precomputed SpoolParticipantStatistics.
     """
-
-    try:
-        affiliated_institution = Institution.objects.get(name=institution)
-    except Institution.DoesNotExist:
-        affiliated_institution = None
-
-    # Get excluded participants for the given parameters
-    excluded_participants = get_excluded_participants(days_threshold, experiment_metadata_pk)
-
-    criteria = dict(can_receive_invitations=True, user__is_active=True)
+    criteria = {}
+    affiliated_institution = Institution.objects.filter(name=institution).first()
     if affiliated_institution:
         criteria.update(institution=affiliated_institution)
     if only_undergrad:
-        criteria.update(
-            class_status__in=Participant.UNDERGRADUATE_CLASS_CHOICES)
-    return Participant.objects.filter(**criteria).exclude(pk__in=excluded_participants)
-
-
-def get_excluded_participants(days_threshold, experiment_metadata_pk):
-    """
-    Returns the pool of participants which do not match the required invitation criteria.
-    """
-    last_week_date = datetime.now() - timedelta(days=days_threshold)
-    # invited_in_last_threshold_days contains all Invitations that were generated in last threshold days for the
-    # given Experiment metadata
-    invited_in_last_threshold_days = Invitation.objects \
-        .filter(date_created__gt=last_week_date, experiment_session__experiment_metadata__pk=experiment_metadata_pk) \
-        .values_list('participant__pk', flat=True)
-
-    # signup_participants is the list of participants who has already participated in the
-    # given Experiment Metadata(in the past or currently participating)
-    signup_participants = ParticipantSignup.objects.registered(
-        experiment_metadata_pk=experiment_metadata_pk).values_list('invitation__participant__pk', flat=True)
-
-    mailinator_participants = Participant.objects.filter(user__email__contains='mailinator.com').values_list('pk',
-                                                                                                             flat=True)
-    # returns a list of participant pks who have already received invitations in last threshold days, have already
-    # participated in the same experiment, or have 'mailinator.com' in their
-    # name
-    return list(set(itertools.chain(invited_in_last_threshold_days, signup_participants, mailinator_participants)))
+        criteria.update(class_status__in=Participant.UNDERGRADUATE_CLASS_CHOICES)
+    return Participant.objects.invitation_candidates(experiment_metadata_pk, days_threshold=days_threshold).filter(
+        **criteria).reliable(max_absences=max_absences, max_discharges=max_discharges)
 
 
 @group_required(PermissionGroup.experimenter)
@@ -347,7 +352,7 @@ def manage_participant_attendance(request, pk=None):
     If request is GET, then the function will return the attendance formset. If request is POST then
     the function will update the Participant Attendance and return the updated formset.
     """
-    es = ExperimentSession.objects.get(pk=pk)
+    es = request.owned_object
 
     invitations_sent = Invitation.objects.filter(experiment_session=es)
     session_detail = dict(pk=es.pk, experiment_metadata=es.experiment_metadata, start_date=es.scheduled_date.date(),
@@ -380,6 +385,30 @@ def manage_participant_attendance(request, pk=None):
                   {'session_detail': session_detail, 'formset': formset})
 
 
+@group_required(PermissionGroup.experimenter)
+@ownership_required(ExperimentSession)
+@require_POST
+def update_participant_attendance(request, pk=None):
+    """
+    Bulk attendance API for the given ExperimentSession. Expects an attendance POST parameter with a JSON object mapping
+    ParticipantSignup pks to attendance values, e.g., {"12": 0, "13": 2}, and applies all of the changes at once.
+    """
+    try:
+        attendance_dict = dict((int(signup_pk), int(attendance)) for signup_pk, attendance
+                               in json.loads(request.POST.get('attendance', '')).items())
+    except (ValueError, TypeError, AttributeError):
+        return JsonResponse({'success': False, 'message': 'Attendance must be a JSON object of signup ids to values'})
+    invalid_attendance = [a for a in attendance_dict.values() if a not in ParticipantSignup.ATTENDANCE]
+    if invalid_attendance:
+        return JsonResponse({'success': False, 'message': 'Invalid attendance values: %s' % invalid_attendance})
+    try:
+        number_updated = ParticipantSignup.objects.filter(invitation__experiment_session__pk=pk).update_attendance(
+            attendance_dict)
+    except ParticipantSignup.DoesNotExist as e:
+        return JsonResponse({'success': False, 'message': str(e)})
+    return JsonResponse({'success': True, 'updated': number_updated})
+
+
 @group_required(PermissionGroup.participant)
 @require_POST
 def cancel_experiment_session_signup(request):
@@ -411,62 +440,48 @@ def submit_experiment_session_signup(request):
     """
     user = request.user
     invitation_pk = request.POST.get('invitation_pk')
-    invitation = get_object_or_404(Invitation.objects.select_related('experiment_session'), pk=invitation_pk)
-    registered = False
-    waitlist = False
-    attendance = ParticipantSignup.ATTENDANCE.registered
-    message = ""
-
-    # lock on the experiment session to prevent concurrent participant signups for an experiment session
-    # exceeding its capacity
-    with transaction.atomic():
-        signup_count = ParticipantSignup.objects.registered(experiment_session_pk=invitation.experiment_session_id).count()
-        # verify for the vacancy in the selected experiment session before
-        # creating participant signup entry
-        if signup_count < invitation.experiment_session.capacity:
-            registered = True
-            message = '''You are now registered for this experiment session. A confirmation email has been sent and you
-            should also receive a reminder email one day before the session. Thanks in advance for participating!'''
-        else:
-            # signups are full, check if waitlists are full
-            waitlist_count = ParticipantSignup.objects.waitlist(experiment_session_pk=invitation.experiment_session_id).count()
-            if waitlist_count < settings.SUBJECT_POOL_WAITLIST_SIZE:
-                waitlist = True
-                attendance = ParticipantSignup.ATTENDANCE.waitlist
-                message = """This experiment session is currently full, but you have been added to the waitlist. You may
-                still be able to participate in this experiment if other participants leave the experiment."""
-        ps, created = ParticipantSignup.objects.get_or_create(invitation=invitation, attendance=attendance)
-        logger.debug("updated participant signup %s - created? %s", ps, created)
-
-    if registered or waitlist:
-        messages.success(request, _(message))
-        send_email("email/confirmation-email.txt", {'session': invitation.experiment_session}, "Confirmation Email",
-                   settings.SERVER_EMAIL, [user.email])
-        return redirect('core:dashboard')
-    else:
+    try:
+        # locks the invitation and its experiment session to prevent concurrent participant signups from exceeding
+        # the session capacity or waitlist size
+        signup, created = ExperimentSession.objects.allocate_seat(invitation_pk, participant=user.participant)
+    except Invitation.DoesNotExist:
+        raise Http404
+    logger.debug("updated participant signup %s - created? %s", signup, created)
+
+    if signup is None:
         messages.error(request, _("This session is currently full. Please select a different session or try again later to see if any slots have opened up. Thank you for your interest!"))
         return redirect('subjectpool:experiment_session_signup')
+    if signup.attendance == ParticipantSignup.ATTENDANCE.registered:
+        message = '''You are now registered for this experiment session. A confirmation email has been sent and you
+        should also receive a reminder email one day before the session. Thanks in advance for participating!'''
+    else:
+        message = """This experiment session is currently full, but you have been added to the waitlist. You may
+        still be able to participate in this experiment if other participants leave the experiment."""
+    messages.success(request, _(message))
+    if created:
+        send_email("email/confirmation-email.txt", {'session': signup.invitation.experiment_session},
+                   "Confirmation Email", settings.SERVER_EMAIL, [user.email])
+    return redirect('core:dashboard')
 
 
 @group_required(PermissionGroup.experimenter)
-@ownership_required(ExperimentSession)
+@ownership_required(ExperimentSession, select_related=('creator', 'experiment_metadata'))
 @require_GET
 def download_experiment_session(request, pk=None):
-    user = request.user
-    experiment_session = get_object_or_404(ExperimentSession.objects.select_related('creator'), pk=pk)
-
-    response = HttpResponse(content_type=mimetypes.types_map['.csv'])
-    response['Content-Disposition'] = 'attachment; filename=participants.csv'
-    writer = unicodecsv.writer(response, encoding='utf-8')
-    writer.writerow(["Participant list", experiment_session, experiment_session.location, experiment_session.capacity,
-                     experiment_session.creator])
-    writer.writerow(['Email', 'Name', 'Username', 'Class Status', 'Attendance'])
-    for ps in ParticipantSignup.objects.select_related('invitation__participant').filter(
-            invitation__experiment_session=experiment_session):
-        participant = ps.invitation.participant
-        writer.writerow([participant.email, participant.full_name, participant.username, participant.class_status,
-                         ps.attendance])
-    return response
+    experiment_session = request.owned_object
+    signups = ParticipantSignup.objects.filter(invitation__experiment_session=experiment_session).values_list(
+        'invitation__participant__user__email', 'invitation__participant__user__first_name',
+        'invitation__participant__user__last_name', 'invitation__participant__user__username',
+        'invitation__participant__class_status', 'attendance').order_by('pk')
+
+    def rows():
+        yield ["Participant list", experiment_session, experiment_session.location, experiment_session.capacity,
+               experiment_session.creator]
+        yield ['Email', 'Name', 'Username', 'Class Status', 'Attendance']
+        for email, first_name, last_name, username, class_status, attendance in signups.iterator():
+            yield [email, u' '.join([first_name, last_name]).strip(), username, class_status, attendance]
+
+    return CsvResponse(rows(), filename='participants.csv')
 
 
 @group_required(PermissionGroup.participant)
@@ -482,9 +497,10 @@ def experiment_session_signup(request):
     # invitation to user
     tomorrow = datetime.now() + timedelta(days=1)
 
-    active_experiment_sessions = ParticipantSignup.objects.select_related('invitation', 'invitation__experiment_session').filter(
+    active_experiment_sessions = list(ParticipantSignup.objects.select_related(
+        'invitation__experiment_session__experiment_metadata').filter(
         invitation__participant=user.participant, attendance__in=[ParticipantSignup.ATTENDANCE.registered,ParticipantSignup.ATTENDANCE.waitlist],
-        invitation__experiment_session__scheduled_date__gt=tomorrow)
+        invitation__experiment_session__scheduled_date__gt=tomorrow))
 
     # Making sure that user don't see invitations for a experiment for which he has already participated
     # useful in cases when the experiment has lots of sessions spanning to lots of days. It avoids a user to participate
@@ -493,23 +509,24 @@ def experiment_session_signup(request):
     participated_signups = ParticipantSignup.objects.participated(invitation__participant=user.participant)
 
     participated_experiment_metadata_pk_list = participated_signups.values_list('invitation__experiment_session__experiment_metadata_id', flat=True)
-    active_invitation_pk_list = [ps.invitation.pk for ps in active_experiment_sessions]
-    invitations = Invitation.objects.select_related('experiment_session', 'experiment_session__experiment_metadata__pk') \
-        .filter(participant=user.participant, experiment_session__scheduled_date__gt=tomorrow) \
-        .exclude(experiment_session__experiment_metadata__pk__in=participated_experiment_metadata_pk_list) \
-        .exclude(pk__in=active_invitation_pk_list)
+    active_invitation_pk_list = [ps.invitation_id for ps in active_experiment_sessions]
+    invitations = list(Invitation.objects.select_related('experiment_session__experiment_metadata')
+                       .filter(participant=user.participant, experiment_session__scheduled_date__gt=tomorrow)
+                       .exclude(experiment_session__experiment_metadata__pk__in=participated_experiment_metadata_pk_list)
+                       .exclude(pk__in=active_invitation_pk_list))
+
+    # signup counts for all displayed experiment sessions are computed in a single grouped query
+    experiment_session_pks = set(ps.invitation.experiment_session_id for ps in active_experiment_sessions)
+    experiment_session_pks.update(invite.experiment_session_id for invite in invitations)
+    signup_counts = ParticipantSignup.objects.signup_counts(experiment_session_pks)
 
     invitation_list = []
     for ps in active_experiment_sessions:
-        signup_count = ParticipantSignup.objects.filter(
-            invitation__experiment_session__pk=ps.invitation.experiment_session.pk).count()
-        ps_dict = ps.to_dict(signup_count)
+        ps_dict = ps.to_dict(signup_counts[ps.invitation.experiment_session_id])
         invitation_list.append(ps_dict)
 
     for invite in invitations:
-        signup_count = ParticipantSignup.objects.filter(
-            invitation__experiment_session__pk=invite.experiment_session.pk).count()
-        invite_dict = invite.to_dict(signup_count)
+        invite_dict = invite.to_dict(signup_counts[invite.experiment_session_id])
 
         if invite_dict['invitation']['openings'] != 0 and session_unavailable:
             session_unavailable = False
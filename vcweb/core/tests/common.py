@@ -7,7 +7,8 @@ from django.test import TestCase
 from django.test.client import RequestFactory, Client
 
 from ..models import (Experiment, Experimenter, ExperimentConfiguration, RoundConfiguration, Parameter, Group, User,
-                      PermissionGroup, Participant, ParticipantSignup, Institution, ExperimentSession, Invitation)
+                      PermissionGroup, Participant, ParticipantSignup, Institution, ExperimentSession, Invitation,
+                      ParticipantExperimentMetadataSummary, SpoolParticipantStatistics)
 
 from ..subjectpool.views import get_potential_participants
 
@@ -282,19 +283,8 @@ class SubjectPoolTest(BaseVcwebTest):
     def get_final_participants(self):
         potential_participants = get_potential_participants(
             self.experiment_metadata.pk, "Arizona State University")
-        potential_participants_count = len(potential_participants)
-        # logger.debug(potential_participants)
         no_of_invitations = 50
-
-        if potential_participants_count == 0:
-            final_participants = []
-        else:
-            if potential_participants_count < no_of_invitations:
-                final_participants = potential_participants
-            else:
-                final_participants = random.sample(potential_participants,
-                                                   no_of_invitations)
-        return final_participants
+        return potential_participants.random_sample(no_of_invitations)
 
     def setup_participant_signup(self, participant_list, es_pk_list):
         participant_list = participant_list[:25]
@@ -331,3 +321,6 @@ class SubjectPoolTest(BaseVcwebTest):
                                               sender=user))
 
         Invitation.objects.bulk_create(invitations)
+        participant_pks = [p.pk for p in participants]
+        ParticipantExperimentMetadataSummary.objects.refresh(participant_pks=participant_pks)
+        SpoolParticipantStatistics.objects.adjust(participant_pks, 'invitations', len(experiment_sessions))
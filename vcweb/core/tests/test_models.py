@@ -1,15 +1,30 @@
 from datetime import datetime, timedelta
+from smtplib import SMTPException
+from unittest import skipUnless
 import random
 import logging
+import threading
+import time
 
+from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import User
-from django.core import serializers
+from django.core import mail, serializers
+from django.core.mail import EmailMultiAlternatives
+from django.db import connection, OperationalError
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
 
 from .common import BaseVcwebTest, SubjectPoolTest
-from .. import signals
-from ..models import (ParticipantRoundDataValue, Participant, ParticipantExperimentRelationship,
-                      BookmarkedExperimentMetadata, ParticipantGroupRelationship, ExperimentMetadata, Parameter,
-                      RoundParameterValue, Institution, ExperimentSession, Invitation, ParticipantSignup, DefaultValue,)
+from .. import models, signals
+from ..decorators import get_group_names_version
+from ..mailqueue import get_queue_depth, send_queued_email
+from ..subjectpool.views import get_potential_participants
+from ..models import (Experiment, GroupRelationship, ParticipantRoundDataValue, Participant,
+                      ParticipantExperimentRelationship, BookmarkedExperimentMetadata, ParticipantGroupRelationship,
+                      ExperimentMetadata, Parameter, RoundParameterValue, Institution, ExperimentSession, Invitation,
+                      ParticipantSignup, DefaultValue, PermissionGroup, OutboundEmail,
+                      ParticipantExperimentMetadataSummary, SpoolParticipantStatistics, send_session_reminders,
+                      prefetch_current_rounds, ChatMessage)
 
 logger = logging.getLogger(__name__)
 
@@ -198,6 +213,86 @@ class ExperimentTest(BaseVcwebTest):
         self.assertEqual(
             10, sum([group.participant_set.count() for group in experiment.group_set.all()]))
 
+    def test_bulk_group_allocation(self):
+        experiment = self.experiment
+        received = []
+
+        def participants_added_handler(sender, participant_group_relationships=None, **kwargs):
+            received.append(participant_group_relationships)
+
+        def participant_added_handler(sender, participant_group_relationship=None, **kwargs):
+            self.fail("participant_added should only be sent when send_participant_added is set")
+
+        signals.participants_added.connect(participants_added_handler)
+        signals.participant_added.connect(participant_added_handler)
+        try:
+            with CaptureQueriesContext(connection) as context:
+                experiment.allocate_groups()
+            self.assertLess(len(context), 15)
+        finally:
+            signals.participants_added.disconnect(participants_added_handler)
+            signals.participant_added.disconnect(participant_added_handler)
+        self.assertEqual(1, len(received))
+        self.assertEqual(10, len(received[0]))
+        self.assertEqual([1, 2], sorted(experiment.group_set.values_list('number', flat=True)))
+        for group in experiment.group_set.all():
+            self.assertEqual(range(1, 6),
+                             sorted(group.participant_group_relationship_set.values_list('participant_number',
+                                                                                         flat=True)))
+        # reallocation deletes the existing groups and logs their members
+        experiment.allocate_groups()
+        self.assertEqual(2, experiment.group_set.count())
+        self.assertEqual(10, ParticipantGroupRelationship.objects.for_experiment(experiment).count())
+
+    def test_preserve_existing_groups(self):
+        experiment = self.experiment
+        experiment.allocate_groups(preserve_existing_groups=True, session_id='session')
+        existing_pgr_pks = set(ParticipantGroupRelationship.objects.for_experiment(experiment).values_list('pk',
+                                                                                                           flat=True))
+        self.assertEqual(2, experiment.group_set.count())
+        received = []
+
+        def participants_added_handler(sender, participant_group_relationships=None, **kwargs):
+            received.extend(participant_group_relationships)
+
+        # a single new group with a reused session id
+        experiment_configuration = experiment.experiment_configuration
+        experiment_configuration.max_group_size = 10
+        experiment_configuration.save()
+        signals.participants_added.connect(participants_added_handler)
+        try:
+            experiment.allocate_groups(preserve_existing_groups=True, session_id='session')
+        finally:
+            signals.participants_added.disconnect(participants_added_handler)
+        self.assertEqual(3, experiment.group_set.count())
+        self.assertEqual(10, len(received))
+        self.assertFalse(existing_pgr_pks.intersection(pgr.pk for pgr in received))
+        self.assertEqual(1, len(set(pgr.group_id for pgr in received)))
+
+    def test_create_group_clusters(self):
+        e = self.experiment
+        round_configuration = e.current_round
+        self.assertIsNone(e.create_group_clusters())
+        round_configuration.create_group_clusters = True
+        round_configuration.group_cluster_size = 2
+        round_configuration.save()
+        e.allocate_groups()
+        group_cluster_map = e.create_group_clusters()
+        self.assertEqual(1, len(group_cluster_map))
+        self.assertEqual(1, e.group_cluster_set.count())
+        self.assertEqual(2, GroupRelationship.objects.filter(cluster__experiment=e).count())
+        self.assertEqual(group_cluster_map, e.get_group_cluster_map())
+        for group_cluster, groups in group_cluster_map.items():
+            self.assertEqual(set(e.groups), set(groups))
+            for group in groups:
+                self.assertNotEqual(group, group.get_related_group())
+
+    def test_compute_group_layout(self):
+        participants = range(12)
+        self.assertEqual([range(5), range(5, 10), [10, 11]], Experiment.compute_group_layout(participants, 5))
+        self.assertEqual([participants], Experiment.compute_group_layout(participants, 0))
+        self.assertEqual([[]], Experiment.compute_group_layout([], 5))
+
     def test_participant_numbering(self):
         experiment = self.experiment
         experiment.allocate_groups(randomize=False)
@@ -233,6 +328,86 @@ class ExperimentTest(BaseVcwebTest):
         self.assertFalse(e.is_time_expired)
         self.assertTrue(int(e.time_remaining_label) > 0)
 
+    def test_serialization_levels(self):
+        e = self.experiment
+        e.activate()
+        experiment = prefetch_current_rounds(list(Experiment.objects.for_experimenter(e.experimenter, pk=e.pk).with_participant_count()))[0]
+        with self.assertNumQueries(0):
+            summary_dict = experiment.to_summary_dict(attrs=('status_line',))
+        self.assertEqual(e.participant_set.count(), summary_dict['participantCount'])
+        self.assertIn('status_line', summary_dict)
+        participant_dict = e.to_participant_dict(default_value_dict={'foo': 1})
+        self.assertEqual(1, participant_dict['foo'])
+        self.assertIn('readyParticipants', participant_dict)
+        self.assertNotIn('participants', summary_dict)
+        self.assertNotIn('participants', participant_dict)
+        monitor_dict = e.to_monitor_dict()
+        self.assertEqual(sorted(e.participant_emails), sorted(p['email'] for p in monitor_dict['participants']))
+        self.assertEqual(monitor_dict, e.to_dict())
+
+    def test_monitor_updates(self):
+        e = self.experiment
+        e.activate()
+        monitor_dict = e.to_monitor_dict(include_round_data=True)
+        self.assertEqual(e.participant_set.count(),
+                         sum(len(g['participant_group_relationships']) for g in monitor_dict['groups']))
+        cursors = dict(chat_cursor=monitor_dict['chatCursor'], log_cursor=monitor_dict['logCursor'],
+                       round_data_cursor=monitor_dict['roundDataCursor'], state_version=monitor_dict['stateVersion'])
+        updates = e.to_monitor_updates_dict(**cursors)
+        self.assertEqual(([], [], []), (updates['chatMessages'], updates['messages'], updates['allRoundData']))
+        self.assertNotIn('groups', updates)
+        self.assertNotIn('participants', updates)
+        self.assertFalse(updates['reset'])
+        # group reassignments within a round resend the groups and roster
+        pgr = e.participant_group_relationships[0]
+        other_group = e.groups.exclude(pk=pgr.group_id)[0]
+        pgr.group = other_group
+        pgr.save()
+        updates = e.to_monitor_updates_dict(**cursors)
+        self.assertEqual(e.participant_set.count(), len(updates['participants']))
+        moved_group = [g for g in updates['groups'] if g['pk'] == other_group.pk][0]
+        self.assertIn(pgr.pk, [member['pk'] for member in moved_group['participant_group_relationships']])
+        cursors['state_version'] = updates['stateVersion']
+        self.assertNotIn('groups', e.to_monitor_updates_dict(**cursors))
+        # as do participants joining
+        participant = Participant.objects.create(user=User.objects.create_user(username='joined@asu.edu',
+                                                                               email='joined@asu.edu'))
+        ParticipantExperimentRelationship.objects.create(participant=participant, experiment=e,
+                                                         created_by=self.experimenter.user)
+        updates = e.to_monitor_updates_dict(**cursors)
+        self.assertIn(participant.email, [p['email'] for p in updates['participants']])
+        e.advance_to_next_round()
+        e.log("advanced")
+        pgr = e.participant_group_relationships[0]
+        ChatMessage.objects.create(participant_group_relationship=pgr, string_value='hello',
+                                   round_data=e.current_round_data)
+        updates = e.to_monitor_updates_dict(**cursors)
+        self.assertEqual([e.current_round_data.pk], [rd['pk'] for rd in updates['allRoundData']])
+        self.assertEqual(['hello'], [cm['value'] for cm in updates['chatMessages']])
+        self.assertTrue(any('advanced' in message for message in updates['messages']))
+        self.assertIn('groups', updates)
+        cursors = dict(chat_cursor=updates['chatCursor'], log_cursor=updates['logCursor'],
+                       round_data_cursor=updates['roundDataCursor'], state_version=updates['stateVersion'])
+        updates = e.to_monitor_updates_dict(**cursors)
+        self.assertEqual(([], [], []), (updates['chatMessages'], updates['messages'], updates['allRoundData']))
+        self.assertFalse(updates['hasMore'])
+        # rows past the limit are paged forward instead of being skipped
+        for i in range(5):
+            ChatMessage.objects.create(participant_group_relationship=pgr, string_value='message %s' % i,
+                                       round_data=e.current_round_data)
+        received = []
+        for expected_has_more in (True, True, False):
+            updates = e.to_monitor_updates_dict(limit=2, **cursors)
+            self.assertEqual(expected_has_more, updates['hasMore'])
+            # pages are newest first
+            received = [cm['value'] for cm in updates['chatMessages']] + received
+            cursors.update(chat_cursor=updates['chatCursor'], log_cursor=updates['logCursor'])
+        self.assertEqual(['message %s' % i for i in reversed(range(5))], received)
+        self.assertFalse(e.to_monitor_updates_dict(limit=2, **cursors)['chatMessages'])
+        # round data seen by the client no longer exists, e.g., after restarting the experiment
+        cursors['round_data_cursor'] += 1000
+        self.assertTrue(e.to_monitor_updates_dict(**cursors)['reset'])
+
     def test_playable_round(self):
         # advance_to_next_round automatically starts the round
         e = self.advance_to_data_round()
@@ -326,6 +501,46 @@ class ParticipantExperimentRelationshipTest(BaseVcwebTest):
         e.register_participants(emails=emails, institution=institution,
                                 password='test')
 
+    def test_bulk_registration(self):
+        e = self.experiment.clone()
+        existing_user = User.objects.create_user(username='existing@asu.edu', email='existing@asu.edu')
+        emails = ['Test Participant%s <test%s@asu.edu>' % (index, index) for index in range(20)]
+        emails.extend(['Existing User <EXISTING@asu.edu>', 'test0@asu.edu', ''])
+        group_names_version = get_group_names_version(existing_user.pk)
+        mail.outbox = []
+        hashed_passwords = []
+
+        def counting_make_password(password, *args, **kwargs):
+            hashed_passwords.append(password)
+            return make_password(password, *args, **kwargs)
+        models.make_password = counting_make_password
+        try:
+            with CaptureQueriesContext(connection) as context:
+                registered_participants = e.register_participants(emails=emails, password='test',
+                                                                  should_send_email=False)
+        finally:
+            models.make_password = make_password
+        self.assertLess(len(context), 30)
+        self.assertEqual(21, len(registered_participants))
+        # the shared password is hashed once for the new users and once for the existing user
+        self.assertEqual(2, len(hashed_passwords))
+        self.assertNotEqual(group_names_version, get_group_names_version(existing_user.pk))
+        self.assertEqual(21, e.participant_set.count())
+        self.assertEqual(0, len(mail.outbox))
+        self.assertTrue(e.participant_set.filter(user=existing_user).exists())
+        existing_user = User.objects.get(pk=existing_user.pk)
+        self.assertEqual('Existing', existing_user.first_name)
+        self.assertTrue(existing_user.check_password('test'))
+        self.assertEqual(range(1, 22), sorted(e.participant_relationship_set.values_list(
+            'sequential_participant_identifier', flat=True)))
+        self.assertEqual(21, len(set(e.participant_relationship_set.values_list('participant_identifier',
+                                                                                flat=True))))
+        participants_group = PermissionGroup.participant.get_django_group()
+        for user, password in registered_participants:
+            self.assertTrue(user.groups.filter(pk=participants_group.pk).exists())
+        e.send_registration_emails(e.generate_registration_emails(password='test'), batch_size=7)
+        self.assertEqual(21, len(mail.outbox))
+
     def test_participant_identifier(self):
         """ exercises the generation of participant_identifier """
         e = self.experiment.clone()
@@ -436,6 +651,192 @@ class SubjectPoolInvitationTest(SubjectPoolTest):
 
             self.setup_participant_signup(x, es_pk_list)
 
+    def test_invitation_candidates(self):
+        self.setup_participants()
+        experiment_session = ExperimentSession.objects.get(pk=self.setup_experiment_sessions()[0])
+        experiment_metadata_pk = experiment_session.experiment_metadata_id
+        candidates = Participant.objects.invitation_candidates(experiment_metadata_pk)
+        number_of_candidates = candidates.count()
+        self.assertEqual(Participant.objects.active(can_receive_invitations=True).count(), number_of_candidates)
+        participant = candidates[0]
+        invitation = Invitation.objects.create(participant=participant, experiment_session=experiment_session,
+                                               sender=self.demo_experimenter.user)
+        self.assertFalse(candidates.filter(pk=participant.pk).exists())
+        self.assertEqual(number_of_candidates - 1, candidates.count())
+        # invitations older than the threshold no longer exclude the participant
+        Invitation.objects.filter(pk=invitation.pk).update(date_created=datetime.now() - timedelta(days=30))
+        ParticipantExperimentMetadataSummary.objects.refresh(participant_pks=[participant.pk])
+        self.assertTrue(candidates.filter(pk=participant.pk).exists())
+        signup = ParticipantSignup.objects.create(invitation=invitation)
+        self.assertFalse(candidates.filter(pk=participant.pk).exists())
+        signup.attendance = ParticipantSignup.ATTENDANCE.absent
+        signup.save()
+        self.assertTrue(candidates.filter(pk=participant.pk).exists())
+        with self.assertNumQueries(2):
+            potential_participants = list(get_potential_participants(experiment_metadata_pk, only_undergrad=False))
+        self.assertEqual(number_of_candidates, len(potential_participants))
+
+    def test_allocate_seat(self):
+        self.setup_participants()
+        experiment_session = ExperimentSession.objects.get(pk=self.setup_experiment_sessions()[0])
+        experiment_session.capacity = 2
+        experiment_session.save()
+        participants = Participant.objects.all()[:5]
+        invitations = [Invitation.objects.create(participant=p, experiment_session=experiment_session,
+                                                 sender=self.demo_experimenter.user) for p in participants]
+        results = [ExperimentSession.objects.allocate_seat(invitation.pk, waitlist_size=2)
+                   for invitation in invitations]
+        attendance = [signup.attendance if signup else None for signup, created in results]
+        self.assertEqual([ParticipantSignup.ATTENDANCE.registered] * 2 + [ParticipantSignup.ATTENDANCE.waitlist] * 2
+                         + [None], attendance)
+        # allocating a seat twice returns the existing signup
+        signup, created = ExperimentSession.objects.allocate_seat(invitations[0].pk, participant=participants[0])
+        self.assertFalse(created)
+        self.assertEqual(results[0][0], signup)
+        self.assertEqual(4, ParticipantSignup.objects.filter(invitation__experiment_session=experiment_session).count())
+        with self.assertRaises(Invitation.DoesNotExist):
+            ExperimentSession.objects.allocate_seat(invitations[0].pk, participant=participants[1])
+        # cancelled signups free up their seat
+        results[0][0].delete()
+        signup, created = ExperimentSession.objects.allocate_seat(invitations[4].pk, waitlist_size=2)
+        self.assertTrue(created)
+        self.assertEqual(ParticipantSignup.ATTENDANCE.registered, signup.attendance)
+
+    def test_spool_participant_statistics(self):
+        self.setup_participants()
+        experiment_session = ExperimentSession.objects.get(pk=self.setup_experiment_sessions()[0])
+        participant, other_participant = Participant.objects.all()[:2]
+        invitation = Invitation.objects.create(participant=participant, experiment_session=experiment_session,
+                                               sender=self.demo_experimenter.user)
+        statistics = SpoolParticipantStatistics.objects.get(participant=participant)
+        self.assertEqual(1, statistics.invitations)
+        signup = ParticipantSignup.objects.create(invitation=invitation)
+        for attendance, field in ((ParticipantSignup.ATTENDANCE.absent, 'absences'),
+                                  (ParticipantSignup.ATTENDANCE.participated, 'participations')):
+            signup = ParticipantSignup.objects.get(pk=signup.pk)
+            signup.attendance = attendance
+            signup.save()
+            statistics = SpoolParticipantStatistics.objects.get(participant=participant)
+            self.assertEqual(1, getattr(statistics, field))
+            self.assertEqual(1, statistics.absences + statistics.participations)
+        # saving without an attendance change leaves the counters alone
+        signup.save()
+        self.assertEqual(1, SpoolParticipantStatistics.objects.get(participant=participant).participations)
+        signup.attendance = ParticipantSignup.ATTENDANCE.absent
+        signup.save()
+        candidates = Participant.objects.filter(pk__in=[participant.pk, other_participant.pk])
+        self.assertEqual([other_participant.pk], list(candidates.reliable(max_absences=0).values_list('pk', flat=True)))
+        self.assertEqual(2, candidates.reliable(max_absences=1).count())
+        SpoolParticipantStatistics.objects.update(absences=5, invitations=0)
+        self.assertEqual(1, SpoolParticipantStatistics.objects.rebuild())
+        statistics = SpoolParticipantStatistics.objects.get(participant=participant)
+        self.assertEqual((1, 1, 0), (statistics.invitations, statistics.absences, statistics.participations))
+        signup.delete()
+        invitation.delete()
+        statistics = SpoolParticipantStatistics.objects.get(participant=participant)
+        self.assertEqual((0, 0), (statistics.invitations, statistics.absences))
+
+    def test_send_session_reminders(self):
+        self.setup_participants()
+        tomorrow = datetime.now() + timedelta(days=1)
+        experiment_sessions = []
+        for pk in self.setup_experiment_sessions()[:2]:
+            experiment_session = ExperimentSession.objects.get(pk=pk)
+            experiment_session.scheduled_date = experiment_session.scheduled_end_date = tomorrow
+            experiment_session.save()
+            experiment_sessions.append(experiment_session)
+        participants = Participant.objects.select_related('user')[:5]
+        for index, participant in enumerate(participants):
+            invitation = Invitation.objects.create(participant=participant,
+                                                   experiment_session=experiment_sessions[index % 2],
+                                                   sender=self.demo_experimenter.user)
+            ParticipantSignup.objects.create(invitation=invitation)
+        mail.outbox = []
+        connection = mail.get_connection()
+        send_messages = connection.send_messages
+
+        def fail_after_first_batch(messages):
+            if mail.outbox:
+                raise SMTPException("connection dropped")
+            return send_messages(messages)
+        connection.send_messages = fail_after_first_batch
+        with self.assertRaises(SMTPException):
+            send_session_reminders(tomorrow.date(), batch_size=2, connection=connection)
+        self.assertEqual(2, len(mail.outbox))
+        self.assertEqual(3, ParticipantSignup.objects.needs_reminder(tomorrow.date()).count())
+        # resuming only sends the remaining reminders
+        self.assertEqual(3, send_session_reminders(tomorrow.date(), batch_size=2))
+        self.assertEqual(0, send_session_reminders(tomorrow.date(), batch_size=2))
+        self.assertEqual(sorted(p.email for p in participants),
+                         sorted(email for msg in mail.outbox for email in msg.recipients()))
+        self.assertTrue(all(len(msg.to) == 1 for msg in mail.outbox))
+
+    def test_random_sample(self):
+        self.setup_participants()
+        candidates = Participant.objects.invitation_candidates(self.experiment_metadata.pk)
+        number_of_candidates = candidates.count()
+        with self.assertNumQueries(2):
+            sample = candidates.random_sample(50, seed=42)
+        self.assertEqual(50, len(sample))
+        self.assertEqual(50, len(set(p.pk for p in sample)))
+        self.assertEqual(50, candidates.filter(pk__in=[p.pk for p in sample]).count())
+        self.assertEqual(sample, candidates.random_sample(50, seed=42))
+        self.assertNotEqual(sample, candidates.random_sample(50, seed=43))
+        self.assertEqual(number_of_candidates, len(candidates.random_sample(number_of_candidates + 10)))
+
+
+@skipUnless(connection.features.test_db_allows_multiple_connections,
+            'concurrent seat allocation requires a test database that supports multiple connections')
+class SeatAllocationConcurrencyTest(TransactionTestCase):
+
+    number_of_participants = 40
+    capacity = 10
+    waitlist_size = 5
+
+    def setUp(self):
+        creator = User.objects.create_user(username='creator', email='creator@asu.edu')
+        experiment_metadata = ExperimentMetadata.objects.create(title='Seat allocation', namespace='seat-allocation')
+        self.experiment_session = ExperimentSession.objects.create(
+            experiment_metadata=experiment_metadata, scheduled_date=datetime.now() + timedelta(days=7),
+            scheduled_end_date=datetime.now() + timedelta(days=7, hours=1), capacity=self.capacity,
+            creator=creator, location='Online')
+        self.invitation_pks = []
+        for index in range(self.number_of_participants):
+            user = User.objects.create_user(username='participant%s' % index, email='participant%s@asu.edu' % index)
+            participant = Participant.objects.create(user=user)
+            self.invitation_pks.append(Invitation.objects.create(participant=participant,
+                                                                 experiment_session=self.experiment_session,
+                                                                 sender=creator).pk)
+
+    def allocate_seat(self, invitation_pk, results):
+        try:
+            for attempt in range(20):
+                try:
+                    results.append(ExperimentSession.objects.allocate_seat(invitation_pk,
+                                                                           waitlist_size=self.waitlist_size))
+                    return
+                except OperationalError:
+                    # lock timeouts and serialization failures are expected under contention, retry
+                    time.sleep(random.random() * 0.05)
+        finally:
+            connection.close()
+
+    def test_concurrent_signups(self):
+        results = []
+        # every participant submits their signup twice, concurrently
+        threads = [threading.Thread(target=self.allocate_seat, args=(invitation_pk, results))
+                   for invitation_pk in self.invitation_pks * 2]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        signups = ParticipantSignup.objects.filter(invitation__experiment_session=self.experiment_session)
+        self.assertEqual(self.capacity, signups.filter(attendance=ParticipantSignup.ATTENDANCE.registered).count())
+        self.assertEqual(self.waitlist_size, signups.filter(attendance=ParticipantSignup.ATTENDANCE.waitlist).count())
+        self.assertEqual(self.capacity + self.waitlist_size,
+                         len(set(signups.values_list('invitation', flat=True))))
+        self.assertEqual(self.capacity + self.waitlist_size, len([r for r in results if r[1]]))
+
 
 class ParameterizedValueMixinTest(BaseVcwebTest):
 
@@ -579,3 +980,60 @@ class BookmarkedExperimentMetadataTest(BaseVcwebTest):
         self.assertEqual(ExperimentMetadata.objects.count(), bookmarks.count())
         for experiment_metadata in bookmarks:
             self.assertFalse(experiment_metadata.bookmarked)
+
+
+class OutboundEmailTest(BaseVcwebTest):
+
+    def create_messages(self, number_of_messages=5):
+        messages = []
+        for index in range(number_of_messages):
+            msg = EmailMultiAlternatives(subject='subject %s' % index, body='body', from_email='vcweb@asu.edu',
+                                         to=['test%s@asu.edu' % index], bcc=['bcc@asu.edu'])
+            msg.attach_alternative('<p>body</p>', 'text/html')
+            messages.append(msg)
+        return messages
+
+    def test_enqueue_and_send(self):
+        mail.outbox = []
+        connection = mail.get_connection(backend='vcweb.core.mailqueue.QueuedEmailBackend')
+        self.assertEqual(5, connection.send_messages(self.create_messages()))
+        self.assertEqual(0, len(mail.outbox))
+        self.assertEqual(5, get_queue_depth())
+        sent, failed = send_queued_email(batch_size=2, connection=mail.get_connection())
+        self.assertEqual((5, 0), (sent, failed))
+        self.assertEqual(0, get_queue_depth())
+        self.assertEqual(5, len(mail.outbox))
+        self.assertEqual(['test0@asu.edu', 'bcc@asu.edu'], mail.outbox[0].recipients())
+        self.assertEqual([('<p>body</p>', 'text/html')], mail.outbox[0].alternatives)
+        self.assertEqual(5, OutboundEmail.objects.filter(status=OutboundEmail.STATUS.sent).count())
+
+    def test_headers_and_display_name_recipients(self):
+        mail.outbox = []
+        msg = EmailMultiAlternatives(subject='subject', body='body', from_email='vcweb@asu.edu',
+                                     to=['Jane Doe <jane@asu.edu>'], bcc=['John Doe <john@asu.edu>', 'bcc@asu.edu'],
+                                     headers={'Reply-To': 'experimenter@asu.edu'})
+        OutboundEmail.objects.enqueue([msg])
+        self.assertEqual((1, 0), send_queued_email(connection=mail.get_connection()))
+        sent_message = mail.outbox[0]
+        self.assertEqual({'Reply-To': 'experimenter@asu.edu'}, sent_message.extra_headers)
+        self.assertEqual(['Jane Doe <jane@asu.edu>', 'John Doe <john@asu.edu>', 'bcc@asu.edu'],
+                         sent_message.recipients())
+
+    def test_retry_with_backoff(self):
+        OutboundEmail.objects.enqueue(self.create_messages(number_of_messages=2))
+        connection = mail.get_connection()
+
+        def fail(email_messages):
+            raise SMTPException('smtp failure')
+        connection.send_messages = fail
+        sent, failed = send_queued_email(connection=connection, max_attempts=2, delay=60)
+        self.assertEqual((0, 2), (sent, failed))
+        self.assertEqual(2, get_queue_depth())
+        self.assertEqual(0, OutboundEmail.objects.due().count())
+        for outbound_email in OutboundEmail.objects.all():
+            self.assertEqual(1, outbound_email.attempts)
+            self.assertGreater(outbound_email.next_attempt, datetime.now() + timedelta(seconds=50))
+        OutboundEmail.objects.update(next_attempt=datetime.now())
+        send_queued_email(connection=connection, max_attempts=2, delay=60)
+        self.assertEqual(2, OutboundEmail.objects.failed().count())
+        self.assertEqual(0, OutboundEmail.objects.due().count())
@@ -1,10 +1,22 @@
+from ..decorators import GROUP_NAMES_SESSION_KEY, view_model_condition
+from ..http import dumps
+from ..mailqueue import send_queued_email
 from ..models import (Participant, ExperimentMetadata, ExperimentSession,
-                      Experiment, Invitation, ParticipantSignup, PermissionGroup)
+                      Experiment, Invitation, ParticipantSignup, PermissionGroup, OutboundEmail,
+                      SpoolParticipantStatistics, bump_state_version)
 from ..forms import LoginForm
 from ..views import ExperimenterDashboardViewModel
 from .common import BaseVcwebTest, SubjectPoolTest
+from django.core import mail
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.core.urlresolvers import reverse
+from django.http import HttpResponse
 
+from datetime import datetime
+from decimal import Decimal
 import random
 import json
 import logging
@@ -37,6 +49,20 @@ class AuthTest(BaseVcwebTest):
         self.assertTrue(self.login_experimenter())
         # FIXME: more tests
 
+    def test_cached_group_permissions(self):
+        experiment = self.experiment
+        user = experiment.experimenter.user
+        group = PermissionGroup.demo_experimenter.get_django_group()
+        self.assertTrue(self.login_experimenter())
+        monitor_url = reverse('core:monitor_experiment', args=[experiment.pk])
+        self.assertEqual(200, self.get(monitor_url).status_code)
+        self.assertEqual([group.name], self.client.session[GROUP_NAMES_SESSION_KEY]['names'])
+        # cached group names are invalidated when group memberships change
+        user.groups.remove(group)
+        self.assertEqual(302, self.get(monitor_url).status_code)
+        group.user_set.add(user)
+        self.assertEqual(200, self.get(monitor_url).status_code)
+
     def test_participant_permissions(self):
         for pgr in self.participant_group_relationships:
             self.assertTrue(self.login_participant(pgr.participant))
@@ -121,6 +147,27 @@ class ExperimenterDashboardTest(BaseVcwebTest):
         self.assertEqual(
             self.experiment.status, vmdict['runningExperiments'][0]['status'])
 
+    def test_dashboard_view_model_queries(self):
+        experimenter = self.experiment.experimenter
+        with CaptureQueriesContext(connection) as context:
+            number_of_pending_experiments = len(ExperimenterDashboardViewModel(experimenter.user).pending_experiments)
+        number_of_queries = len(context)
+        for i in range(5):
+            self.experiment.clone()
+        archived_experiment = self.experiment.clone()
+        archived_experiment.complete()
+        with self.assertNumQueries(number_of_queries):
+            vmdict = ExperimenterDashboardViewModel(experimenter.user).to_dict()
+        self.assertEqual(number_of_pending_experiments + 5, len(vmdict['pendingExperiments']))
+        self.assertIn(archived_experiment.pk, [d['pk'] for d in vmdict['archivedExperiments']])
+        self.assertNotIn('participants', vmdict['pendingExperiments'][0])
+        experiment_dict = [d for d in vmdict['pendingExperiments'] if d['pk'] == self.experiment.pk][0]
+        self.assertEqual(self.experiment.participant_set.count(), experiment_dict['participantCount'])
+        # archived experiment summaries are served from the cache
+        archived_experiment = Experiment.objects.get(pk=archived_experiment.pk)
+        self.assertIsNotNone(cache.get(archived_experiment.summary_cache_key))
+        self.assertEqual(vmdict, ExperimenterDashboardViewModel(experimenter.user).to_dict())
+
     def test_experimenter_dashboard(self):
         e = self.experiment
         e.activate()
@@ -214,6 +261,68 @@ class CloneExperimentTest(BaseVcwebTest):
         self.assertEqual(cloned_experiment.experimenter, experimenter)
 
 
+class DownloadParticipantsTest(BaseVcwebTest):
+
+    def test_download_participants(self):
+        self.assertTrue(self.login_experimenter(self.experiment.experimenter))
+        response = self.get(reverse('core:download_participants', args=[self.experiment.pk]))
+        self.assertEqual(200, response.status_code)
+        with self.assertNumQueries(1):
+            lines = b''.join(response.streaming_content).splitlines()
+        self.assertEqual(self.experiment.participant_set.count() + 1, len(lines))
+        self.assertEqual(sorted(p.email for p in self.participants),
+                         sorted(line.split(b',')[0] for line in lines[1:]))
+
+
+class JsonEncodingTest(BaseVcwebTest):
+
+    def test_dumps(self):
+        e = self.experiment
+        data = {'experiment': e, 'date': datetime(2014, 9, 23, 2, 0, 0, 123456), 'amount': Decimal('1.50')}
+        self.assertEqual(json.dumps(data['date'], cls=DjangoJSONEncoder), dumps(data['date']))
+        self.assertEqual({'experiment': e.pk, 'date': '2014-09-23T02:00:00.123', 'amount': '1.50'},
+                         json.loads(dumps(data, strict=False)))
+        # strict mode rejects accidentally embedded models and querysets
+        with self.assertRaises(TypeError):
+            dumps(data, strict=True)
+        with self.assertRaises(TypeError):
+            dumps({'participants': e.participant_set.all()}, strict=True)
+
+
+class ViewModelConditionTest(BaseVcwebTest):
+
+    def get_view_model(self, view, pgr, etag=None):
+        request = self.factory.get('/view-model', {'participant_group_id': pgr.pk})
+        request.user = pgr.participant.user
+        if etag:
+            request.META['HTTP_IF_NONE_MATCH'] = etag
+        return view(request, experiment_id=self.experiment.pk)
+
+    def test_concurrent_write(self):
+        e = self.experiment
+        e.activate()
+        pgr = self.participant_group_relationships[0]
+        calls = []
+
+        @view_model_condition
+        def get_view_model(request, experiment_id=None):
+            calls.append(experiment_id)
+            if len(calls) == 1:
+                # simulates another participant's write while the view model is being built
+                bump_state_version(e.pk, [pgr.group_id])
+            return HttpResponse(str(len(calls)))
+
+        response = self.get_view_model(get_view_model, pgr)
+        self.assertEqual(200, response.status_code)
+        # the response is tagged with the state versions it was built from, not the bumped ones
+        response = self.get_view_model(get_view_model, pgr, response['ETag'])
+        self.assertEqual(200, response.status_code)
+        self.assertEqual('2', response.content)
+        response = self.get_view_model(get_view_model, pgr, response['ETag'])
+        self.assertEqual(304, response.status_code)
+        self.assertEqual(2, len(calls))
+
+
 class CheckEmailTest(BaseVcwebTest):
 
     def test_email_available(self):
@@ -274,16 +383,58 @@ class SubjectPoolViewTest(SubjectPoolTest):
         # Test with participants
         self.setup_participants()
 
-        response = self.post(reverse('subjectpool:send_invites'),
-                             {'number_of_people': 30, 'only_undergrad': 'on',
-                              'affiliated_institution': 'Arizona State University',
-                              'invitation_subject': 'Test', 'invitation_text': 'Testing',
-                              'session_pk_list': str(es_pk_list[0])})
+        with self.settings(SUBJECT_POOL_INVITATION_BATCH_SIZE=7,
+                           EMAIL_BACKEND='vcweb.core.mailqueue.QueuedEmailBackend'):
+            response = self.post(reverse('subjectpool:send_invites'),
+                                 {'number_of_people': 30, 'only_undergrad': 'on',
+                                  'affiliated_institution': 'Arizona State University',
+                                  'invitation_subject': 'Test', 'invitation_text': 'Testing',
+                                  'session_pk_list': str(es_pk_list[0])})
         self.assertEqual(200, response.status_code)
 
         response_dict = json.loads(response.content)
 
         self.assertTrue(response_dict['success'])
+        invites_count = response_dict['invitesCount']
+        invitation_batch = response_dict['invitationBatch']
+        self.assertEqual(invites_count, invitation_batch['number_of_recipients'])
+        self.assertEqual(invites_count, Invitation.objects.filter(batch=invitation_batch['pk']).count())
+        queued_invitations = OutboundEmail.objects.filter(invitation_batch=invitation_batch['pk'])
+        self.assertEqual((invites_count + 6) // 7, queued_invitations.count())
+        for outbound_email in queued_invitations:
+            self.assertTrue(len(outbound_email.bcc.splitlines()) <= 7)
+        self.assertFalse(invitation_batch['complete'])
+
+        send_queued_email(connection=mail.get_connection())
+        response = self.get(invitation_batch['status_url'])
+        self.assertEqual(200, response.status_code)
+        response_dict = json.loads(response.content)
+        self.assertTrue(response_dict['complete'])
+        self.assertEqual(invites_count, response_dict['number_sent'])
+        self.assertEqual("sent %s/%s" % (invites_count, invites_count), response_dict['message'])
+
+    def test_send_invitations_without_queue(self):
+        e = self.create_experimenter()
+        self.assertTrue(self.login_experimenter(e))
+        self.setup_participants()
+        es_pk_list = self.setup_experiment_sessions()
+        mail.outbox = []
+        # the test runner's locmem EMAIL_BACKEND delivers the invitations immediately instead of queueing them
+        with self.settings(SUBJECT_POOL_INVITATION_BATCH_SIZE=7):
+            response = self.post(reverse('subjectpool:send_invites'),
+                                 {'number_of_people': 30, 'only_undergrad': 'on',
+                                  'affiliated_institution': 'Arizona State University',
+                                  'invitation_subject': 'Test', 'invitation_text': 'Testing',
+                                  'session_pk_list': str(es_pk_list[0])})
+        response_dict = json.loads(response.content)
+        self.assertTrue(response_dict['success'])
+        invites_count = response_dict['invitesCount']
+        self.assertFalse(OutboundEmail.objects.exists())
+        # one copy for the experimenter and the BCC chunked invitations
+        self.assertEqual(1 + (invites_count + 6) // 7, len(mail.outbox))
+        invitation_batch = response_dict['invitationBatch']
+        self.assertTrue(invitation_batch['complete'])
+        self.assertEqual(invites_count, invitation_batch['number_sent'])
 
     def test_get_session_events(self):
         e = self.create_experimenter()
@@ -298,6 +449,28 @@ class SubjectPoolViewTest(SubjectPoolTest):
         response = self.get(
             '/subject-pool/session/events?from=' + str(fro) + '&to=' + str(to) + '/')
         self.assertEqual(200, response.status_code)
+        session_pk = response_dict['session']['pk']
+        self.assertIn(session_pk, [event['id'] for event in json.loads(response.content)['result']])
+        # sessions outside of the requested range are excluded
+        response = self.get(reverse('subjectpool:session_events'), {'from': fro, 'to': fro + 1000000})
+        self.assertNotIn(session_pk, [event['id'] for event in json.loads(response.content)['result']])
+        # conditional GET
+        url = reverse('subjectpool:session_events')
+        params = {'from': fro, 'to': to}
+        response = self.get(url, params)
+        etag = response['ETag']
+        self.assertTrue(response.has_header('Last-Modified'))
+        response = self.get(url, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(304, response.status_code)
+        # modifying an experiment session invalidates cached events
+        es = ExperimentSession.objects.get(pk=session_pk)
+        es.capacity = 5
+        es.save()
+        response = self.get(url, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(200, response.status_code)
+        self.assertNotEqual(etag, response['ETag'])
+        events = dict((event['id'], event) for event in json.loads(response.content)['result'])
+        self.assertEqual(5, events[session_pk]['capacity'])
 
     def test_downloading_experiment_session_data(self):
         # test downloading experiment session data
@@ -310,8 +483,17 @@ class SubjectPoolViewTest(SubjectPoolTest):
         es = ExperimentSession.objects.get(pk=response_dict['session']['pk'])
         es.creator = e.user
         es.save()
+        participant = Participant.objects.select_related('user').first()
+        ParticipantSignup.objects.create(invitation=Invitation.objects.create(participant=participant,
+                                                                              experiment_session=es, sender=e.user))
         response = self.get('/subject-pool/session/'+ str(es.pk) +'/download/')
         self.assertEqual(200, response.status_code)
+        self.assertTrue(response.streaming)
+        with self.assertNumQueries(1):
+            lines = b''.join(response.streaming_content).splitlines()
+        self.assertEqual(3, len(lines))
+        self.assertTrue(lines[2].startswith(participant.email.encode('utf-8') + b','))
+        self.assertIn(participant.username.encode('utf-8'), lines[2])
 
     def test_manage_experiment_session(self):
         # test creating, deleting and updating  experiment session
@@ -367,6 +549,11 @@ class SubjectPoolViewTest(SubjectPoolTest):
         self.assertEqual(200, response.status_code)
 
         self.setup_invitations(x, es_pk_list)
+        # signup counts for all invitations should be computed with a single grouped query
+        with CaptureQueriesContext(connection) as context:
+            response = self.get(reverse('subjectpool:experiment_session_signup'))
+        self.assertEqual(200, response.status_code)
+        self.assertLessEqual(len([query for query in context.captured_queries if 'COUNT(' in query['sql']]), 1)
         invitation = Invitation.objects.filter(participant=participant).order_by('?')[0]
 
         response = self.post(reverse('subjectpool:submit_experiment_session_signup'), {
@@ -417,6 +604,38 @@ class SubjectPoolViewTest(SubjectPoolTest):
         response = self.get(reverse('subjectpool:session_event_detail', args=[es.pk]))
         self.assertEqual(200, response.status_code)
 
+    def test_update_participant_attendance(self):
+        e = self.create_experimenter()
+        self.assertTrue(self.login_experimenter(e))
+        self.setup_participants()
+        es, other_es = ExperimentSession.objects.filter(pk__in=self.setup_experiment_sessions())[:2]
+        es.creator = e.user
+        es.save()
+        participants = Participant.objects.all()[:4]
+        signups = [ParticipantSignup.objects.create(invitation=Invitation.objects.create(
+            participant=participant, experiment_session=es, sender=e.user)) for participant in participants]
+        other_signup = ParticipantSignup.objects.create(invitation=Invitation.objects.create(
+            participant=participants[0], experiment_session=other_es, sender=e.user))
+        url = reverse('subjectpool:update_participant_attendance', args=[es.pk])
+        attendance = dict((signup.pk, ParticipantSignup.ATTENDANCE.participated) for signup in signups[:3])
+        attendance[signups[3].pk] = ParticipantSignup.ATTENDANCE.absent
+        response = self.post(url, {'attendance': json.dumps(attendance)})
+        self.assertEqual(200, response.status_code)
+        response_dict = json.loads(response.content)
+        self.assertTrue(response_dict['success'])
+        self.assertEqual(4, response_dict['updated'])
+        self.assertEqual(3, ParticipantSignup.objects.participated(experiment_session_pk=es.pk).count())
+        statistics = SpoolParticipantStatistics.objects.get(participant=signups[3].invitation.participant)
+        self.assertEqual((1, 0), (statistics.absences, statistics.participations))
+        # unchanged attendance is not updated again
+        response_dict = json.loads(self.post(url, {'attendance': json.dumps(attendance)}).content)
+        self.assertEqual(0, response_dict['updated'])
+        # signups from other sessions and invalid attendance values are rejected
+        for invalid_attendance in ({other_signup.pk: 0}, {signups[0].pk: 42}, [1, 2]):
+            response_dict = json.loads(self.post(url, {'attendance': json.dumps(invalid_attendance)}).content)
+            self.assertFalse(response_dict['success'])
+        self.assertEqual(3, ParticipantSignup.objects.participated(experiment_session_pk=es.pk).count())
+
     def test_invitation_count(self):
         e = self.create_experimenter()
         self.assertTrue(self.login_experimenter(e))
@@ -430,6 +649,20 @@ class SubjectPoolViewTest(SubjectPoolTest):
         self.assertEqual(200, response.status_code)
         response_dict = json.loads(response.content)
         self.assertTrue(response_dict['success'])
+        invites_count = response_dict['invitesCount']
+        self.assertTrue(invites_count > 0)
+
+        # the invite dialog exposes the reliability filter and the count honors it
+        self.assertContains(self.get(reverse('subjectpool:experimenter_index')), 'name="max_absences"')
+        SpoolParticipantStatistics.objects.adjust(Participant.objects.values_list('pk', flat=True), 'absences', 2)
+        for max_absences, expected_count in (('', invites_count), ('2', invites_count), ('1', 0)):
+            response = self.post(reverse('subjectpool:get_invitations_count'), {
+                'session_pk_list': es_pk_list,
+                'affiliated_institution': 'Arizona State University',
+                'only_undergrad': True,
+                'max_absences': max_absences,
+            })
+            self.assertEqual(expected_count, json.loads(response.content)['invitesCount'])
 
         # test invalid experiment sessions
         response = self.post(reverse('subjectpool:get_invitations_count'), {
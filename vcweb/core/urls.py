@@ -6,7 +6,7 @@ from django.conf.urls import url
 from django.contrib.auth.decorators import login_required
 from django.views.generic import RedirectView
 
-from .ajax import (get_round_data, save_experimenter_notes,
+from .ajax import (get_round_data, get_monitor_updates, save_experimenter_notes,
                    create_experiment, clone_experiment, is_email_available)
 from .views import (dashboard, LoginView, LogoutView, monitor, RegisterEmailListView, RegisterTestParticipantsView,
                     completed_survey, toggle_bookmark_experiment_metadata, check_survey_completed, ParticipateView,
@@ -83,6 +83,7 @@ urlpatterns = [
         save_experimenter_notes, name='save_experimenter_notes'),
     url(r'^api/experimenter/round-data',
         get_round_data, name='get_round_data'),
+    url(r'^api/experimenter/monitor-updates', get_monitor_updates, name='monitor_updates'),
     url(r'api/dashboard', get_dashboard_view_model,
         name='dashboard_view_model'),
     url(r'bug-report', RedirectView.as_view(url='https://bitbucket.org/virtualcommons/vcweb/issues/new'),
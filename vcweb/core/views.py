@@ -12,6 +12,7 @@ from django.conf import settings
 from django.contrib import auth, messages
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import PasswordResetForm
+from django.core.cache import cache
 from django.core.urlresolvers import reverse
 from django.core.exceptions import PermissionDenied
 from django.db import transaction
@@ -27,7 +28,7 @@ from django.views.decorators.http import require_GET, require_POST
 
 from contact_form.views import ContactFormView
 
-from .http import JsonResponse, dumps
+from .http import CsvResponse, JsonResponse, dumps
 from .decorators import (anonymous_required, retry, is_participant,
                          is_experimenter, ownership_required, group_required)
 from .forms import (LoginForm, ParticipantAccountForm, ExperimenterAccountForm, UpdateExperimentForm,
@@ -38,7 +39,8 @@ from .forms import (LoginForm, ParticipantAccountForm, ExperimenterAccountForm,
 from .models import (User, ChatMessage, Participant, ParticipantExperimentRelationship, ParticipantGroupRelationship,
                      ExperimentConfiguration, ExperimenterRequest, Experiment, Institution,
                      BookmarkedExperimentMetadata, OstromlabFaqEntry, Experimenter, ExperimentParameterValue,
-                     RoundConfiguration, RoundParameterValue, ParticipantSignup, get_model_fields, PermissionGroup)
+                     RoundConfiguration, RoundParameterValue, ParticipantSignup, get_model_fields, PermissionGroup,
+                     bump_state_version, prefetch_current_rounds)
 
 from vcweb.redis_pubsub import RedisPubSub
 
@@ -49,6 +51,8 @@ mimetypes.init()
 SUCCESS_DICT = {'success': True}
 FAILURE_DICT = {'success': False}
 
+ARCHIVED_EXPERIMENT_CACHE_TIMEOUT = 60 * 60 * 24
+
 
 @login_required
 @require_POST
@@ -64,7 +68,7 @@ def handle_chat_message(request, pk):
         if pgr.participant != request.user.participant:
             logger.warning(
                 "authenticated user %s tried to post message %s as %s", request.user, message, pgr)
-            return JsonResponse(dumps({'success': False, 'message': "Invalid request"}))
+            return JsonResponse({'success': False, 'message': "Invalid request"})
 
         experiment = Experiment.objects.get(pk=experiment_id)
         current_round_data = experiment.current_round_data
@@ -125,11 +129,27 @@ class ExperimenterDashboardViewModel(DashboardViewModel):
             self.experiment_metadata_list.append(d)
 
         experiment_status_dict = defaultdict(list)
-        for e in Experiment.objects.for_experimenter(self.experimenter).order_by('-pk'):
-            e.experiment_configuration = _configuration_cache[
-                e.experiment_configuration.pk]
-            experiment_status_dict[e.status].append(
-                e.to_dict(attrs=('monitor_url', 'status_line', 'controller_url')))
+        experiments = list(Experiment.objects.for_experimenter(self.experimenter).with_participant_count().order_by(
+            '-pk'))
+        # archived experiments never change, their summaries are cached until they are modified
+        archived_cache_keys = dict((e.pk, e.summary_cache_key) for e in experiments if e.is_archived)
+        cached_summaries = cache.get_many(archived_cache_keys.values())
+        uncached_experiments = [e for e in experiments if archived_cache_keys.get(e.pk) not in cached_summaries]
+        for e in uncached_experiments:
+            e.experiment_configuration = _configuration_cache.get(e.experiment_configuration_id,
+                                                                  e.experiment_configuration)
+        prefetch_current_rounds(uncached_experiments)
+        new_summaries = {}
+        for e in experiments:
+            cache_key = archived_cache_keys.get(e.pk)
+            experiment_dict = cached_summaries.get(cache_key)
+            if experiment_dict is None:
+                experiment_dict = e.to_summary_dict(attrs=('monitor_url', 'status_line', 'controller_url'))
+                if cache_key is not None:
+                    new_summaries[cache_key] = experiment_dict
+            experiment_status_dict[e.status].append(experiment_dict)
+        if new_summaries:
+            cache.set_many(new_summaries, ARCHIVED_EXPERIMENT_CACHE_TIMEOUT)
         self.pending_experiments = experiment_status_dict['INACTIVE']
         self.running_experiments = experiment_status_dict[
             'ACTIVE'] + experiment_status_dict['ROUND_IN_PROGRESS']
@@ -154,7 +174,7 @@ class ParticipantDashboardViewModel(DashboardViewModel):
         experiment_status_dict = defaultdict(list)
         for e in self.participant.experiments.select_related('experiment_configuration').all():
             experiment_status_dict[e.status].append(
-                e.to_dict(attrs=('participant_url', 'start_date'), name=e.experiment_metadata.title))
+                e.to_summary_dict(attrs=('participant_url', 'start_date'), name=e.experiment_metadata.title))
         self.pending_experiments = experiment_status_dict['INACTIVE']
         self.running_experiments = experiment_status_dict[
             'ACTIVE'] + experiment_status_dict['ROUND_IN_PROGRESS']
@@ -612,11 +632,10 @@ def toggle_bookmark_experiment_metadata(request):
 
 
 @group_required(PermissionGroup.experimenter, PermissionGroup.demo_experimenter)
-@ownership_required(Experiment)
+@ownership_required(Experiment, select_related=('experiment_configuration', 'experimenter'))
 @require_GET
 def monitor(request, pk=None):
-    experiment = get_object_or_404(Experiment.objects.select_related(
-        'experiment_configuration', 'experimenter'), pk=pk)
+    experiment = request.owned_object
 
     return render(request, 'experimenter/monitor.html', {
         'experiment': experiment,
@@ -761,17 +780,17 @@ def export_configuration(request, pk=None, file_extension='.xml'):
 @ownership_required(Experiment)
 @require_GET
 def download_participants(request, pk=None):
-    experiment = get_object_or_404(Experiment, pk=pk)
-    response = HttpResponse(content_type=mimetypes.types_map['.csv'])
-    response['Content-Disposition'] = 'attachment; filename=participants.csv'
-    writer = unicodecsv.writer(response, encoding='utf-8')
-    writer.writerow(['Email', 'Password', 'URL'])
+    experiment = request.owned_object
     full_participant_url = experiment.full_participant_url
     authentication_code = experiment.authentication_code
-    for participant in experiment.participant_set.all():
-        writer.writerow(
-            [participant.email, authentication_code, full_participant_url])
-    return response
+    emails = experiment.participant_set.order_by('pk').values_list('user__email', flat=True)
+
+    def rows():
+        yield ['Email', 'Password', 'URL']
+        for email in emails.iterator():
+            yield [email, authentication_code, full_participant_url]
+
+    return CsvResponse(rows(), filename='participants.csv')
 
 
 # FIXME: add data converter objects to write to csv, excel, etc.
@@ -779,7 +798,7 @@ def download_participants(request, pk=None):
 @require_GET
 @ownership_required(Experiment)
 def download_data(request, pk=None, file_type='csv'):
-    experiment = get_object_or_404(Experiment, pk=pk)
+    experiment = request.owned_object
     content_type = mimetypes.types_map['.%s' % file_type]
     logger.debug("Downloading data as %s", content_type)
     response = HttpResponse(content_type=content_type)
@@ -911,13 +930,17 @@ def update_experiment(request):
         try:
             response_tuples = experiment.invoke(action, experimenter)
             logger.debug("experiment.invoke %s -> %s", action, str(response_tuples))
+            bump_state_version(experiment_pk=experiment.pk)
             logger.debug("Publishing to redis on channel experimenter_channel.{}".format(experiment.pk))
             experiment.publish_to_participants(create_message_event("", "update"))
             experiment.publish_to_experimenter(create_message_event("Updating all connected participants"))
 
+            cursors = dict((cursor, form.cleaned_data.get(cursor) or 0)
+                           for cursor in ('chat_cursor', 'log_cursor', 'round_data_cursor'))
+            cursors['state_version'] = form.cleaned_data.get('state_version')
             return JsonResponse({
                 'success': True,
-                'experiment': experiment.to_dict(include_round_data=True)
+                'experiment': experiment.to_monitor_updates_dict(**cursors)
             })
         except AttributeError as e:
             logger.warning("no attribute %s on experiment %s (%s)", action, experiment.status_line, e)
@@ -932,6 +955,8 @@ def update_experiment(request):
 def update_participants(request, pk):
     try:
         experiment = Experiment.objects.get(pk=pk)
+        # participants asked to update must receive fresh view models, e.g., with the current time remaining
+        bump_state_version(experiment_pk=experiment.pk)
         logger.debug("Publishing to redis on channel experimenter_channel.{}".format(experiment.pk))
         experiment.publish_to_participants(create_message_event("", "update"))
         experiment.publish_to_experimenter(create_message_event("Updating all connected participants"))
@@ -1276,7 +1301,7 @@ def update_experiment_configuration(request, pk):
 @ownership_required(ExperimentConfiguration)
 def delete_experiment_configuration(request, pk):
     try:
-        ExperimentConfiguration.objects.get(pk=pk).delete()
+        request.owned_object.delete()
     except Exception as e:
         return JsonResponse({
             'success': False,
@@ -1290,7 +1315,7 @@ def delete_experiment_configuration(request, pk):
 @ownership_required(ExperimentConfiguration)
 @require_GET
 def edit_experiment_configuration(request, pk):
-    ec = ExperimentConfiguration.objects.get(pk=pk)
+    ec = request.owned_object
     ecf = ExperimentConfigurationForm(instance=ec)
 
     epv = ExperimentParameterValue.objects.filter(experiment_configuration=ec)
@@ -265,8 +265,9 @@ def get_number_alive(group, round_data):
                                                        boolean_value=True).count()
 
 
-def get_player_data(group, previous_round_data, current_round_data, self_pgr):
-    """ Returns a tuple ([list of player data dictionaries], { dictionary of this player's data })
+def get_player_data(group, previous_round_data, current_round_data, self_pgr=None):
+    """ Returns a tuple ([list of player data dictionaries], { dictionary of this player's data }). The player's data
+    is None if self_pgr isn't given.
 
      FIXME: refactor this into its own class as opposed to an arcane data structure
     """
@@ -298,6 +299,8 @@ def get_player_data(group, previous_round_data, current_round_data, self_pgr):
             'alive': pgrdv_dict[get_player_status_parameter()].boolean_value,
             'storage': pgrdv_dict[get_storage_parameter()].int_value
         })
+    if self_pgr is None:
+        return (player_data, None)
     own_player = player_dict[self_pgr]
     return (player_data, {
         'lastHarvestDecision': own_player[get_harvest_decision_parameter()].int_value,
@@ -487,12 +490,15 @@ def update_resource_level(experiment, group, round_data, regrowth_rate, max_reso
 
 # FIXME: reduce duplication between this and update_resource_level
 @transaction.atomic
-def update_shared_resource_level(experiment, group_cluster, round_data, regrowth_rate, max_resource_level=None):
+def update_shared_resource_level(experiment, group_cluster, round_data, regrowth_rate, max_resource_level=None,
+                                 groups=None):
     logger.debug("updating shared resource level")
+    if groups is None:
+        groups = [gr.group for gr in group_cluster.group_relationship_set.select_related('group')]
     if max_resource_level is None:
         max_resource_level = get_max_resource_level(
             round_data.round_configuration)
-    max_resource_level = max_resource_level * group_cluster.size
+    max_resource_level = max_resource_level * len(groups)
     shared_resource_level_dv = get_shared_resource_level_dv(
         cluster=group_cluster, round_data=round_data)
     shared_resource_level = shared_resource_level_dv.int_value
@@ -502,8 +508,7 @@ def update_shared_resource_level(experiment, group_cluster, round_data, regrowth
     shared_group_harvest = 0
     group_cluster_size = 0
     group_harvest_dict = {}
-    for group_relationship in group_cluster.group_relationship_set.all():
-        group = group_relationship.group
+    for group in groups:
         group_cluster_size += group.size
         group_harvest = get_total_group_harvest(group, round_data)
         group_harvest_dict[group] = group_harvest
@@ -601,9 +606,9 @@ def round_ended_handler(sender, experiment=None, **kwargs):
             # update_resource_level to operate on "group-like" objects if
             # possible
             if is_shared_resource_enabled(round_configuration):
-                for group_cluster in experiment.active_group_clusters:
+                for group_cluster, groups in experiment.get_group_cluster_map().items():
                     update_shared_resource_level(
-                        experiment, group_cluster, round_data, regrowth_rate)
+                        experiment, group_cluster, round_data, regrowth_rate, groups=groups)
             else:
                 for group in experiment.groups:
                     update_resource_level(
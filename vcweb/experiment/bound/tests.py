@@ -2,14 +2,24 @@
 boundary effects experiment unit tests
 """
 
+from StringIO import StringIO
+import json
 import logging
 import random
 
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from vcweb.core.http import dumps
 
 from vcweb.core.models import (
     GroupCluster, Experiment, ParticipantRoundDataValue)
 from vcweb.core.tests import BaseVcwebTest
 
+from .views import get_view_model_dict
 from .models import (get_experiment_metadata, set_harvest_decision, GroupRelationship, get_resource_level_dv,
                      get_regrowth_rate, calculate_regrowth, set_resource_level, get_resource_level,
                      get_harvest_decision_parameter, get_max_resource_level, get_harvest_decision,
@@ -137,6 +147,29 @@ class ParticipantTest(BaseTest):
             self.assertEqual(harvest_decision, get_harvest_decision(pgr))
             # FIXME: parse & verify json response content
 
+    def test_conditional_view_model(self):
+        e = self.experiment
+        e.activate()
+        pgr = self.participant_group_relationships[0]
+        other_pgr = [p for p in self.participant_group_relationships if p.group != pgr.group][0]
+        self.login_participant(pgr.participant)
+        view_model_url = e.get_participant_url('view-model')
+        response = self.get(view_model_url)
+        self.assertEqual(response.status_code, 200)
+        # the first view model lazily creates default data values, which changes the state versions it was tagged with
+        response = self.get(view_model_url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertEqual(self.get(view_model_url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # data value writes in any group invalidate the view model, other groups may be observable
+        set_harvest_decision(other_pgr, 3, submitted=True)
+        response = self.get(view_model_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(etag, response['ETag'])
+        etag = response['ETag']
+        e.advance_to_next_round()
+        self.assertEqual(self.get(view_model_url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
     def test_participate(self):
         for participant in self.participants:
             self.login_participant(participant)
@@ -153,6 +186,55 @@ class ParticipantTest(BaseTest):
             self.experiment.advance_to_next_round()
 
 
+class GroupViewModelCacheTest(BaseTest):
+
+    def build_view_model(self, pgr):
+        e = Experiment.objects.get(pk=self.experiment.pk)
+        with CaptureQueriesContext(connection) as queries:
+            view_model = get_view_model_dict(e, pgr)
+        return view_model, len(queries)
+
+    def test_group_view_model_cache(self):
+        self.advance_to_data_round()
+        self.create_harvest_decisions(3)
+        group = self.experiment.group_set.first()
+        pgrs = list(group.participant_group_relationship_set.all())
+        # warm up lazily created data values, then compare cached and uncached view models
+        self.build_view_model(pgrs[0])
+        cache.clear()
+        first_view_model, first_queries = self.build_view_model(pgrs[0])
+        for pgr in pgrs[1:]:
+            view_model, queries = self.build_view_model(pgr)
+            self.assertTrue(queries < first_queries)
+            cache.clear()
+            uncached_view_model, _ = self.build_view_model(pgr)
+            self.assertEqual(uncached_view_model, view_model)
+            self.assertEqual(pgr.pk, view_model['participantGroupId'])
+            self.assertEqual(first_view_model['playerData'], view_model['playerData'])
+        # group data value writes invalidate the cached group data
+        _, cached_queries = self.build_view_model(pgrs[-1])
+        set_harvest_decision(pgrs[0], 5, submitted=True)
+        _, queries = self.build_view_model(pgrs[-1])
+        self.assertTrue(queries > cached_queries)
+
+
+class ViewModelJsonTest(BaseTest):
+
+    def test_strict_view_model_encoding(self):
+        self.advance_to_data_round()
+        e = self.experiment
+        for pgr in e.participant_group_relationships:
+            view_model = get_view_model_dict(e, pgr)
+            self.assertEqual(json.loads(json.dumps(view_model, cls=DjangoJSONEncoder)),
+                             json.loads(dumps(view_model, strict=True)))
+
+    def test_benchmark_command(self):
+        self.experiment.activate()
+        output = StringIO()
+        call_command('benchmarkjson', experiment=self.experiment.pk, iterations=2, stdout=output)
+        self.assertIn('vcweb.core.http.dumps', output.getvalue())
+
+
 class MaxResourceLevelTest(BaseTest):
 
     def test_max_resource_level(self):
@@ -4,15 +4,16 @@ from urllib import urlencode
 import logging
 
 from django.contrib import messages
+from django.core.cache import cache
 from django.db import transaction
 from django.http import Http404
 from django.shortcuts import render, get_object_or_404, redirect
 
-from vcweb.core.decorators import group_required
+from vcweb.core.decorators import group_required, view_model_condition
 from vcweb.core.forms import SingleIntegerDecisionForm
 from vcweb.core.http import JsonResponse, dumps
 from vcweb.core.models import (
-    Experiment, ParticipantGroupRelationship, ChatMessage, PermissionGroup)
+    Experiment, Group, ParticipantGroupRelationship, ChatMessage, PermissionGroup, get_group_state_cache_key)
 from .models import (get_experiment_metadata, get_regrowth_rate, get_max_harvest_decision, get_cost_of_living,
                      get_resource_level, get_initial_resource_level, get_final_session_storage_queryset,
                      get_harvest_decision_dv, set_harvest_decision, can_observe_other_group, get_average_harvest,
@@ -77,6 +78,7 @@ def submit_harvest_decision(request, experiment_id=None):
 
 
 @group_required(PermissionGroup.participant, PermissionGroup.demo_participant)
+@view_model_condition(scope='experiment')
 def get_view_model(request, experiment_id=None):
     experiment = get_object_or_404(Experiment.objects.select_related('experiment_metadata', 'experiment_configuration'),
                                    pk=experiment_id)
@@ -132,9 +134,82 @@ experiment_model_defaults = {
     'regrowth': 0,
     'surveyUrl': 'http://survey.qualtrics.com/SE/?SID=SV_0vzmIj5UsOgjoTX',
 }
-# FIXME: bloated method with too many special cases, try to refactor
+# shared group view model data is cached per round data and state version, see get_group_view_model_data
+GROUP_VIEW_MODEL_CACHE_TIMEOUT = 3600
+
+
+def get_group_view_model_data(experiment, group, current_round, current_round_data, previous_round,
+                              previous_round_data):
+    """
+    Returns the view model data shared by all members of the given group in the current round, cached until the
+    experiment or group state version changes. The related group's pk is included under 'relatedGroupId' when other
+    groups can be observed.
+    """
+    cache_key = get_group_state_cache_key('bound:group', experiment.pk, group.pk, current_round_data.pk)
+    group_data = cache.get(cache_key)
+    if group_data is not None:
+        return group_data
+    resource_level = get_resource_level(group)
+    group_data = {'resourceLevel': resource_level}
+    if current_round.is_playable_round or current_round.is_debriefing_round:
+        player_data, _ = get_player_data(group, previous_round_data, current_round_data)
+        average_harvest = get_average_harvest(group, previous_round_data)
+        average_storage = get_average_storage(group, current_round_data)
+        regrowth = get_regrowth_dv(group, current_round_data).value
+        c = Counter(map(itemgetter('alive'), player_data))
+        number_alive = "%s out of %s" % (c[True], sum(c.values()))
+        group_data.update(
+            playerData=player_data,
+            averageHarvest=average_harvest,
+            averageStorage=average_storage,
+            regrowth=regrowth,
+            numberAlive=number_alive,
+            # FIXME: refactor duplication between myGroup and otherGroup data loading
+            myGroup={
+                'resourceLevel': resource_level,
+                'regrowth': regrowth,
+                'originalResourceLevel': resource_level - regrowth,
+                'averageHarvest': average_harvest,
+                'averageStorage': average_storage,
+                'numberAlive': number_alive,
+                'isResourceEmpty': resource_level == 0,
+            })
+    if previous_round.is_playable_round or current_round.is_playable_round:
+        group_data['chatMessages'] = [cm.to_dict() for cm in ChatMessage.objects.for_group(group)]
+        if can_observe_other_group(current_round):
+            group_data['canObserveOtherGroup'] = True
+            group_data['relatedGroupId'] = group.get_related_group().pk
+    cache.set(cache_key, group_data, GROUP_VIEW_MODEL_CACHE_TIMEOUT)
+    return group_data
+
+
+def get_other_group_view_model_data(experiment, other_group_pk, current_round_data, previous_round_data):
+    """
+    Returns the otherGroup view model data for observers of the given group, cached until the experiment or observed
+    group state version changes.
+    """
+    cache_key = get_group_state_cache_key('bound:other_group', experiment.pk, other_group_pk,
+                                          current_round_data.pk)
+    other_group_data = cache.get(cache_key)
+    if other_group_data is None:
+        other_group = Group.objects.get(pk=other_group_pk)
+        number_alive = get_number_alive(other_group, current_round_data)
+        resource_level = get_resource_level(other_group, current_round_data)
+        regrowth = get_regrowth_dv(other_group, current_round_data).value
+        other_group_data = {
+            'regrowth': regrowth,
+            'resourceLevel': resource_level,
+            'originalResourceLevel': resource_level - regrowth,
+            'averageHarvest': get_average_harvest(other_group, previous_round_data),
+            'averageStorage': get_average_storage(other_group, current_round_data),
+            'numberAlive': "%s out of %s" % (number_alive, other_group.size),
+            'isResourceEmpty': resource_level == 0,
+        }
+        cache.set(cache_key, other_group_data, GROUP_VIEW_MODEL_CACHE_TIMEOUT)
+    return other_group_data
 
 
+# FIXME: bloated method with too many special cases, try to refactor
 def get_view_model_dict(experiment, participant_group_relationship, **kwargs):
     ec = experiment.experiment_configuration
     current_round = experiment.current_round
@@ -142,8 +217,7 @@ def get_view_model_dict(experiment, participant_group_relationship, **kwargs):
     previous_round = experiment.previous_round
     previous_round_data = experiment.get_round_data(
         round_configuration=previous_round, previous_round=True)
-    experiment_model_dict = experiment.to_dict(
-        include_round_data=False, default_value_dict=experiment_model_defaults)
+    experiment_model_dict = experiment.to_participant_dict(default_value_dict=experiment_model_defaults)
 
     # round / experiment configuration data
     experiment_model_dict['timeRemaining'] = experiment.time_remaining
@@ -204,36 +278,16 @@ def get_view_model_dict(experiment, participant_group_relationship, **kwargs):
         'participantGroupId'] = participant_group_relationship.pk
     # FIXME: these should only need to be added for playable rounds but KO gets unhappy when we switch templates from
     # instructions rounds to practice rounds.
-    own_group = participant_group_relationship.group
-    own_resource_level = get_resource_level(own_group)
-    if current_round.is_playable_round or current_round.is_debriefing_round:
-        player_data, own_data = get_player_data(own_group, previous_round_data, current_round_data,
-                                                participant_group_relationship)
-        experiment_model_dict.update(own_data)
-        experiment_model_dict['playerData'] = player_data
-        experiment_model_dict['averageHarvest'] = get_average_harvest(
-            own_group, previous_round_data)
-        experiment_model_dict['averageStorage'] = get_average_storage(
-            own_group, current_round_data)
-        regrowth = experiment_model_dict['regrowth'] = get_regrowth_dv(
-            own_group, current_round_data).value
-        c = Counter(
-            map(itemgetter('alive'), experiment_model_dict['playerData']))
-        experiment_model_dict['numberAlive'] = "%s out of %s" % (
-            c[True], sum(c.values()))
-        # FIXME: refactor duplication between myGroup and otherGroup data
-        # loading
-        experiment_model_dict['myGroup'] = {
-            'resourceLevel': own_resource_level,
-            'regrowth': regrowth,
-            'originalResourceLevel': own_resource_level - regrowth,
-            'averageHarvest': experiment_model_dict['averageHarvest'],
-            'averageStorage': experiment_model_dict['averageStorage'],
-            'numberAlive': experiment_model_dict['numberAlive'],
-            'isResourceEmpty': own_resource_level == 0,
-        }
-
-    experiment_model_dict['resourceLevel'] = own_resource_level
+    group_data = dict(get_group_view_model_data(experiment, participant_group_relationship.group, current_round,
+                                                current_round_data, previous_round, previous_round_data))
+    related_group_pk = group_data.pop('relatedGroupId', None)
+    experiment_model_dict.update(group_data)
+    if 'playerData' in group_data:
+        own_data = next((player for player in group_data['playerData']
+                         if player['id'] == participant_group_relationship.pk), {})
+        experiment_model_dict['lastHarvestDecision'] = own_data.get('lastHarvestDecision', 0)
+        experiment_model_dict['alive'] = own_data.get('alive', True)
+        experiment_model_dict['storage'] = own_data.get('storage', 0)
 
     # participant group data parameters are only needed if this round is a
     # data round or the previous round was a data round
@@ -247,23 +301,7 @@ def get_view_model_dict(experiment, participant_group_relationship, **kwargs):
                 'harvestDecision'] = harvest_decision.int_value
             logger.debug("already submitted, setting harvest decision to %s",
                          experiment_model_dict['harvestDecision'])
-
-        experiment_model_dict['chatMessages'] = [
-            cm.to_dict() for cm in ChatMessage.objects.for_group(own_group)]
-        if can_observe_other_group(current_round):
-            experiment_model_dict['canObserveOtherGroup'] = True
-            other_group = own_group.get_related_group()
-            number_alive = get_number_alive(other_group, current_round_data)
-            resource_level = get_resource_level(
-                other_group, current_round_data)
-            regrowth = get_regrowth_dv(other_group, current_round_data).value
-            experiment_model_dict['otherGroup'] = {
-                'regrowth': regrowth,
-                'resourceLevel': resource_level,
-                'originalResourceLevel': resource_level - regrowth,
-                'averageHarvest': get_average_harvest(other_group, previous_round_data),
-                'averageStorage': get_average_storage(other_group, current_round_data),
-                'numberAlive': "%s out of %s" % (number_alive, other_group.size),
-                'isResourceEmpty': resource_level == 0,
-            }
+        if related_group_pk is not None:
+            experiment_model_dict['otherGroup'] = get_other_group_view_model_data(
+                experiment, related_group_pk, current_round_data, previous_round_data)
     return experiment_model_dict
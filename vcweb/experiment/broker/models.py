@@ -1,17 +1,23 @@
+from collections import defaultdict
 import logging
+import random
 
+from django.core.cache import cache
+from django.db import transaction
 from django.dispatch import receiver
 
 from vcweb.core import signals, simplecache
-from vcweb.core.models import (
-    Parameter, ParticipantRoundDataValue, GroupCluster)
+from vcweb.core.models import (Parameter, ParticipantRoundDataValue, ParticipantGroupRelationship, GroupRoundDataValue,
+                               GroupClusterDataValue, bump_state_version)
 from vcweb.experiment.forestry.models import (
-    get_harvest_decision_parameter, get_harvest_decision, set_harvest_decision, )
+    get_harvest_decision_parameter, set_harvest_decision, )
 
 logger = logging.getLogger(__name__)
 
 EXPERIMENT_METADATA_NAME = 'broker'
 
+CHAT_PREFERENCES_CACHE_TIMEOUT = 60 * 60 * 24
+
 
 def get_max_harvest_hours(experiment):
     return experiment.experiment_configuration.get_parameter_value(name='max_hours', default=10).int_value
@@ -140,52 +146,176 @@ def calculate_group_cluster_bonus(group_conservation_hours, local_threshold):
         return 1
 
 
+def _replace_round_data_values(model, owner_field, parameter, round_data, values):
+    """
+    Deactivates the active data values for the given parameter and owners (a dict mapping owner pks to new values) in
+    round_data and bulk creates active data values with the new values in their place.
+    """
+    if not values:
+        return
+    model.objects.filter(round_data=round_data, parameter=parameter, is_active=True,
+                         **{'%s__in' % owner_field: list(values)}).update(is_active=False)
+    value_field_name = parameter.value_field_name
+    model.objects.bulk_create([
+        model(round_data=round_data, parameter=parameter,
+              **{'%s_id' % owner_field: owner_pk, value_field_name: parameter.convert(value)})
+        for owner_pk, value in values.items()])
+
+
+def _chat_preferences_key(round_data_pk, suffix):
+    return 'broker:chat_preferences:%s:%s' % (round_data_pk, suffix)
+
+
+def count_chat_preference_submissions(round_data):
+    return ParticipantRoundDataValue.objects.filter(parameter=get_chat_within_group_parameter(), round_data=round_data,
+                                                    submitted=True, is_active=True).count()
+
+
+def set_chat_preferences(participant_group_relationship, chat_within_group, related_group=None, round_data=None):
+    """
+    Records a participant's chat preferences as submitted data values and returns the number of participants that have
+    submitted chat preferences in round_data so far. The count is kept in the cache as submissions arrive and is only
+    reseeded from the database when missing; resubmissions aren't counted twice.
+    """
+    if round_data is None:
+        round_data = participant_group_relationship.current_round_data
+    pgr = participant_group_relationship
+    pgr.get_data_value(parameter=get_chat_within_group_parameter(), round_data=round_data).update(chat_within_group,
+                                                                                                 submitted=True)
+    if related_group is not None:
+        pgr.get_data_value(parameter=get_chat_between_group_parameter(), round_data=round_data).update(
+            related_group.pk, submitted=True)
+    counter_key = _chat_preferences_key(round_data.pk, 'submitted')
+    if not cache.add(_chat_preferences_key(round_data.pk, pgr.pk), True, CHAT_PREFERENCES_CACHE_TIMEOUT):
+        return cache.get(counter_key) or count_chat_preference_submissions(round_data)
+    try:
+        return cache.incr(counter_key)
+    except ValueError:
+        # missing or evicted counter, the database count already includes this submission
+        submitted = count_chat_preference_submissions(round_data)
+        if not cache.add(counter_key, submitted, CHAT_PREFERENCES_CACHE_TIMEOUT):
+            submitted = cache.get(counter_key, submitted)
+        return submitted
+
+
+@transaction.atomic
+def match_participant_links(experiment, round_data=None):
+    """
+    Pairs participants who want to chat with another group with a random participant from that group and bulk creates
+    participant_link data values in both directions. Matching is done at most once per round; returns False if the
+    links already exist or not every participant has submitted chat preferences yet.
+    """
+    if round_data is None:
+        round_data = experiment.current_round_data
+    lock_key = _chat_preferences_key(round_data.pk, 'matched')
+    if not cache.add(lock_key, True, CHAT_PREFERENCES_CACHE_TIMEOUT):
+        return False
+    participant_link_parameter = get_participant_link_parameter()
+    if ParticipantRoundDataValue.objects.filter(parameter=participant_link_parameter, round_data=round_data,
+                                                is_active=True, **{
+                                                    '%s__isnull' % participant_link_parameter.value_field_name: False
+                                                }).exists():
+        return False
+    if count_chat_preference_submissions(round_data) < experiment.participant_set.count():
+        cache.delete(lock_key)
+        return False
+    try:
+        _create_participant_links(participant_link_parameter, round_data)
+    except Exception:
+        cache.delete(lock_key)
+        raise
+    # bulk writes don't send post_save signals
+    bump_state_version(experiment_pk=experiment.pk)
+    return True
+
+
+def _create_participant_links(participant_link_parameter, round_data):
+    chat_between_group_parameter = get_chat_between_group_parameter()
+    group_to_participants = defaultdict(list)
+    seen = set()
+    # newest active value first, see ParticipantRoundDataValue.Meta.ordering
+    for pgr_pk, group_pk, target_group_pk in ParticipantRoundDataValue.objects.filter(
+            parameter=chat_between_group_parameter, round_data=round_data, submitted=True, is_active=True).values_list(
+            'participant_group_relationship', 'participant_group_relationship__group',
+            chat_between_group_parameter.value_field_name):
+        if pgr_pk not in seen and target_group_pk is not None and target_group_pk != group_pk:
+            seen.add(pgr_pk)
+            group_to_participants[group_pk].append((pgr_pk, target_group_pk))
+    for participant_list in group_to_participants.values():
+        random.shuffle(participant_list)
+    willing_participants = dict((group_pk, [pgr_pk for pgr_pk, _ in participant_list])
+                                for group_pk, participant_list in group_to_participants.items())
+    links = {}
+    for group_pk, participant_list in group_to_participants.items():
+        for pgr_pk, target_group_pk in participant_list:
+            if pgr_pk in links:
+                continue
+            candidates = willing_participants.get(target_group_pk, [])
+            while candidates and candidates[-1] in links:
+                candidates.pop()
+            if candidates:
+                wpgr_pk = candidates.pop()
+                logger.debug("creating edges between %s -> %s", pgr_pk, wpgr_pk)
+                links[pgr_pk] = wpgr_pk
+                links[wpgr_pk] = pgr_pk
+    _replace_round_data_values(ParticipantRoundDataValue, 'participant_group_relationship', participant_link_parameter,
+                               round_data, links)
+
+
 @receiver(signals.round_ended, sender=EXPERIMENT_METADATA_NAME)
+@transaction.atomic
 def round_ended_handler(sender, experiment=None, **kwargs):
     '''
-    calculates new resource levels for practice or regular rounds based on the group harvest and resultant regrowth.
-    also responsible for transferring those parameters to the next round as needed.
+    calculates the group local bonus, group cluster bonus and participant payoffs for playable rounds. All decisions
+    for the round are loaded in a single query and the results are written with bulk operations, so the number of
+    queries doesn't grow with the number of participants.
     '''
     current_round_configuration = experiment.current_round
     logger.debug("ending broker round: %s", current_round_configuration)
+    if not current_round_configuration.is_playable_round:
+        return
     round_data = experiment.current_round_data
+    local_threshold = get_group_local_bonus_threshold(current_round_configuration)
+    group_cluster_threshold = get_group_cluster_bonus_threshold(current_round_configuration)
+    group_cluster_map = experiment.get_group_cluster_map()
+    group_pks = [group.pk for groups in group_cluster_map.values() for group in groups]
+    group_pgr_pks = defaultdict(list)
+    for pgr_pk, group_pk in ParticipantGroupRelationship.objects.filter(group__in=group_pks).values_list('pk',
+                                                                                                         'group'):
+        group_pgr_pks[group_pk].append(pgr_pk)
+    conservation_decision_parameter = get_conservation_decision_parameter()
+    harvest_decision_parameter = get_harvest_decision_parameter()
+    # most recent active decision per (participant, parameter), missing decisions default to 0
+    decisions = {}
+    for pgr_pk, parameter_pk, int_value in ParticipantRoundDataValue.objects.filter(
+            round_data=round_data, is_active=True, participant_group_relationship__group__in=group_pks,
+            parameter__in=(conservation_decision_parameter, harvest_decision_parameter)).values_list(
+            'participant_group_relationship', 'parameter', 'int_value'):
+        decisions.setdefault((pgr_pk, parameter_pk), int_value or 0)
+
     group_local_bonus_dict = {}
     group_cluster_bonus_dict = {}
-    participant_conservation_dict = {}
-    if current_round_configuration.is_playable_round:
-        local_threshold = get_group_local_bonus_threshold(
-            current_round_configuration)
-        group_cluster_threshold = get_group_cluster_bonus_threshold(
-            current_round_configuration)
-        for group_cluster in GroupCluster.objects.for_experiment(experiment):
-            group_cluster_conservation_hours = 0
-            for group_relationship in group_cluster.group_relationship_set.all():
-                group_conservation_hours = 0
-                group = group_relationship.group
-                for pgr in group.participant_group_relationship_set.all():
-                    conservation_hours = get_conservation_decision(
-                        pgr, round_data=round_data)
-                    participant_conservation_dict[pgr] = conservation_hours
-                    group_conservation_hours += conservation_hours
-                local_bonus = calculate_group_local_bonus(
-                    group_conservation_hours, local_threshold)
-                group_local_bonus_dict[group] = local_bonus
-                group.set_data_value(parameter=get_group_local_bonus_parameter(
-                ), round_data=round_data, value=local_bonus)
-
-                group_cluster_conservation_hours += group_conservation_hours
-            group_cluster_bonus = calculate_group_cluster_bonus(
-                group_cluster_conservation_hours, group_cluster_threshold)
-            group_cluster_bonus_dict[group_cluster] = group_cluster_bonus
-            group_cluster.set_data_value(parameter=get_group_cluster_bonus_parameter(
-            ), round_data=round_data, value=group_cluster_bonus)
-    # needs revision:
-        for group_cluster in GroupCluster.objects.for_experiment(experiment):
-            for group_relationship in group_cluster.group_relationship_set.all():
-                group = group_relationship.group
-                for pgr in group.participant_group_relationship_set.all():
-                    payoff = (participant_conservation_dict[pgr] * group_local_bonus_dict[group]) + \
-                        (get_harvest_decision(pgr, round_data)
-                         * group_cluster_bonus_dict[group_cluster])
-                    pgr.set_data_value(
-                        parameter=get_payoff_parameter(), round_data=round_data, value=payoff)
+    payoff_dict = {}
+    for group_cluster, groups in group_cluster_map.items():
+        group_cluster_conservation_hours = 0
+        for group in groups:
+            group_conservation_hours = sum(decisions.get((pgr_pk, conservation_decision_parameter.pk), 0)
+                                           for pgr_pk in group_pgr_pks[group.pk])
+            group_local_bonus_dict[group.pk] = calculate_group_local_bonus(group_conservation_hours, local_threshold)
+            group_cluster_conservation_hours += group_conservation_hours
+        group_cluster_bonus = calculate_group_cluster_bonus(group_cluster_conservation_hours, group_cluster_threshold)
+        group_cluster_bonus_dict[group_cluster.pk] = group_cluster_bonus
+        for group in groups:
+            for pgr_pk in group_pgr_pks[group.pk]:
+                payoff_dict[pgr_pk] = (
+                    decisions.get((pgr_pk, conservation_decision_parameter.pk), 0) * group_local_bonus_dict[group.pk]
+                    + decisions.get((pgr_pk, harvest_decision_parameter.pk), 0) * group_cluster_bonus)
+
+    _replace_round_data_values(GroupRoundDataValue, 'group', get_group_local_bonus_parameter(), round_data,
+                               group_local_bonus_dict)
+    _replace_round_data_values(GroupClusterDataValue, 'group_cluster', get_group_cluster_bonus_parameter(),
+                               round_data, group_cluster_bonus_dict)
+    _replace_round_data_values(ParticipantRoundDataValue, 'participant_group_relationship', get_payoff_parameter(),
+                               round_data, payoff_dict)
+    # bulk writes don't send post_save signals
+    bump_state_version(experiment_pk=experiment.pk, group_pks=group_pks)
@@ -1,17 +1,184 @@
-"""
-This file demonstrates writing tests using the unittest module. These will pass
-when you run "manage.py test".
+import logging
 
-Replace this with more appropriate tests for your application.
-"""
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
-from django.test import TestCase
+from vcweb.core.models import (GroupClusterDataValue, GroupRoundDataValue, Parameter, ParticipantGroupRelationship,
+                               ParticipantRoundDataValue)
+from vcweb.core.tests import BaseVcwebTest
+from vcweb.experiment.forestry.models import get_harvest_decision
+from .models import *
 
 
-class SimpleTest(TestCase):
+logger = logging.getLogger(__name__)
 
-    def test_basic_addition(self):
+
+class BaseBrokerTest(BaseVcwebTest):
+
+    """
+    Runs broker round logic against the forestry test fixtures, which don't define the broker parameters.
+    """
+    PARAMETERS = (
+        ('conservation_decision', Parameter.Scope.PARTICIPANT, 'int'),
+        ('payoff', Parameter.Scope.PARTICIPANT, 'float'),
+        ('chat_within_group', Parameter.Scope.PARTICIPANT, 'boolean'),
+        ('chat_between_group', Parameter.Scope.PARTICIPANT, 'int'),
+        ('participant_link', Parameter.Scope.PARTICIPANT, 'int'),
+        ('group_local_bonus', Parameter.Scope.GROUP, 'float'),
+        ('group_cluster_bonus', Parameter.Scope.GROUP_CLUSTER, 'float'),
+    )
+
+    def setUp(self, **kwargs):
+        super(BaseBrokerTest, self).setUp(**kwargs)
+        cache.clear()
+        for name, scope, parameter_type in self.PARAMETERS:
+            Parameter.objects.get_or_create(name=name, defaults={'scope': scope, 'type': parameter_type})
+        # parameter getters are memoized for the lifetime of the process
+        for getter in (get_conservation_decision_parameter, get_payoff_parameter, get_chat_within_group_parameter,
+                       get_chat_between_group_parameter, get_participant_link_parameter,
+                       get_group_local_bonus_parameter, get_group_cluster_bonus_parameter):
+            getter(refresh=True)
+
+    def create_group_clusters(self, group_cluster_size=2):
+        e = self.advance_to_data_round()
+        round_configuration = e.current_round
+        round_configuration.create_group_clusters = True
+        round_configuration.group_cluster_size = group_cluster_size
+        round_configuration.save()
+        e.create_group_clusters()
+        return e
+
+
+class RoundEndedTest(BaseBrokerTest):
+
+    def set_decisions(self, e):
+        round_data = e.current_round_data
+        for index, pgr in enumerate(e.participant_group_relationships.order_by('pk')):
+            conservation_hours = index % 4
+            pgr.set_data_value(parameter=get_conservation_decision_parameter(), round_data=round_data,
+                               value=conservation_hours)
+            pgr.set_data_value(parameter=get_harvest_decision_parameter(), round_data=round_data,
+                               value=10 - conservation_hours)
+
+    def get_expected_payoffs(self, e):
         """
-        Tests that 1 + 1 always equals 2.
+        Computes payoffs the way the unbatched round_ended_handler did, one data value lookup at a time.
         """
-        self.assertEqual(1 + 1, 2)
+        round_data = e.current_round_data
+        round_configuration = e.current_round
+        payoffs = {}
+        for group_cluster, groups in e.get_group_cluster_map().items():
+            group_cluster_conservation_hours = 0
+            local_bonuses = {}
+            for group in groups:
+                group_conservation_hours = sum(get_conservation_decision(pgr, round_data=round_data)
+                                               for pgr in group.participant_group_relationship_set.all())
+                local_bonuses[group] = calculate_group_local_bonus(
+                    group_conservation_hours, get_group_local_bonus_threshold(round_configuration))
+                group_cluster_conservation_hours += group_conservation_hours
+            group_cluster_bonus = calculate_group_cluster_bonus(
+                group_cluster_conservation_hours, get_group_cluster_bonus_threshold(round_configuration))
+            for group in groups:
+                self.assertEqual(local_bonuses[group], group.get_data_value(
+                    parameter=get_group_local_bonus_parameter(), round_data=round_data).value)
+                for pgr in group.participant_group_relationship_set.all():
+                    payoffs[pgr.pk] = (get_conservation_decision(pgr, round_data=round_data) * local_bonuses[group] +
+                                       get_harvest_decision(pgr, round_data) * group_cluster_bonus)
+            self.assertEqual(group_cluster_bonus, group_cluster.get_data_value(
+                parameter=get_group_cluster_bonus_parameter(), round_data=round_data).value)
+        return payoffs
+
+    def get_active_payoffs(self, e):
+        payoffs = ParticipantRoundDataValue.objects.filter(parameter=get_payoff_parameter(), is_active=True,
+                                                           round_data=e.current_round_data)
+        return dict(payoffs.values_list('participant_group_relationship', 'float_value'))
+
+    def end_round(self, e):
+        with CaptureQueriesContext(connection) as context:
+            round_ended_handler(EXPERIMENT_METADATA_NAME, experiment=e)
+        return len(context)
+
+    def test_payoffs(self):
+        e = self.create_group_clusters()
+        self.set_decisions(e)
+        self.end_round(e)
+        payoffs = self.get_active_payoffs(e)
+        self.assertEqual(e.participant_group_relationships.count(), len(payoffs))
+        self.assertEqual(self.get_expected_payoffs(e), payoffs)
+        # ending the round again replaces the results instead of adding active duplicates
+        self.end_round(e)
+        self.assertEqual(payoffs, self.get_active_payoffs(e))
+        round_data = e.current_round_data
+        self.assertEqual(len(payoffs), ParticipantRoundDataValue.objects.filter(
+            parameter=get_payoff_parameter(), round_data=round_data, is_active=True).count())
+        self.assertEqual(e.groups.count(), GroupRoundDataValue.objects.filter(
+            parameter=get_group_local_bonus_parameter(), round_data=round_data, is_active=True).count())
+        self.assertEqual(1, GroupClusterDataValue.objects.filter(
+            parameter=get_group_cluster_bonus_parameter(), round_data=round_data, is_active=True).count())
+
+    def test_query_count_independent_of_group_size(self):
+        e = self.create_group_clusters()
+        self.set_decisions(e)
+        # the first round end also loads and memoizes parameters, round configuration values, etc.
+        self.end_round(e)
+        number_of_queries = self.end_round(e)
+        for group in e.groups:
+            ParticipantGroupRelationship.objects.filter(
+                pk__in=list(group.participant_group_relationship_set.values_list('pk', flat=True)[:2])).delete()
+        self.assertEqual(number_of_queries, self.end_round(e))
+        self.assertEqual(e.participant_group_relationships.count(), len(self.get_active_payoffs(e)))
+
+
+class ChatPreferencesTest(BaseBrokerTest):
+
+    def submit_chat_preferences(self, e, chat_between_group=True):
+        round_data = e.current_round_data
+        return [set_chat_preferences(pgr, True, round_data=round_data,
+                                     related_group=pgr.group.get_related_group() if chat_between_group else None)
+                for pgr in e.participant_group_relationships.select_related('group').order_by('pk')]
+
+    def get_links(self, e):
+        participant_link_parameter = get_participant_link_parameter()
+        return list(ParticipantRoundDataValue.objects.filter(
+            parameter=participant_link_parameter, round_data=e.current_round_data, is_active=True,
+            **{'%s__isnull' % participant_link_parameter.value_field_name: False}).values_list(
+            'participant_group_relationship', participant_link_parameter.value_field_name))
+
+    def test_submission_counter(self):
+        e = self.create_group_clusters()
+        number_of_participants = e.participant_set.count()
+        self.assertEqual(range(1, number_of_participants + 1), self.submit_chat_preferences(e))
+        # resubmissions aren't counted twice
+        self.assertEqual([number_of_participants] * number_of_participants, self.submit_chat_preferences(e))
+        # an evicted counter is reseeded from the database
+        cache.clear()
+        pgr = e.participant_group_relationships.first()
+        self.assertEqual(number_of_participants, set_chat_preferences(pgr, False, round_data=e.current_round_data))
+
+    def test_match_once(self):
+        e = self.create_group_clusters()
+        self.assertFalse(match_participant_links(e))
+        self.submit_chat_preferences(e)
+        self.assertTrue(match_participant_links(e))
+        links = self.get_links(e)
+        self.assertFalse(match_participant_links(e))
+        # the existing links keep matching idempotent even without the cached lock
+        cache.clear()
+        self.assertFalse(match_participant_links(e))
+        self.assertEqual(links, self.get_links(e))
+
+    def test_symmetric_links(self):
+        e = self.create_group_clusters()
+        self.submit_chat_preferences(e)
+        match_participant_links(e)
+        links = self.get_links(e)
+        linked_pgrs = [pgr_pk for pgr_pk, linked_pgr_pk in links]
+        # no participant has more than one link
+        self.assertEqual(len(linked_pgrs), len(set(linked_pgrs)))
+        links = dict(links)
+        self.assertEqual(e.participant_group_relationships.count(), len(links))
+        group_ids = dict(e.participant_group_relationships.values_list('pk', 'group'))
+        for pgr_pk, linked_pgr_pk in links.items():
+            self.assertEqual(pgr_pk, links[linked_pgr_pk])
+            self.assertNotEqual(group_ids[pgr_pk], group_ids[linked_pgr_pk])
@@ -1,18 +1,15 @@
-from collections import defaultdict
-import random
 import logging
 
 from django.shortcuts import get_object_or_404, render
 
-from vcweb.core.decorators import group_required
+from vcweb.core.decorators import group_required, view_model_condition
 from vcweb.core.forms import SingleIntegerDecisionForm
 from vcweb.core.http import JsonResponse, dumps
-from vcweb.core.models import (Experiment, ParticipantGroupRelationship, RoundConfiguration, ParticipantRoundDataValue,
-                               PermissionGroup)
+from vcweb.core.models import (Experiment, ParticipantGroupRelationship, RoundConfiguration, PermissionGroup)
 from vcweb.experiment.broker.models import (get_max_harvest_hours, set_harvest_decision, set_conservation_decision,
-                                            get_harvest_decision, get_conservation_decision, get_payoff,
-                                            get_chat_within_group_parameter, get_chat_between_group_parameter,
-                                            get_participant_link_parameter)
+                                            get_conservation_decision, get_payoff, set_chat_preferences,
+                                            match_participant_links)
+from vcweb.experiment.forestry.models import get_harvest_decision
 from vcweb.experiment.broker.forms import ChatPreferenceForm
 
 
@@ -30,56 +27,19 @@ def submit_chat_preferences(request, experiment_id=None):
         pgr = get_object_or_404(
             ParticipantGroupRelationship, pk=participant_group_id)
         round_data = experiment.current_round_data
-        chat_within_group = form.cleaned_data['chat_within_group']
         chat_between_group = form.cleaned_data['chat_between_group']
-        pgr.set_data_value(parameter=get_chat_within_group_parameter(
-        ), value=chat_within_group, round_data=round_data)
-        if chat_between_group:
-            related_group = pgr.group.get_related_group()
-            pgr.set_data_value(parameter=get_chat_between_group_parameter(
-            ), value=related_group.pk, round_data=round_data)
-
-        ncwg = ParticipantRoundDataValue.objects.filter(
-            parameter=get_chat_within_group_parameter(), round_data=round_data, submitted=True).count()
-        ncbg = ParticipantRoundDataValue.objects.filter(
-            parameter=get_chat_between_group_parameter(), round_data=round_data, submitted=True).count()
-        np = experiment.participant_set.count()
-        response_dict = {
+        related_group = pgr.group.get_related_group() if chat_between_group else None
+        number_submitted = set_chat_preferences(pgr, form.cleaned_data['chat_within_group'],
+                                                related_group=related_group, round_data=round_data)
+        all_participants_submitted = number_submitted >= experiment.participant_set.count()
+        if all_participants_submitted:
+            # everyone submitted a chat preference decision, create participant linkages between groups (only the
+            # first request to get here does the matching)
+            match_participant_links(experiment, round_data=round_data)
+        return JsonResponse({
             'success': True,
-            'all_participants_submitted': False,
-        }
-        if ncwg == np and ncbg == np:
-            logger.debug("calculating participant participant linkages")
-            # everyone submitted a chat preference decision, create participant
-            # linkages between groups
-            between_group_dvs = ParticipantRoundDataValue.objects.filter(
-                parameter=get_chat_between_group_parameter(), round_data=round_data, submitted=True)
-            group_to_participants = defaultdict(list)
-            for dv in between_group_dvs:
-                group_to_participants[dv.participant_group_relationship.group].append(
-                    (dv.participant_group_relationship, dv.value))
-            [random.shuffle(v) for v in group_to_participants.values()]
-            for group, participant_list in group_to_participants.items():
-                for item in participant_list:
-                    (pgr, target_group) = item
-                    logger.debug(
-                        "pgr %s wants to talk to %s", pgr, target_group)
-                    willing_participants = group_to_participants[target_group]
-                    if willing_participants:
-                        (wpgr, wpgr_group) = willing_participants.pop()
-                        logger.debug(
-                            "creating edges between %s -> %s", pgr, wpgr)
-                        # create two edges between these two participants
-                        pgr.set_data_value(
-                            parameter=get_participant_link_parameter(), round_data=round_data, value=wpgr.pk)
-                        wpgr.set_data_value(
-                            parameter=get_participant_link_parameter(), round_data=round_data, value=pgr.pk)
-                    else:
-                        # no more willing participants, break to outer loop
-                        break
-
-            response_dict['all_participants_submitted'] = True
-        return JsonResponse(response_dict)
+            'all_participants_submitted': all_participants_submitted,
+        })
     return JsonResponse({'success': False})
 
 
@@ -122,6 +82,7 @@ def participate(request, experiment_id=None):
 
 
 @group_required(PermissionGroup.participant, PermissionGroup.demo_participant)
+@view_model_condition(scope='experiment')
 def get_view_model(request, experiment_id=None):
     experiment = get_object_or_404(Experiment, pk=experiment_id)
     participant_group_relationship = get_object_or_404(
@@ -140,8 +101,7 @@ EXPERIMENT_MODEL_DEFAULTS = {
 
 
 def get_view_model_dict(experiment, participant_group_relationship, **kwargs):
-    experiment_model_dict = experiment.to_dict(
-        include_round_data=False, default_value_dict=EXPERIMENT_MODEL_DEFAULTS)
+    experiment_model_dict = experiment.to_participant_dict(default_value_dict=EXPERIMENT_MODEL_DEFAULTS)
     group = participant_group_relationship.group
     experiment_configuration = experiment.experiment_configuration
     round_configuration = experiment.current_round
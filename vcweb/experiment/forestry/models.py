@@ -1,12 +1,15 @@
 from collections import defaultdict
+import hashlib
 import logging
 
+from django.core.cache import cache
 from django.db import models, transaction
 from django.dispatch import receiver
 
 from vcweb.core import signals, simplecache
 from vcweb.core.models import (
-    ExperimentMetadata, Parameter, ParticipantRoundDataValue, ParticipantGroupRelationship)
+    ExperimentMetadata, Parameter, ParticipantRoundDataValue,
+    get_group_state_cache_key)
 
 
 logger = logging.getLogger(__name__)
@@ -140,58 +143,75 @@ def get_total_group_harvest(group, round_data):
     return _zero_if_none(q['total_harvest'])
 
 
+# group statistics are cached per round data and state version, see get_group_statistics
+GROUP_STATISTICS_CACHE_TIMEOUT = 3600
+
+
+def get_group_statistics(group, previous_round_data, current_round_data, earnings_round_data_pks=()):
+    """
+    Returns a list of dicts with the id, number, lastHarvestDecision and totalHarvest (over the given earnings round
+    data) of every member of the given group, loaded with a single grouped aggregate query and cached until the
+    experiment or group state version changes.
+    """
+    earnings_round_data_pks = sorted(earnings_round_data_pks)
+    cache_key = get_group_state_cache_key(
+        'forestry:group_statistics:%s' % hashlib.md5(repr(earnings_round_data_pks)).hexdigest(),
+        group.experiment_id, group.pk, current_round_data.pk)
+    statistics = cache.get(cache_key)
+    if statistics is not None:
+        return statistics
+    last_round_data_pks = [rd.pk for rd in (previous_round_data, current_round_data) if rd is not None]
+    # harvest totals per (participant, round data), at most one harvest decision is active per round
+    harvests = ParticipantRoundDataValue.objects.filter(
+        models.Q(round_data__in=last_round_data_pks) | models.Q(round_data__in=earnings_round_data_pks),
+        participant_group_relationship__group=group,
+        parameter=get_harvest_decision_parameter(),
+        is_active=True
+    ).order_by().values_list('participant_group_relationship', 'round_data').annotate(harvest=models.Sum('int_value'))
+    harvest_dict = defaultdict(dict)
+    for pgr_pk, round_data_pk, harvest in harvests:
+        harvest_dict[pgr_pk][round_data_pk] = _zero_if_none(harvest)
+    statistics = []
+    for pgr_pk, participant_number in group.participant_group_relationship_set.values_list('pk', 'participant_number'):
+        round_harvests = harvest_dict[pgr_pk]
+        # the previous round's harvest decision takes precedence over the current round's
+        last_harvest_decision = next((round_harvests[pk] for pk in last_round_data_pks if pk in round_harvests), 0)
+        statistics.append({
+            'id': pgr_pk,
+            'number': participant_number,
+            'lastHarvestDecision': last_harvest_decision,
+            'totalHarvest': sum(round_harvests.get(pk, 0) for pk in earnings_round_data_pks),
+        })
+    cache.set(cache_key, statistics, GROUP_STATISTICS_CACHE_TIMEOUT)
+    return statistics
+
+
 class GroupData(object):
 
-    def __init__(self, self_pgr, previous_round_data, current_round_data):
+    """
+    Harvest statistics for a participant's group, see get_group_statistics
+    """
+
+    def __init__(self, self_pgr, previous_round_data, current_round_data, earnings_round_data_pks=()):
         self.pgr = self_pgr
-        self.group = self_pgr.group
-        self.pgr_list = ParticipantGroupRelationship.objects.filter(
-            group=self.group)
-        self.player_dict = defaultdict(lambda: defaultdict(lambda: None))
-
-        prdvs = ParticipantRoundDataValue.objects.for_group(group=self.group,
-                                                            parameter=get_harvest_decision_parameter(),
-                                                            round_data__in=[previous_round_data, current_round_data])
-
-        # Converting django ORM object to dictionary so that it can be indexed
-        # easily to get parameter values
-        for prdv in prdvs:
-            self.player_dict[prdv.participant_group_relationship][
-                prdv.parameter] = prdv
-
-    def get_last_harvest_decision(self, pgr):
-        try:
-            return self.player_dict[pgr][get_harvest_decision_parameter()].int_value
-        except:
-            return 0
+        self.statistics = get_group_statistics(self_pgr.group, previous_round_data, current_round_data,
+                                               earnings_round_data_pks)
+        self.own_statistics = next((s for s in self.statistics if s['id'] == self_pgr.pk),
+                                   {'lastHarvestDecision': 0, 'totalHarvest': 0})
 
     def get_group_data(self):
-        group_data = []
-        for pgr in self.pgr_list:
-            group_data.append({
-                'id': pgr.pk,
-                'number': pgr.participant_number,
-                'lastHarvestDecision': self.get_last_harvest_decision(pgr)
-            })
-        return group_data
+        return [dict(id=s['id'], number=s['number'], lastHarvestDecision=s['lastHarvestDecision'])
+                for s in self.statistics]
 
     def get_own_data(self):
-        own_data = {
-            'lastHarvestDecision': self.get_last_harvest_decision(self.pgr)}
-        return own_data
-
-    def get_group_earnings(self, round_list, exchange_rate):
-        group_data = []
-        for pgr in self.pgr_list:
-            if pgr != self.pgr:
-                group_data.append({
-                    'number': pgr.participant_number,
-                    'totalEarnings': get_total_experiment_harvest(pgr, round_list) * exchange_rate
-                })
-        return group_data
-
-    def get_own_earnings(self, round_list, exchange_rate):
-        return get_total_experiment_harvest(self.pgr, round_list) * exchange_rate
+        return {'lastHarvestDecision': self.own_statistics['lastHarvestDecision']}
+
+    def get_group_earnings(self, exchange_rate):
+        return [{'number': s['number'], 'totalEarnings': s['totalHarvest'] * exchange_rate}
+                for s in self.statistics if s['id'] != self.pgr.pk]
+
+    def get_own_earnings(self, exchange_rate):
+        return self.own_statistics['totalHarvest'] * exchange_rate
 
 
 @transaction.atomic
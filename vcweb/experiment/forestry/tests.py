@@ -1,8 +1,10 @@
 import logging
 import random
 
+from django.core.cache import cache
+
 from vcweb.core.models import (
-    GroupRoundDataValue, ParticipantExperimentRelationship)
+    GroupRoundDataValue, ParticipantExperimentRelationship, ParticipantGroupRelationship)
 from vcweb.core.tests import BaseVcwebTest
 from .models import *
 
@@ -253,3 +255,33 @@ class ForestryParametersTest(BaseVcwebTest):
         e.advance_to_next_round()
         self.assertEqual(10,
                          ParticipantRoundDataValue.objects.filter(round_data=round_data, parameter__type='int').count())
+
+
+class GroupStatisticsTest(BaseVcwebTest):
+
+    def test_group_statistics(self):
+        e = self.advance_to_data_round()
+        group = e.groups[0]
+        pgrs = list(group.participant_group_relationship_set.all())
+        previous_round_data = e.current_round_data
+        for pgr in pgrs:
+            set_harvest_decision(pgr, pgr.participant_number, submitted=True)
+        e.advance_to_next_round()
+        current_round_data = e.current_round_data
+        for pgr in pgrs:
+            set_harvest_decision(pgr, 1, round_data=current_round_data, submitted=True)
+        earnings_round_data_pks = [previous_round_data.pk, current_round_data.pk]
+        cache.clear()
+        with self.assertNumQueries(2):
+            statistics = get_group_statistics(group, previous_round_data, current_round_data,
+                                              earnings_round_data_pks)
+        with self.assertNumQueries(0):
+            self.assertEqual(statistics, get_group_statistics(group, previous_round_data, current_round_data,
+                                                              earnings_round_data_pks))
+        self.assertEqual([pgr.pk for pgr in pgrs], [s['id'] for s in statistics])
+        for pgr, s in zip(pgrs, statistics):
+            self.assertEqual(pgr.participant_number, s['lastHarvestDecision'])
+            self.assertEqual(get_total_experiment_harvest(pgr, earnings_round_data_pks), s['totalHarvest'])
+        group_data = GroupData(pgrs[0], previous_round_data, current_round_data, earnings_round_data_pks)
+        self.assertEqual(len(pgrs) - 1, len(group_data.get_group_earnings(2)))
+        self.assertEqual(statistics[0]['totalHarvest'] * 2, group_data.get_own_earnings(2))
@@ -4,7 +4,7 @@ from django.http import Http404
 from django.db import transaction
 from django.shortcuts import render, get_object_or_404
 
-from vcweb.core.decorators import group_required
+from vcweb.core.decorators import group_required, view_model_condition
 from vcweb.core.http import JsonResponse, dumps
 from vcweb.core.forms import SingleIntegerDecisionForm
 from vcweb.core.models import (
@@ -72,6 +72,7 @@ def submit_harvest_decision(request, experiment_id=None):
 
 
 @group_required(PermissionGroup.participant, PermissionGroup.demo_participant)
+@view_model_condition
 def get_view_model(request, experiment_id=None):
     experiment = get_object_or_404(Experiment.objects.select_related('experiment_metadata', 'experiment_configuration'),
                                    pk=experiment_id)
@@ -114,8 +115,7 @@ def get_view_model_dict(experiment, participant_group_relationship, **kwargs):
     previous_round_data = experiment.get_round_data(
         round_configuration=previous_round, previous_round=True)
 
-    experiment_model_dict = experiment.to_dict(
-        include_round_data=False, default_value_dict=experiment_model_defaults)
+    experiment_model_dict = experiment.to_participant_dict(default_value_dict=experiment_model_defaults)
 
     experiment_model_dict['timeRemaining'] = experiment.time_remaining
     experiment_model_dict['sessionId'] = current_round.session_id
@@ -144,9 +144,20 @@ def get_view_model_dict(experiment, participant_group_relationship, **kwargs):
         own_resource_level = get_resource_level(own_group)
         experiment_model_dict['resourceLevel'] = own_resource_level
 
+        # If current round is debriefing round show the earnings of the participant depending upon the
+        # type of round user completed
+        earnings_round_data_pks = ()
+        if current_round.is_debriefing_round:
+            if previous_round.is_practice_round:
+                round_type = RoundConfiguration.RoundType.PRACTICE
+            else:
+                round_type = RoundConfiguration.RoundType.REGULAR
+            earnings_round_data_pks = experiment.round_data_set.filter(
+                round_configuration__round_type=round_type).values_list('pk', flat=True)
+
         # Create GroupData object to access group members data
-        gd = GroupData(
-            participant_group_relationship, previous_round_data, current_round_data)
+        gd = GroupData(participant_group_relationship, previous_round_data, current_round_data,
+                       earnings_round_data_pks=earnings_round_data_pks)
 
         experiment_model_dict.update(gd.get_own_data())
         # Data of all the players in the same group of current logged in
@@ -164,22 +175,10 @@ def get_view_model_dict(experiment, participant_group_relationship, **kwargs):
             'averageHarvest': get_average_harvest(own_group, previous_round_data),
             'isResourceEmpty': own_resource_level == 0,
         }
-        # If current round is debriefing round get the earnings of the participant depending upon the
-        # type of round user completed
         if current_round.is_debriefing_round:
-            if previous_round.is_practice_round:
-                rounds = experiment.round_data_set.filter(
-                    round_configuration__round_type=RoundConfiguration.RoundType.PRACTICE)
-            else:
-                rounds = experiment.round_data_set.filter(
-                    round_configuration__round_type=RoundConfiguration.RoundType.REGULAR)
-
-            experiment_model_dict['totalEarnings'] = gd.get_own_earnings(
-                rounds, ec.exchange_rate)
-
+            experiment_model_dict['totalEarnings'] = gd.get_own_earnings(ec.exchange_rate)
             if can_view_group_results(current_round):
-                experiment_model_dict['groupEarnings'] = gd.get_group_earnings(
-                    rounds, ec.exchange_rate)
+                experiment_model_dict['groupEarnings'] = gd.get_group_earnings(ec.exchange_rate)
 
     # Participant group data parameters are only needed if this round is a data round
     # or the previous round was a data round
@@ -25,8 +25,8 @@ class ViewModel(object):
         self.experiment = group.experiment if experiment is None else experiment
         self.current_round_data = self.experiment.current_round_data
         self.current_round = self.current_round_data.round_configuration
-        self.experiment_model = self.experiment.to_dict(
-            include_round_data=False, default_value_dict=ViewModel.experiment_model_defaults)
+        self.experiment_model = self.experiment.to_participant_dict(
+            default_value_dict=ViewModel.experiment_model_defaults)
 
     def to_dict(self):
         current_round = self.experiment.current_round
@@ -6,13 +6,12 @@ from django.conf import settings
 from django.core import mail
 from django.core.mail import EmailMultiAlternatives
 from django.db import transaction
-from django.template import Context
-from django.template.loader import select_template
 from django.utils.timesince import timesince
 
 
 from vcweb.core.models import (
     ParticipantRoundDataValue, ChatMessage, Like, Comment)
+from vcweb.core.rendering import SplicedMarkdownTemplate
 from .models import (Activity, is_scheduled_activity_experiment, get_activity_availability_cache,
                      get_activity_performed_parameter, ActivityAvailability, is_linear_public_good_game,
                      get_activity_points_cache, get_footprint_level, get_group_threshold, get_experiment_completed_dv,
@@ -21,7 +20,6 @@ from .models import (Activity, is_scheduled_activity_experiment, get_activity_av
 import itertools
 import locale
 import logging
-import markdown
 import re
 
 logger = logging.getLogger(__name__)
@@ -294,8 +292,6 @@ class GroupScores(object):
         get_experiment_completed_dv(
             group, round_data=round_data).update_boolean(goal_reached)
         yesterday = date.today() - timedelta(1)
-        plaintext_template = select_template(
-            ['lighterprints/email/scheduled-activity/group-summary-email.txt'])
         experiment = group.experiment
         #experimenter_email = experiment.experimenter.email
         # FIXME: change this to the experimenter or add a dedicated settings
@@ -304,7 +300,7 @@ class GroupScores(object):
         number_of_chat_messages = ChatMessage.objects.for_group(
             group, round_data=round_data).count()
         messages = []
-        c = Context({
+        summary_template = SplicedMarkdownTemplate('lighterprints/email/scheduled-activity/group-summary-email.txt', {
             'experiment': experiment,
             'experiment_completed': experiment.is_last_round,
             'number_of_groups': self.number_of_groups,
@@ -318,12 +314,11 @@ class GroupScores(object):
             'daily_earnings': self.daily_earnings_currency(group),
             'total_earnings': self.total_earnings_currency(group),
             'has_leaderboard': self.has_leaderboard
-        })
-        for pgr in group.participant_group_relationship_set.all():
-            c['individual_points'] = get_individual_points(pgr, round_data)
-            plaintext_content = plaintext_template.render(c)
-            html_content = markdown.markdown(plaintext_content)
-            subject = 'Lighter Footprints Summary for %s' % yesterday
+        }, fields=('individual_points',))
+        subject = 'Lighter Footprints Summary for %s' % yesterday
+        for pgr in group.participant_group_relationship_set.select_related('participant__user'):
+            plaintext_content, html_content = summary_template.render(
+                individual_points=get_individual_points(pgr, round_data))
             to_address = [experimenter_email, pgr.participant.email]
             msg = EmailMultiAlternatives(
                 subject, plaintext_content, experimenter_email, to_address)
@@ -371,31 +366,28 @@ class GroupScores(object):
         yesterday = date.today() - timedelta(1)
         experiment = group.experiment
         experimenter_email = experiment.experimenter.email
-        plaintext_template = select_template(
-            ['lighterprints/email/group-summary-email.txt'])
         number_of_chat_messages = ChatMessage.objects.for_group(
             group, round_data=self.round_data).count()
         summary_emails = []
         average_group_points = self.average_daily_points(group)
         points_to_next_level = get_points_to_next_level(level)
-        c = Context(dict(experiment=experiment,
-                         number_of_groups=self.number_of_groups,
-                         group_name=group.name,
-                         group_level=level,
-                         group_rank=self.get_group_rank(group),
-                         summary_date=yesterday,
-                         has_leaderboard=self.has_leaderboard,
-                         points_to_next_level=points_to_next_level,
-                         average_daily_points=average_group_points,
-                         number_of_chat_messages=number_of_chat_messages,
-                         promoted=promoted,
-                         completed=completed)
-                    )
-        for pgr in group.participant_group_relationship_set.all():
-            c['individual_points'] = get_individual_points(pgr)
-            plaintext_content = plaintext_template.render(c)
-            html_content = markdown.markdown(plaintext_content)
-            subject = 'Lighter Footprints Summary for %s' % yesterday
+        summary_template = SplicedMarkdownTemplate('lighterprints/email/group-summary-email.txt',
+                                                   dict(experiment=experiment,
+                                                        number_of_groups=self.number_of_groups,
+                                                        group_name=group.name,
+                                                        group_level=level,
+                                                        group_rank=self.get_group_rank(group),
+                                                        summary_date=yesterday,
+                                                        has_leaderboard=self.has_leaderboard,
+                                                        points_to_next_level=points_to_next_level,
+                                                        average_daily_points=average_group_points,
+                                                        number_of_chat_messages=number_of_chat_messages,
+                                                        promoted=promoted,
+                                                        completed=completed),
+                                                   fields=('individual_points',))
+        subject = 'Lighter Footprints Summary for %s' % yesterday
+        for pgr in group.participant_group_relationship_set.select_related('participant__user'):
+            plaintext_content, html_content = summary_template.render(individual_points=get_individual_points(pgr))
             to_address = [experimenter_email, pgr.participant.email]
             msg = EmailMultiAlternatives(
                 subject, plaintext_content, experimenter_email, to_address)
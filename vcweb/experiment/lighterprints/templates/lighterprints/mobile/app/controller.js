@@ -71,9 +71,8 @@ function initKOModel(response){
         type: "GET",
         url: groupURL,
         dataType: "json",
-        cache: false,
         success: function(response){
-            var viewModelData = $.parseJSON(response.view_model_json);
+            var viewModelData = response.view_model_json;
             globalViewModel = new LighterFootprintsModel(viewModelData);
 			ko.applyBindings(globalViewModel);
 			$.mobile.changePage($("#dashboardPage"));
@@ -159,6 +159,13 @@ class GroupActivityTest(LevelBasedTest):
             messages = group_scores.create_level_based_group_summary_emails(
                 group, level=2)
             self.assertEqual(len(messages), group.size)
+            individual_points = dict((pgr.participant.email, get_individual_points(pgr))
+                                     for pgr in group.participant_group_relationship_set.all())
+            for message in messages:
+                expected = 'You earned %s points' % individual_points[message.to[1]]
+                self.assertIn(expected, message.body)
+                self.assertIn(expected, message.alternatives[0][0])
+                self.assertNotIn('VCWEBFIELD', message.body)
 
 
 class ActivityTest(LevelBasedTest):
@@ -8,7 +8,7 @@ from django.http import HttpResponse
 from django.shortcuts import get_object_or_404, render, redirect
 import unicodecsv
 
-from vcweb.core.decorators import group_required, ownership_required, is_participant
+from vcweb.core.decorators import group_required, ownership_required, is_participant, view_model_condition
 from vcweb.core.forms import (
     ChatForm, CommentForm, LikeForm, GeoCheckinForm, LoginForm)
 from vcweb.core.http import JsonResponse
@@ -222,7 +222,7 @@ class HighSchoolViewModel(object):
 @group_required(PermissionGroup.experimenter)
 @ownership_required(Experiment)
 def download_payment_data(request, pk=None):
-    experiment = get_object_or_404(Experiment, pk=pk)
+    experiment = request.owned_object
     response = HttpResponse(content_type=mimetypes.types_map['.csv'])
     response[
         'Content-Disposition'] = 'attachment; filename=payment-%s' % experiment.data_file_name()
@@ -288,7 +288,9 @@ def get_view_model_dict(participant_group_relationship, activities=None, experim
     }
 
 
+# lighterprints view models show every group's scores and the time left in the day
 @group_required(PermissionGroup.participant, PermissionGroup.demo_participant)
+@view_model_condition(scope='experiment', period=60)
 def get_view_model(request, participant_group_id=None):
     if participant_group_id is None:
         # check in the request query parameters as well
@@ -306,7 +308,7 @@ def get_view_model(request, participant_group_id=None):
             "user %s tried to access view model for %s", request.user.participant, pgr)
         raise PermissionDenied("Access denied.")
     view_model = get_view_model_dict(pgr, experiment=pgr.group.experiment)
-    return JsonResponse(dumps({'success': True, 'view_model_json': view_model}))
+    return JsonResponse({'success': True, 'view_model_json': view_model})
 
 
 # FIXME: push this into core api/login if possible
@@ -398,8 +400,8 @@ def checkin(request):
             #            venues = foursquare_venue_search(latitude=latitude, longitude=longitude,
             #                    categoryId=','.join(get_foursquare_category_ids()))
             #            logger.debug("Found venues: %s", venues)
-            return JsonResponse(dumps({'success': True}))
+            return JsonResponse({'success': True})
         else:
             logger.warning("authenticated user %s tried to checkin at (%s, %s) for %s", request.user, latitude,
                            longitude, participant_group_relationship)
-    return JsonResponse(dumps({'success': False, 'message': 'Invalid request'}))
+    return JsonResponse({'success': False, 'message': 'Invalid request'})
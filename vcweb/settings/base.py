@@ -19,6 +19,13 @@ GITHUB_REPO_OWNER = "virtualcommons"
 GITHUB_ISSUE_LABELS = ["bug"]
 
 SUBJECT_POOL_WAITLIST_SIZE = 10
+# maximum number of BCC recipients per subject pool invitation email
+SUBJECT_POOL_INVITATION_BATCH_SIZE = 100
+# number of session reminder emails sent (and recorded) per transaction
+SUBJECT_POOL_REMINDER_BATCH_SIZE = 100
+# raise errors when model instances or querysets are embedded in JSON view models instead of encoding them by pk.
+# Settings modules that override DEBUG must set this again.
+STRICT_JSON_ENCODING = DEBUG
 
 DEMO_EXPERIMENTER_EMAIL = 'vcweb.demo@mailinator.com'
 DEFAULT_FROM_EMAIL = 'vcweb@asu.edu'
@@ -26,6 +33,8 @@ SERVER_EMAIL = 'vcweb@asu.edu'
 SERVER_NAME = 'vcweb.asu.edu'
 EMAIL_HOST = 'smtp.asu.edu'
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+# backend used by the sendqueuedemail command when EMAIL_BACKEND is vcweb.core.mailqueue.QueuedEmailBackend
+MAIL_QUEUE_DELIVERY_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 ALLOWED_HOSTS = ('.asu.edu', 'localhost',)
 ADMINS = (
     ('Allen Lee', 'allen.lee@asu.edu'),
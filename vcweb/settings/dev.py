@@ -2,6 +2,7 @@
 from .base import *
 DEBUG = True
 TEMPLATE_DEBUG = DEBUG
+STRICT_JSON_ENCODING = DEBUG
 
 CACHES = {
     'default': {
@@ -2,6 +2,7 @@
 from .base import *
 DEBUG = False
 TEMPLATE_DEBUG = DEBUG
+STRICT_JSON_ENCODING = DEBUG
 
 CACHES = {
     'default': {
@@ -19,7 +20,10 @@ DATABASES = {
         'PASSWORD': 'CUSTOMIZE_ME',
     }
 }
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+# request handlers only enqueue outbound email, the sendqueuedemail management command delivers it (see
+# deploy/supervisord/vcweb-mailqueue.ini)
+EMAIL_BACKEND = 'vcweb.core.mailqueue.QueuedEmailBackend'
+MAIL_QUEUE_DELIVERY_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 
 # Make this unique, and don't share it with anybody.
 SECRET_KEY = 'CUSTOMIZE_ME'